@@ -0,0 +1,98 @@
+"""Cold start budget for the timetrack CLI.
+
+Runs `timetrack ls-prj` in a fresh interpreter under `python -X importtime`
+against a throwaway home directory and fails if the import cost or the total
+wall time of the command go over budget, or if any of the heavy optional
+dependencies get imported along the way.
+
+    python benchmarks/importtime.py --budget-ms 150
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+# modules that must not be imported on the ls-prj / completion path
+HEAVY_MODULES = ["matplotlib", "numpy", "progressbar", "moment"]
+
+COMMAND = "from timetrack.cli import cli; cli(['ls-prj'])"
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def run_cold_start(home):
+    """Run the command once, returning (wall seconds, {module: cumulative us})"""
+
+    env = dict(os.environ, HOME=home)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))] +
+        [p for p in [env.get('PYTHONPATH')] if p])
+
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", COMMAND],
+                          env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+    wall = time.perf_counter() - start
+
+    if proc.returncode != 0:
+        raise RuntimeError("ls-prj failed:\n" + proc.stderr)
+
+    modules = {}
+    for line in proc.stderr.splitlines():
+        m = IMPORTTIME_RE.match(line)
+        if m:
+            modules[m.group(4)] = int(m.group(2))
+
+    return wall, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=150.0,
+                        help="maximum cumulative import time of timetrack.cli")
+    parser.add_argument("--wall-budget-ms", type=float, default=500.0,
+                        help="maximum wall time of the whole command")
+    parser.add_argument("--runs", type=int, default=5,
+                        help="take the best of this many runs")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        # write a config so the first run doesn't time creating the default one
+        with open(os.path.join(home, ".timetrack"), "w") as f:
+            f.write("[driver]\ntype = file\ntrack_file = {}\n".format(
+                os.path.join(home, ".timetrack_log")))
+        open(os.path.join(home, ".timetrack_log"), "w").close()
+
+        results = [run_cold_start(home) for _ in range(args.runs)]
+
+    wall = min(r[0] for r in results) * 1000
+    modules = results[-1][1]
+    cli_import = min(r[1].get("timetrack.cli", 0) for r in results) / 1000
+
+    heavy = sorted({m.split(".")[0] for m in modules} & set(HEAVY_MODULES))
+
+    print("import timetrack.cli: {:.1f}ms (budget {:.1f}ms)".format(cli_import, args.budget_ms))
+    print("timetrack ls-prj wall time: {:.1f}ms (budget {:.1f}ms)".format(wall, args.wall_budget_ms))
+
+    failed = False
+
+    if heavy:
+        print("FAIL: heavy modules imported: " + ", ".join(heavy))
+        failed = True
+
+    if cli_import > args.budget_ms:
+        print("FAIL: import time over budget")
+        failed = True
+
+    if wall > args.wall_budget_ms:
+        print("FAIL: wall time over budget")
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Compare serial and parallel scans of a big synthetic log.
+
+Builds the file driver's index from scratch and reads every entry, first in
+a single process and then with the log split across a process pool, checks
+both give the same answers and prints the timings:
+
+    python benchmarks/parallel_scan.py --entries 2000000 --workers 4
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+from configparser import ConfigParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import generate_log
+
+
+def driver(workdir, track_file, workers):
+    from timetrack import TTFileDriver
+
+    config = ConfigParser()
+    config['timetrack'] = {"cache_dir": workdir}
+    config['driver'] = {"track_file": track_file, "index_file": "{}.idx{}".format(track_file, workers),
+                        "scan_workers": str(workers), "parallel_scan_bytes": "1"}
+
+    return TTFileDriver(config)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1000000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="timetrack-scan-")
+    problems = []
+
+    try:
+        track_file = os.path.join(workdir, "log")
+        generate_log(track_file, args.entries)
+
+        print("{} entries, {:.1f} MB".format(args.entries, os.path.getsize(track_file) / 1e6))
+
+        results = {}
+
+        for workers in (1, args.workers):
+            tt = driver(workdir, track_file, workers)
+
+            build, _ = timed(tt.index.build)
+            scan, entries = timed(lambda: [entry.to_dict() for entry in tt.get_filtered_entries()])
+
+            results[workers] = (tt.index, entries)
+            print("{} worker(s): index build {:.2f}s, full scan {:.2f}s".format(workers, build, scan))
+
+        (serial_index, serial_entries), (parallel_index, parallel_entries) = results[1], results[args.workers]
+
+        for name in ("offsets", "dates", "projects", "tasks", "moved", "deleted", "deltas", "max_id"):
+            if getattr(serial_index, name) != getattr(parallel_index, name):
+                problems.append("index {} differs".format(name))
+
+        if serial_entries != parallel_entries:
+            problems.append("entries differ")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for problem in problems:
+        print(problem)
+
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
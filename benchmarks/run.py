@@ -0,0 +1,286 @@
+"""Benchmark timetrack's drivers and commands.
+
+Generates synthetic logs of each requested size, times the file driver's
+queries and writes, the ls/report/completion commands end to end through
+Click's CliRunner, and the Harvest and router drivers against a local stub
+server with injected latency. Results are written as JSON so that runs on
+different commits can be compared:
+
+    python benchmarks/run.py --sizes 10000 100000 --output before.json
+    ... change things ...
+    python benchmarks/run.py --sizes 10000 100000 --output after.json --compare before.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+import contextlib
+
+from datetime import date, timedelta
+from configparser import ConfigParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import generate_log
+from stub_harvest import StubHarvest
+
+
+def measure(func, repeat, setup=None):
+    """Time func() repeat times (after an optional untimed setup()), quietly"""
+
+    runs = []
+
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            runs.append(time.perf_counter() - start)
+
+    return {"min": min(runs), "median": statistics.median(runs), "runs": runs}
+
+
+def file_config(track_file, **options):
+    config = ConfigParser()
+    config['timetrack'] = {"working_hours": "8"}
+    config['driver'] = dict({"type": "file", "track_file": track_file}, **options)
+    return config
+
+
+def bench_file_driver(workdir, size, repeat):
+    from timetrack import TTFileDriver
+
+    log = generate_log(os.path.join(workdir, "log-{}".format(size)), size)
+    config = file_config(log)
+    today = date.today()
+    results = {}
+
+    def drop_index():
+        TTFileDriver(config).index.invalidate()
+
+    # cold: sidecar index rebuilt from a full scan
+    results['index_build'] = measure(lambda: TTFileDriver(config).get_projects(), repeat, setup=drop_index)
+
+    # warm: a fresh driver per call, as each CLI invocation would create
+    queries = {
+        "narrow_range": lambda: list(TTFileDriver(config).get_filtered_entries(today, today)),
+        "month_range": lambda: list(TTFileDriver(config).get_filtered_entries(today - timedelta(days=30), today)),
+        "wide_range": lambda: list(TTFileDriver(config).get_filtered_entries()),
+        "get_projects": lambda: TTFileDriver(config).get_projects(),
+        "get_tasks": lambda: TTFileDriver(config).get_tasks(),
+    }
+
+    for name, query in queries.items():
+        results[name] = measure(query, repeat)
+
+    # writes mutate the log so work on copies
+    for mode, options in (("rewrite", {}), ("journal", {"journal": "yes"})):
+        copy = shutil.copy(log, log + "." + mode)
+        driver = TTFileDriver(file_config(copy, **options))
+
+        # delete a different entry each run, a repeated ID would only time the lookup miss
+        victims = iter(range(size // 3, size))
+
+        results['update_entry_' + mode] = measure(lambda: driver.update_entry(size // 2, 5), repeat)
+        results['delete_entry_' + mode] = measure(lambda: driver.delete_entry(next(victims)), repeat)
+
+    return results
+
+
+def bench_cli(workdir, size, repeat):
+    from click.testing import CliRunner
+    from timetrack.cli import cli
+
+    home = os.path.join(workdir, "home-{}".format(size))
+    os.makedirs(home)
+
+    log = generate_log(os.path.join(home, ".timetrack_log"), size)
+
+    with open(os.path.join(home, ".timetrack"), "w") as f:
+        file_config(log).write(f)
+
+    os.environ['HOME'] = home
+    os.environ['XDG_CACHE_HOME'] = os.path.join(home, ".cache")
+
+    runner = CliRunner()
+
+    def invoke(*args, **kwargs):
+        result = runner.invoke(cli, list(args), prog_name="timetrack", **kwargs)
+
+        if result.exit_code != 0:
+            raise RuntimeError("timetrack {} failed: {}".format(" ".join(args), result.output))
+
+    def complete(*args):
+        # click ends a real completion run with os._exit so CliRunner can't
+        # drive it; resolve the choices the same way click's completion does
+        from click._bashcomplete import get_choices
+        list(get_choices(cli, "timetrack", list(args), ""))
+
+    return {
+        "ls": measure(lambda: invoke("ls"), repeat),
+        "ls_month": measure(lambda: invoke("ls", "-m"), repeat),
+        "report_month": measure(lambda: invoke("report", "-m"), repeat),
+        "complete_project": measure(lambda: complete("add"), repeat),
+        "complete_task": measure(lambda: complete("add", "project", "1h", "-t"), repeat),
+    }
+
+
+def harvest_config(endpoint, section="harvest", **options):
+    config = ConfigParser()
+    config[section] = dict({"ACCESS_TOKEN": "token", "ACCOUNT_ID": "1", "endpoint": endpoint}, **options)
+    return config
+
+
+def bench_harvest(latency, entries, repeat):
+    from timetrack.harvest import TTHarvestDriver
+
+    today = date.today()
+    results = {}
+
+    with StubHarvest(entries=entries, latency=latency) as stub:
+
+        for prefetch in ("no", "yes"):
+            config = harvest_config(stub.endpoint, prefetch=prefetch, page_size="100")
+            results['entries_month_prefetch_' + prefetch] = measure(
+                lambda: list(TTHarvestDriver(config).get_filtered_entries(today - timedelta(days=30), today)),
+                repeat)
+
+        def lookups():
+            driver = TTHarvestDriver(harvest_config(stub.endpoint))
+            driver.get_projects()
+            driver.get_tasks()
+            driver.get_project_map()
+
+        stub.requests = 0
+        results['projects_tasks_map'] = measure(lookups, repeat)
+        results['projects_tasks_map']['requests_per_run'] = stub.requests / repeat
+
+    return results
+
+
+def bench_router(workdir, latency, entries, repeat):
+    from timetrack.router import TTRouterDriver
+
+    today = date.today()
+    log = generate_log(os.path.join(workdir, "router-log"), 10000)
+    results = {}
+
+    with StubHarvest(entries=entries, latency=latency) as stub_a, \
+            StubHarvest(entries=entries, latency=latency) as stub_b:
+
+        for concurrent in ("no", "yes"):
+            config = ConfigParser()
+            config['router'] = {"drivers": "a,b,local", "concurrent": concurrent}
+            config['a'] = dict(harvest_config(stub_a.endpoint, section="a")['a'], driver="harvest", prefix="A")
+            config['b'] = dict(harvest_config(stub_b.endpoint, section="b")['b'], driver="harvest", prefix="B")
+            config['local'] = {"driver": "file", "prefix": "L", "track_file": log}
+
+            results['entries_month_concurrent_' + concurrent] = measure(
+                lambda: list(TTRouterDriver(config).get_filtered_entries(today - timedelta(days=30), today)),
+                repeat)
+
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], universal_newlines=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Print min-time ratios against a baseline, returning True if anything regressed"""
+
+    regressed = False
+
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+
+        ratio = results[key]['min'] / baseline[key]['min'] if baseline[key]['min'] else float("inf")
+        flag = ""
+
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressed = True
+
+        print("{:55s} {:10.4f}s -> {:10.4f}s  x{:.2f}{}".format(
+            key, baseline[key]['min'], results[key]['min'], ratio, flag))
+
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000],
+                        help="synthetic log sizes in entries, e.g. 10000 100000 1000000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="seconds of latency the stub Harvest server adds to every request")
+    parser.add_argument("--harvest-entries", type=int, default=2000)
+    parser.add_argument("--skip", nargs="*", default=[], choices=["file", "cli", "harvest", "router"])
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--compare", default=None, help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="slowdown ratio above which a benchmark counts as a regression")
+    args = parser.parse_args()
+
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="timetrack-bench-")
+
+    try:
+        for size in args.sizes:
+            if "file" not in args.skip:
+                for name, result in bench_file_driver(workdir, size, args.repeat).items():
+                    results["file/{}/{}".format(size, name)] = result
+
+            if "cli" not in args.skip:
+                for name, result in bench_cli(workdir, size, args.repeat).items():
+                    results["cli/{}/{}".format(size, name)] = result
+
+        if "harvest" not in args.skip:
+            for name, result in bench_harvest(args.latency, args.harvest_entries, args.repeat).items():
+                results["harvest/{}".format(name)] = result
+
+        if "router" not in args.skip:
+            for name, result in bench_router(workdir, args.latency, args.harvest_entries, args.repeat).items():
+                results["router/{}".format(name)] = result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for key, result in sorted(results.items()):
+        print("{:55s} min {:10.4f}s  median {:10.4f}s".format(key, result['min'], result['median']))
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "meta": {
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "args": vars(args),
+            },
+            "results": results,
+        }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(results, json.load(f)['results'], args.tolerance):
+                return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
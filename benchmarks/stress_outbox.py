@@ -0,0 +1,99 @@
+"""Send queued Harvest entries through a stub server that fails on purpose.
+
+Queues entries in the Harvest driver's outbox, then keeps running the same
+flush `timetrack sync` uses against a stub that turns POSTs away and drops
+responses to POSTs it did store. At the end every entry must be on the
+"server" exactly once, the entry with an unknown project must have been
+rejected rather than retried, and the outbox must be empty apart from it:
+
+    python benchmarks/stress_outbox.py --entries 200 --post-failures 30 --lost-responses 30
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+
+from collections import Counter
+from configparser import ConfigParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_harvest import StubHarvest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=200)
+    parser.add_argument("--post-failures", type=int, default=30, help="POSTs answered 503 without storing")
+    parser.add_argument("--lost-responses", type=int, default=30, help="POSTs stored but answered 503")
+    parser.add_argument("--max-flushes", type=int, default=100)
+    args = parser.parse_args()
+
+    from timetrack.harvest import TTHarvestDriver
+
+    workdir = tempfile.mkdtemp(prefix="timetrack-outbox-")
+    problems = []
+
+    try:
+        with StubHarvest(post_failures=args.post_failures, lost_responses=args.lost_responses) as stub:
+            config = ConfigParser()
+            config['harvest'] = {"ACCESS_TOKEN": "token", "ACCOUNT_ID": "1", "endpoint": stub.endpoint,
+                                 "outbox_file": os.path.join(workdir, "outbox"),
+                                 "max_retries": "0", "sync_batch_size": "16"}
+
+            driver = TTHarvestDriver(config)
+
+            failures = driver.add_entries([{"project": "P{:02d}".format(n % 10), "time": 30,
+                                            "comment": "entry {}".format(n), "task": "Task {}".format(n % 5),
+                                            "date": "2026-01-01"} for n in range(args.entries)])
+            driver.add_entry("NOPE", 30, "unknown project", when="2026-01-01", task="Task 0")
+
+            if failures:
+                problems.append("entries failed to queue: {}".format(failures))
+
+            queued = len(list(driver.get_queued_entries()))
+
+            flushes = 0
+            result = None
+
+            while flushes < args.max_flushes:
+                flushes += 1
+                result = driver.flush_outbox()
+
+                if result[2] == 0:
+                    break
+
+            sent, rejected, still_queued = result
+            stored = Counter((e.get('external_reference') or {}).get('id') for e in stub.time_entries)
+
+            duplicates = [key for key, count in stored.items() if count > 1]
+            notes = Counter(e['notes'] for e in stub.time_entries)
+
+            if still_queued:
+                problems.append("{} entries still queued after {} flushes".format(still_queued, flushes))
+
+            if duplicates:
+                problems.append("{} entries were stored more than once".format(len(duplicates)))
+
+            missing = [n for n in range(args.entries) if notes.get("entry {}".format(n)) != 1]
+
+            if missing:
+                problems.append("{} entries missing or duplicated, e.g. entry {}".format(len(missing), missing[0]))
+
+            if len(rejected) != 1 or rejected[0][0]['project'] != "NOPE":
+                problems.append("expected just the unknown project to be rejected, got {}".format(rejected))
+
+            print("queued {}, {} flushes, {} POSTs for {} entries on the server, {} rejected".format(
+                queued, flushes, stub.posts, len(stub.time_entries), len(rejected)))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for problem in problems:
+        print(problem)
+
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
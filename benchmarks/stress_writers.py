@@ -0,0 +1,142 @@
+"""Hammer one log with concurrent writer processes and check nothing is lost.
+
+Each adder process appends entries with unique comments (singly and in small
+batches) while updater processes keep adding two minutes to the first entry,
+which rewrites the whole log unless --journal is given. Afterwards every
+added comment must be in the log exactly once, the first entry must carry
+every update, and the sidecar index must agree with a fresh scan:
+
+    python benchmarks/stress_writers.py --adders 8 --updaters 4 --entries 50
+"""
+import io
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import contextlib
+import multiprocessing
+
+from collections import Counter
+from configparser import ConfigParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_config(track_file, journal):
+    config = ConfigParser()
+    config['timetrack'] = {"working_hours": "8", "cache_dir": os.path.join(os.path.dirname(track_file), "cache")}
+    config['driver'] = {"type": "file", "track_file": track_file, "journal": "yes" if journal else "no"}
+    return config
+
+
+def adder(track_file, journal, worker, entries, start):
+    from timetrack import TTFileDriver
+
+    start.wait()
+    driver = TTFileDriver(make_config(track_file, journal))
+
+    n = 0
+    while n < entries:
+        # mix single appends with small batches
+        if n % 3 == 0:
+            batch = [{"project": "stress", "time": 5, "comment": "w{}-{}".format(worker, n + i)}
+                     for i in range(min(4, entries - n))]
+            failures = driver.add_entries(batch)
+            assert not failures, failures
+            n += len(batch)
+        else:
+            driver.add_entry("stress", 5, "w{}-{}".format(worker, n))
+            n += 1
+
+
+def updater(track_file, journal, updates, start):
+    from timetrack import TTFileDriver
+
+    start.wait()
+    driver = TTFileDriver(make_config(track_file, journal))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(updates):
+            driver.update_entry(1, 2)
+
+
+def check(track_file, journal, adders, entries, updaters, updates):
+    from timetrack import TTFileDriver
+
+    problems = []
+    driver = TTFileDriver(make_config(track_file, journal))
+    records = list(driver.get_filtered_entries())
+
+    comments = Counter(r['comment'] for r in records)
+
+    for worker in range(adders):
+        for n in range(entries):
+            seen = comments.get("w{}-{}".format(worker, n), 0)
+
+            if seen != 1:
+                problems.append("w{}-{} appears {} times".format(worker, n, seen))
+
+    first = [r for r in records if r['comment'] == "seed"]
+    expected = 10 + 2 * updaters * updates
+
+    if len(first) != 1 or first[0]['time'] != expected:
+        problems.append("seed entry is {}, expected time {}".format(first, expected))
+
+    # the incrementally maintained index must match a rebuild from scratch
+    driver.index.invalidate()
+    rebuilt = list(TTFileDriver(make_config(track_file, journal)).get_filtered_entries())
+
+    if [r.to_dict() for r in rebuilt] != [r.to_dict() for r in records]:
+        problems.append("sidecar index disagrees with a full scan of the log")
+
+    return problems, len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--adders", type=int, default=8)
+    parser.add_argument("--updaters", type=int, default=4)
+    parser.add_argument("--entries", type=int, default=50, help="entries written by each adder")
+    parser.add_argument("--updates", type=int, default=20, help="updates made by each updater")
+    parser.add_argument("--journal", action="store_true", help="use journal records instead of rewrites")
+    args = parser.parse_args()
+
+    from timetrack import TTFileDriver
+
+    workdir = tempfile.mkdtemp(prefix="timetrack-stress-")
+    track_file = os.path.join(workdir, "log")
+
+    try:
+        TTFileDriver(make_config(track_file, args.journal)).add_entry("stress", 10, "seed")
+
+        start = multiprocessing.Event()
+        procs = [multiprocessing.Process(target=adder, args=(track_file, args.journal, w, args.entries, start))
+                 for w in range(args.adders)]
+        procs += [multiprocessing.Process(target=updater, args=(track_file, args.journal, args.updates, start))
+                  for _ in range(args.updaters)]
+
+        for proc in procs:
+            proc.start()
+
+        start.set()
+
+        for proc in procs:
+            proc.join()
+
+        failed = [proc for proc in procs if proc.exitcode != 0]
+        problems, total = check(track_file, args.journal, args.adders, args.entries, args.updaters, args.updates)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for problem in problems[:20]:
+        print(problem)
+
+    print("{} writer processes, {} entries in the log, {} failed processes, {} problems".format(
+        len(procs), total, len(failed), len(problems)))
+
+    return 1 if problems or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""A local stand-in for the Harvest v2 API with injectable latency.
+
+Serves just enough of /users/me, /users/{id}/project_assignments, a
+paginated /time_entries listing (with updated_since), POSTs to
+/time_entries and PATCH and DELETE of single time entries for the Harvest
+and router drivers, and counts every request it receives. POSTs can be made
+to fail on purpose: `post_failures` are turned away with a 503 and
+`lost_responses` are stored but still answered with a 503, as if the
+response never made it back.
+"""
+import json
+import time
+import threading
+
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class StubHarvest:
+
+    def __init__(self, entries=0, projects=10, latency=0.0, post_failures=0, lost_responses=0):
+        self.latency = latency
+        self.requests = 0
+        self.posts = 0
+        self.post_failures = post_failures
+        self.lost_responses = lost_responses
+        self._lock = threading.Lock()
+        self._clock = 0
+        self._next_id = entries + 1
+
+        self.assignments = [{
+            "is_active": True,
+            "project": {"id": 100 + i, "code": "P{:02d}".format(i), "name": "Project {}".format(i)},
+            "client": {"name": "Client {}".format(i % 3)},
+            "task_assignments": [{"is_active": True, "task": {"id": 1000 + t, "name": "Task {}".format(t)}}
+                                 for t in range(5)],
+        } for i in range(projects)]
+
+        today = date.today()
+
+        self.time_entries = [{
+            "id": i + 1,
+            "spent_date": (today - timedelta(days=i % 28)).strftime("%Y-%m-%d"),
+            "hours": 0.5,
+            "notes": "entry {}".format(i),
+            "project": {"id": 100 + i % projects, "name": "Project {}".format(i % projects)},
+            "client": {"name": "Client {}".format(i % projects % 3)},
+            "task": {"id": 1000 + i % 5, "name": "Task {}".format(i % 5)},
+            "updated_at": self.tick(),
+        } for i in range(entries)]
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+
+    def tick(self):
+        """A fresh updated_at, one second after the last so that every write is distinguishable"""
+        self._clock += 1
+        return "2026-01-01T{:02d}:{:02d}:{:02d}Z".format(self._clock // 3600 % 24, self._clock // 60 % 60,
+                                                         self._clock % 60)
+
+    def edit(self, entry_id, **fields):
+        """Change a time entry as if someone had edited it in Harvest"""
+
+        with self._lock:
+            entry = next(e for e in self.time_entries if e['id'] == entry_id)
+            entry.update(fields)
+            entry['updated_at'] = self.tick()
+
+    @property
+    def endpoint(self):
+        return "http://127.0.0.1:{}/v2".format(self.server.server_address[1])
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code, body):
+                data = json.dumps(body).encode("utf8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+
+                time.sleep(stub.latency)
+
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+
+                if url.path.endswith("/users/me"):
+                    return self._send(200, {"id": 1})
+
+                if url.path.endswith("/project_assignments"):
+                    return self._send(200, {"project_assignments": stub.assignments, "next_page": None})
+
+                if url.path.endswith("/time_entries"):
+                    per_page = int(query.get("per_page", ["100"])[0])
+                    page = int(query.get("page", ["1"])[0])
+
+                    entries = [e for e in stub.time_entries
+                               if query.get("from", ["0"])[0] <= e['spent_date'] <= query.get("to", ["9"])[0]]
+
+                    if "updated_since" in query:
+                        entries = [e for e in entries if e['updated_at'] >= query['updated_since'][0]]
+
+                    if "external_reference_id" in query:
+                        entries = [e for e in entries if (e.get('external_reference') or {}).get('id')
+                                   == query['external_reference_id'][0]]
+                    pages = max((len(entries) + per_page - 1) // per_page, 1)
+
+                    return self._send(200, {
+                        "time_entries": entries[(page - 1) * per_page:page * per_page],
+                        "page": page,
+                        "total_pages": pages,
+                        "next_page": page + 1 if page < pages else None,
+                    })
+
+                self._send(404, {})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+                with stub._lock:
+                    stub.requests += 1
+                    stub.posts += 1
+
+                    if stub.post_failures > 0:
+                        stub.post_failures -= 1
+                        return self._send(503, {"message": "try again later"})
+
+                    entry = {"id": stub._next_id, "external_reference": body.get('external_reference')}
+                    stub._next_id += 1
+                    self._apply(entry, body)
+                    stub.time_entries.append(entry)
+
+                    if stub.lost_responses > 0:
+                        stub.lost_responses -= 1
+                        return self._send(503, {"message": "gateway timeout"})
+
+                time.sleep(stub.latency)
+                self._send(201, entry)
+
+            def _apply(self, entry, body):
+                assignment = next(a for a in stub.assignments if a['project']['id'] == body['project_id'])
+                task = next(t['task'] for t in assignment['task_assignments'] if t['task']['id'] == body['task_id'])
+
+                entry.update({
+                    "spent_date": body['spent_date'],
+                    "hours": body['hours'],
+                    "notes": body.get('notes'),
+                    "project": {"id": assignment['project']['id'], "name": assignment['project']['name']},
+                    "client": assignment['client'],
+                    "task": task,
+                    "updated_at": stub.tick(),
+                })
+
+            def _find(self):
+                entry_id = int(urlparse(self.path).path.rsplit("/", 1)[1])
+                return next((e for e in stub.time_entries if e['id'] == entry_id), None)
+
+            def do_PATCH(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+                with stub._lock:
+                    stub.requests += 1
+                    entry = self._find()
+
+                    if entry is None:
+                        return self._send(404, {})
+
+                    self._apply(entry, body)
+
+                self._send(200, entry)
+
+            def do_DELETE(self):
+                with stub._lock:
+                    stub.requests += 1
+                    entry = self._find()
+
+                    if entry is None:
+                        return self._send(404, {})
+
+                    stub.time_entries.remove(entry)
+
+                self._send(200, {})
+
+        return Handler
@@ -0,0 +1,67 @@
+"""Synthetic timetrack logs for benchmarking.
+
+Logs are written in the file driver's JSON lines format, spread backwards
+from today at a handful of entries per working day. Project and task
+popularity follows a rough Zipf curve so a few projects dominate like they do
+in real logs, and a small share of entries are back-dated out of order the way
+`add -d` produces them.
+"""
+import json
+import random
+
+from datetime import date, timedelta
+
+WORDS = ["fixed", "reviewed", "meeting", "about", "the", "parser", "release", "bug",
+         "report", "planning", "docs", "tests", "deploy", "client", "call", "refactor"]
+
+
+def _zipf_choices(rnd, names, k):
+    weights = [1.0 / (rank + 1) for rank in range(len(names))]
+    return rnd.choices(names, weights=weights, k=k)
+
+
+def generate_records(entries, projects=40, tasks=12, per_day=8, backdated=0.05, seed=0, end=None):
+    """Yield `entries` synthetic records, oldest first"""
+
+    rnd = random.Random(seed)
+    end = end or date.today()
+    start = end - timedelta(days=entries // per_day)
+
+    project_names = ["client-{:02d}/project-{:02d}".format(i % 7, i) for i in range(projects)]
+    task_names = ["task-{:02d}".format(i) for i in range(tasks)]
+
+    # draw in chunks to keep rnd.choices overhead down
+    chunk = 10000
+
+    for offset in range(0, entries, chunk):
+        count = min(chunk, entries - offset)
+        chunk_projects = _zipf_choices(rnd, project_names, count)
+        chunk_tasks = _zipf_choices(rnd, task_names, count)
+
+        for i in range(count):
+            day = start + timedelta(days=(offset + i) // per_day)
+
+            if rnd.random() < backdated:
+                day -= timedelta(days=rnd.randint(1, 30))
+
+            record = {
+                "date": day.strftime("%Y-%m-%d"),
+                "project": chunk_projects[i],
+                "time": rnd.choice([15, 30, 45, 60, 90, 120]),
+                "comment": " ".join(rnd.sample(WORDS, rnd.randint(2, 6))),
+            }
+
+            if rnd.random() < 0.8:
+                record['task'] = chunk_tasks[i]
+
+            yield record
+
+
+def generate_log(path, entries, **kwargs):
+    """Write a synthetic JSON lines log to path"""
+
+    with open(path, "w") as f:
+        for record in generate_records(entries, **kwargs):
+            f.write(json.dumps(record) + "\n")
+
+    return path
@@ -8,11 +8,12 @@ setup(
     #install requirements
     install_requires = ['progressbar2',
                         'matplotlib',
+                        'numpy',
                         'Click'],
     include_package_data=True,
     
     entry_points = {"console_scripts" : [
-        'timetrack = timetrack.cli:cli',
+        'timetrack = timetrack.client:main',
         ]},
 
     author="James Ravenscroft",
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from stub_harvest import StubHarvest
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    """A throwaway HOME so commands never touch the real config, log or caches"""
+
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("TIMETRACK_NO_DAEMON", "1")
+    monkeypatch.setenv("MPLBACKEND", "Agg")
+
+    return tmp_path
+
+
+@pytest.fixture
+def stub_harvest():
+    with StubHarvest(entries=40, projects=3) as stub:
+        yield stub
+
+
+@pytest.fixture
+def harvest_home(home, stub_harvest):
+    """HOME with a config pointing the Harvest driver at the stub server"""
+
+    (home / ".timetrack").write_text("\n".join([
+        "[timetrack]",
+        "working_hours = 10",
+        "cache_dir = {}".format(home / "cache"),
+        "",
+        "[driver]",
+        "type = harvest",
+        "",
+        "[harvest]",
+        "ACCESS_TOKEN = token",
+        "ACCOUNT_ID = 1",
+        "endpoint = {}".format(stub_harvest.endpoint),
+        "outbox_file = {}".format(home / "outbox"),
+        "",
+    ]))
+
+    return home
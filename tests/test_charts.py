@@ -0,0 +1,64 @@
+import json
+import sys
+
+from datetime import date
+
+from click.testing import CliRunner
+
+from timetrack.charts import TTChartRenderer, iter_periods
+from timetrack.cli import cli
+
+
+def test_unchanged_charts_are_skipped(home):
+    out = home / "charts"
+
+    renderer = TTChartRenderer(str(out), "svg")
+    assert renderer.render("week", "Week", {"a": 60, "b": 30})
+    renderer.save()
+
+    written = (out / "week.svg").stat().st_mtime_ns
+
+    # a later run only redraws what changed
+    renderer = TTChartRenderer(str(out), "svg")
+    assert not renderer.render("week", "Week", {"b": 30, "a": 60})
+    assert renderer.render("week", "Week", {"a": 90, "b": 30})
+    assert TTChartRenderer(str(out), "svg", "pie").render("other", "Week", {"a": 90})
+
+    assert (out / "week.svg").stat().st_mtime_ns != written
+
+    # a chart that went missing is drawn again
+    renderer.save()
+    (out / "week.svg").unlink()
+    assert TTChartRenderer(str(out), "svg").render("week", "Week", {"a": 90, "b": 30})
+
+
+def test_iter_periods_cover_whole_weeks_and_months():
+    weeks = list(iter_periods(date(2026, 3, 4), date(2026, 3, 17), "week"))
+    assert weeks == [("2026-W10", date(2026, 3, 2), date(2026, 3, 8)),
+                     ("2026-W11", date(2026, 3, 9), date(2026, 3, 15)),
+                     ("2026-W12", date(2026, 3, 16), date(2026, 3, 22))]
+
+    months = list(iter_periods(date(2025, 12, 20), date(2026, 2, 1), "month"))
+    assert [(name, last) for name, _, last in months] == [("2025-12", date(2025, 12, 31)),
+                                                          ("2026-01", date(2026, 1, 31)),
+                                                          ("2026-02", date(2026, 2, 28))]
+
+
+def test_report_series_is_headless(home):
+    (home / ".timetrack").write_text("[timetrack]\ncache_dir = {}\n\n[driver]\ntype = file\ntrack_file = {}\n".format(
+        home / "cache", home / "log"))
+    (home / "log").write_text("".join(json.dumps({"date": day, "project": project, "time": 30, "comment": ""}) + "\n"
+                                      for day, project in [("2026-01-05", "a"), ("2026-01-20", "b"),
+                                                           ("2026-03-02", "a")]))
+
+    out = home / "charts"
+    runner = CliRunner()
+
+    result = runner.invoke(cli, ["report", "--out", str(out), "--per", "month"])
+    assert result.exit_code == 0, result.output
+    assert "Wrote 2 chart(s)" in result.output
+    assert sorted(path.name for path in out.iterdir()) == [".timetrack-charts.json", "2026-01.png", "2026-03.png"]
+    assert "matplotlib.pyplot" not in sys.modules
+
+    result = runner.invoke(cli, ["report", "--out", str(out), "--per", "month"])
+    assert "Wrote 0 chart(s)" in result.output and "2 unchanged" in result.output
@@ -0,0 +1,80 @@
+import json
+
+from click.testing import CliRunner
+from configparser import ConfigParser
+
+from timetrack import TTFileDriver
+from timetrack.cli import cli
+from timetrack.compact import TTCompactDriver
+
+
+def compact_driver(home):
+    config = ConfigParser()
+    config['driver'] = {"compact_file": str(home / "log.bin")}
+    return TTCompactDriver(config)
+
+
+def test_fractional_minutes_round_trip(home):
+    driver = compact_driver(home)
+
+    records = [{"date": "2026-01-01", "project": "a", "time": 12.75, "comment": "live", "id": 1},
+               {"date": "2026-01-02", "project": "b", "time": 30, "comment": "whole", "id": 3},
+               {"op": "update", "ref": 1, "time": 0.5}]
+
+    assert driver.import_records(json.dumps(record) + "\n" for record in records) == (2, [])
+
+    driver.add_entry("c", 2.25, "added", when="2026-01-03")
+    driver.update_entry(3, 1.5)
+
+    assert [(entry.id, entry.time) for entry in driver.get_filtered_entries()] == [(1, 13.25), (3, 31.5), (4, 2.25)]
+
+
+def test_import_jsonl_reports_taken_ids(home):
+    (home / ".timetrack").write_text("[driver]\ntype = compact\ncompact_file = {}\n".format(home / "log.bin"))
+    log = home / "log.jsonl"
+    log.write_text("".join(json.dumps(record) + "\n" for record in [
+        {"date": "2026-01-01", "project": "a", "time": 10, "comment": "one", "id": 1},
+        {"date": "2026-01-02", "project": "a", "time": 20, "comment": "two", "id": 2}]))
+
+    runner = CliRunner()
+    assert "Imported 2 of 2 entries" in runner.invoke(cli, ["import-jsonl", str(log)]).output
+
+    result = runner.invoke(cli, ["import-jsonl", str(log)])
+
+    assert result.exception is None
+    assert "Line 1: TTCompactDriverException: Entry ID 1 is already taken" in result.output
+    assert "Imported 0 of 2 entries" in result.output
+
+
+def test_import_ids_follow_log_lines(home):
+    log = home / "log.jsonl"
+    log.write_text("\n".join([
+        json.dumps({"date": "2026-01-01", "project": "a", "time": 10, "comment": "one"}),
+        json.dumps({"op": "update", "ref": 1, "time": 5}),
+        "",
+        json.dumps({"date": "2026-01-02", "project": "a", "time": 20, "comment": "four"}),
+        json.dumps({"op": "delete", "ref": 4}),
+        json.dumps({"date": "2026-01-03", "project": "a", "time": 30, "comment": "six"}),
+    ]) + "\n")
+
+    config = ConfigParser()
+    config['timetrack'] = {"cache_dir": str(home / "cache")}
+    config['driver'] = {"track_file": str(log)}
+    expected = [(entry.id, entry.time, entry.comment) for entry in TTFileDriver(config).get_filtered_entries()]
+
+    driver = compact_driver(home)
+
+    with open(log) as f:
+        assert driver.import_records(f) == (3, [])
+
+    assert [(entry.id, entry.time, entry.comment) for entry in driver.get_filtered_entries()] == expected
+    assert expected == [(1, 15, "one"), (6, 30, "six")]
+
+
+def test_import_reports_undecodable_lines(home):
+    driver = compact_driver(home)
+
+    imported, failures = driver.import_records(['{"date": "2026-01-01", "project": "a", "time": 10}\n', '{broken\n'])
+
+    assert imported == 1
+    assert [(lineno, type(error)) for lineno, error in failures] == [(1, json.JSONDecodeError)]
@@ -0,0 +1,64 @@
+from configparser import ConfigParser
+
+from timetrack import TTFileDriver, profiling
+from timetrack.harvest import TTHarvestDriver
+
+
+def file_driver(home):
+    config = ConfigParser()
+    config['timetrack'] = {"cache_dir": str(home / "cache")}
+    config['driver'] = {"track_file": str(home / "log")}
+    return TTFileDriver(config)
+
+
+def harvest_driver(home, endpoint, ttl):
+    config = ConfigParser()
+    config['timetrack'] = {"cache_dir": str(home / "cache")}
+    config['harvest'] = {"ACCESS_TOKEN": "token", "ACCOUNT_ID": "1", "endpoint": endpoint,
+                         "outbox_file": str(home / "outbox"), "completion_ttl": str(ttl)}
+    return TTHarvestDriver(config)
+
+
+def completions(driver):
+    profiling.counters.clear()
+    result = driver.get_completions()
+    return result, profiling.counters["completion_cache_hits"], profiling.counters["index_builds"]
+
+
+def test_file_completion_follows_adds_and_edits(home, monkeypatch):
+    monkeypatch.setattr(profiling, "enabled", True)
+    driver = file_driver(home)
+    driver.add_entry("alpha", 10, "first", task="dev")
+
+    assert completions(driver)[0] == (["alpha"], ["dev"])
+
+    # folded in as the entry is written, so a new process answers from the cache alone
+    driver.add_entry("beta", 10, "second", task="ops")
+    assert completions(file_driver(home)) == ((["alpha", "beta"], ["dev", "ops"]), 1, 0)
+
+    # a hand edit changes the log's stamp and the catalogue is rebuilt
+    with open(str(home / "log"), "a") as f:
+        f.write('{"date": "2026-01-01", "project": "gamma", "time": 5, "comment": "by hand"}\n')
+
+    (projects, _), hits, _ = completions(file_driver(home))
+    assert projects == ["alpha", "beta", "gamma"]
+    assert hits == 0
+
+
+def test_harvest_completion_ttl(home, stub_harvest):
+
+    def requests_made(ttl):
+        before = stub_harvest.requests
+        result = harvest_driver(home, stub_harvest.endpoint, ttl).get_completions()
+        return result, stub_harvest.requests - before
+
+    # written already expired, so every process asks Harvest again
+    assert requests_made(0)[1] > 0
+    assert requests_made(0)[1] > 0
+
+    (projects, tasks), made = requests_made(3600)
+    assert made > 0
+    assert projects == ["Client {0}/P0{0}/Project {0}".format(n) for n in range(3)]
+    assert tasks == ["Task {}".format(n) for n in range(5)]
+
+    assert requests_made(3600) == ((projects, tasks), 0)
@@ -0,0 +1,86 @@
+import io
+import contextlib
+import multiprocessing
+
+import pytest
+
+from collections import Counter
+from configparser import ConfigParser
+
+from timetrack import TTFileDriver
+from timetrack.index import TTLogIndex
+
+WRITERS = 4
+ENTRIES = 75
+UPDATES = 20
+
+
+def file_driver(home, journal):
+    config = ConfigParser()
+    config['timetrack'] = {"cache_dir": str(home / "cache")}
+    config['driver'] = {"track_file": str(home / "log"), "journal": journal}
+    return TTFileDriver(config)
+
+
+def writer(home, journal, worker, start):
+    start.wait()
+    driver = file_driver(home, journal)
+
+    for n in range(0, ENTRIES, 5):
+        # half single appends, half small batches
+        if n % 10:
+            driver.add_entries([{"project": "p", "time": 5, "comment": "w{}-{}".format(worker, n + i)}
+                                for i in range(5)])
+        else:
+            for i in range(5):
+                driver.add_entry("p", 5, "w{}-{}".format(worker, n + i))
+
+
+def updater(home, journal, start):
+    start.wait()
+    driver = file_driver(home, journal)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(UPDATES):
+            driver.update_entry(1, 2)
+
+
+@pytest.mark.parametrize("journal", ["no", "yes"])
+def test_concurrent_writers_lose_nothing(home, journal):
+    file_driver(home, journal).add_entry("p", 10, "seed")
+
+    context = multiprocessing.get_context("fork")
+    start = context.Event()
+
+    processes = [context.Process(target=writer, args=(home, journal, worker, start)) for worker in range(WRITERS)]
+    processes.append(context.Process(target=updater, args=(home, journal, start)))
+
+    for process in processes:
+        process.start()
+
+    start.set()
+
+    for process in processes:
+        process.join(60)
+
+    assert [process.exitcode for process in processes] == [0] * len(processes)
+
+    entries = list(file_driver(home, journal).get_filtered_entries())
+    comments = Counter(entry.comment for entry in entries)
+
+    assert len(entries) == WRITERS * ENTRIES + 1
+    assert all(comments["w{}-{}".format(worker, n)] == 1 for worker in range(WRITERS) for n in range(ENTRIES))
+    assert len({entry.id for entry in entries}) == len(entries)
+
+    seed, = [entry for entry in entries if entry.comment == "seed"]
+    assert seed.time == 10 + 2 * UPDATES
+
+    # the index the writers kept up to date agrees with one built from scratch
+    kept = TTLogIndex(str(home / "log"))
+    assert kept.load()
+
+    fresh = TTLogIndex(str(home / "log"), index_file=str(home / "fresh.idx"))
+    fresh.build()
+
+    assert kept.lookup() == fresh.lookup()
+    assert kept.next_id() == fresh.next_id()
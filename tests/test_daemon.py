@@ -0,0 +1,36 @@
+import threading
+
+from timetrack.daemon import TTDaemon
+
+
+def test_requests_answered_during_flush(home):
+    daemon = TTDaemon(socket_path=str(home / "sock"))
+    daemon._load()
+
+    started, release = threading.Event(), threading.Event()
+
+    def slow_flush(drop_failed=False):
+        started.set()
+        release.wait(10)
+        return 0, [], 0
+
+    daemon.obj['DRIVER'].flush_outbox = slow_flush
+
+    flusher = threading.Thread(target=daemon._flush)
+    flusher.start()
+
+    try:
+        assert started.wait(5)
+
+        responses = []
+        request = threading.Thread(target=lambda: responses.append(daemon.handle({"argv": ["ls"]})))
+        request.start()
+        request.join(5)
+
+        assert responses, "request blocked behind the flush"
+        assert responses[0]['code'] == 0
+        assert "Time spent today" in responses[0]['stdout']
+        assert flusher.is_alive()
+    finally:
+        release.set()
+        flusher.join(5)
@@ -0,0 +1,26 @@
+import csv
+import io
+
+from click.testing import CliRunner
+
+from timetrack.cli import cli
+
+
+def test_export_is_date_ordered_on_unordered_driver(harvest_home):
+    result = CliRunner().invoke(cli, ["export", "-f", "csv"])
+    assert result.exit_code == 0, result.output
+
+    rows = list(csv.DictReader(io.StringIO(result.output)))
+
+    assert len(rows) == 40
+    assert [row['date'] for row in rows] == sorted(row['date'] for row in rows)
+
+
+def test_ical_stamp_is_utc(home):
+    from timetrack.export import write_ical
+
+    out = io.StringIO()
+    write_ical([{"date": "2026-01-01", "project": "p", "time": 30, "id": 1}], out)
+
+    stamp = next(line for line in out.getvalue().split("\r\n") if line.startswith("DTSTAMP:"))
+    assert stamp.endswith("Z") and len(stamp) == len("DTSTAMP:20260101T000000Z")
@@ -0,0 +1,127 @@
+from configparser import ConfigParser
+
+from timetrack.harvest import TTHarvestDriver
+
+
+def harvest_driver(home, endpoint, **options):
+    config = ConfigParser()
+    config['timetrack'] = {"cache_dir": str(home / "cache")}
+    config['harvest'] = dict({"ACCESS_TOKEN": "token", "ACCOUNT_ID": "1", "endpoint": endpoint,
+                              "outbox_file": str(home / "outbox"), "backoff": "0"}, **options)
+    return TTHarvestDriver(config)
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, headers=None, data=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = b""
+        self.data = data
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        assert self.status_code < 400
+
+
+def script(driver, monkeypatch, *statuses):
+    """Answer the driver's requests with the given statuses in turn, returning the calls made"""
+
+    responses = iter(FakeResponse(*status) if isinstance(status, tuple) else FakeResponse(status)
+                     for status in statuses)
+    calls = []
+
+    def request(method, url, headers=None, *args, **kwargs):
+        calls.append((method, dict(headers or {})) if headers else method)
+        return next(responses)
+
+    monkeypatch.setattr(driver.session, "request", request)
+
+    return calls
+
+
+def test_read_only_resources_fetched_once(home, stub_harvest):
+    driver = harvest_driver(home, stub_harvest.endpoint)
+
+    driver.get_projects()
+    driver.get_tasks()
+    driver.get_project_map()
+    driver.get_user_info()
+
+    # one /users/me and one project assignments listing
+    assert stub_harvest.requests == 2
+
+
+def test_rate_limits_are_retried(home, monkeypatch):
+    driver = harvest_driver(home, "http://127.0.0.1:9/v2", max_retries="3")
+    calls = script(driver, monkeypatch, (429, {"Retry-After": "0"}), 503, 200)
+
+    assert driver.request("GET", "/users/me").status_code == 200
+    assert calls == ["GET", "GET", "GET"]
+
+
+def test_retries_give_up(home, monkeypatch):
+    driver = harvest_driver(home, "http://127.0.0.1:9/v2", max_retries="1")
+    calls = script(driver, monkeypatch, 503, 503, 200)
+
+    assert driver.request("GET", "/users/me").status_code == 503
+    assert len(calls) == 2
+
+
+def test_posts_only_retry_rate_limits(home, monkeypatch):
+    driver = harvest_driver(home, "http://127.0.0.1:9/v2")
+
+    # a 503 may have been stored, sending it again could duplicate the entry
+    calls = script(driver, monkeypatch, 503, 201)
+    assert driver.request("POST", "/time_entries").status_code == 503
+    assert calls == ["POST"]
+
+    calls = script(driver, monkeypatch, 429, 201)
+    assert driver.request("POST", "/time_entries").status_code == 201
+    assert calls == ["POST", "POST"]
+
+
+def test_stale_responses_are_revalidated(home, monkeypatch):
+    driver = harvest_driver(home, "http://127.0.0.1:9/v2", cache_ttl="0")
+    calls = script(driver, monkeypatch, (200, {"ETag": '"v1"'}, {"id": 7}), (304, {"ETag": '"v1"'}))
+
+    assert driver.get_cached("/users/me") == {"id": 7}
+    assert driver.get_cached("/users/me") == {"id": 7}
+    assert calls == ["GET", ("GET", {"If-None-Match": '"v1"'})]
+
+
+def listing_requests(stub, driver, limit=None, **kwargs):
+    """Fetch entries, returning them and the number of /time_entries pages requested"""
+
+    driver.get_user_info()
+    driver.get_project_map()
+    before = stub.requests
+
+    entries = []
+
+    for entry in driver.get_filtered_entries(**kwargs):
+        entries.append(entry)
+
+        if len(entries) == limit:
+            break
+
+    return entries, stub.requests - before
+
+
+def test_pagination_follows_every_page(home, stub_harvest):
+    for prefetch in ("yes", "no"):
+        driver = harvest_driver(home, stub_harvest.endpoint, prefetch=prefetch)
+        entries, pages = listing_requests(stub_harvest, driver, page_size=7)
+
+        assert sorted(entry.comment for entry in entries) == sorted("entry {}".format(n) for n in range(40))
+        assert pages == 6
+
+
+def test_pages_are_fetched_as_needed(home, stub_harvest):
+    driver = harvest_driver(home, stub_harvest.endpoint, prefetch="no", page_size="10")
+    entries, pages = listing_requests(stub_harvest, driver, limit=5)
+
+    assert len(entries) == 5
+    assert pages == 1
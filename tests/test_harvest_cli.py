@@ -0,0 +1,39 @@
+import pytest
+
+from click.testing import CliRunner
+
+from timetrack.cli import cli
+
+
+def run(*args):
+    result = CliRunner().invoke(cli, list(args))
+
+    if result.exception is not None and not isinstance(result.exception, SystemExit):
+        raise result.exception
+
+    assert result.exit_code == 0, result.output
+
+    return result.output
+
+
+@pytest.mark.parametrize("args", [("ls",), ("ls", "-w"), ("ls", "-m")])
+def test_ls_on_harvest(harvest_home, args):
+    output = run(*args)
+
+    assert "Time spent today" in output
+
+
+@pytest.mark.parametrize("args", [("report",), ("report", "-m")])
+def test_report_on_harvest(harvest_home, args):
+    output = run(*args)
+
+    assert "Project Breakdown" in output
+
+
+def test_harvest_tasks_are_names(harvest_home):
+    from timetrack import create_driver, load_config
+
+    entries = list(create_driver(load_config(), "harvest").get_filtered_entries())
+
+    assert entries
+    assert all(isinstance(entry.task, str) and entry.task.startswith("Task ") for entry in entries)
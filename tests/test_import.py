@@ -0,0 +1,89 @@
+import json
+
+from click.testing import CliRunner
+
+from timetrack import create_driver, load_config
+from timetrack.cli import cli
+
+
+def configure(home):
+    (home / ".timetrack").write_text("[timetrack]\ncache_dir = {}\n\n[driver]\ntype = file\ntrack_file = {}\n".format(
+        home / "cache", home / "log"))
+
+
+def test_csv_import_reports_bad_rows(home):
+    configure(home)
+    source = home / "in.csv"
+    source.write_text("date,project,time,comment,task\n"
+                      "2026-01-01,alpha,30,first,dev\n"
+                      "2026-01-02,alpha,0,too short,\n"
+                      "2026-01-03,beta,1h,third,\n"
+                      "01/04/2026,beta,10,bad date,\n")
+
+    result = CliRunner().invoke(cli, ["import", str(source)])
+
+    assert result.exit_code == 0, result.output
+    assert "Entry 2: TimerException" in result.output
+    assert "Entry 4: ValueError" in result.output
+    assert "Imported 2 of 4 entries" in result.output
+
+    entries = list(create_driver(load_config(), "file").get_filtered_entries())
+    assert [(entry.id, entry.project, entry.time, entry.task) for entry in entries] == \
+        [(1, "alpha", 30, "dev"), (2, "beta", 60, None)]
+
+
+def test_jsonl_import_appends_in_one_write(home, monkeypatch):
+    import os
+
+    configure(home)
+    source = home / "in.jsonl"
+    source.write_text("".join(json.dumps({"date": "2026-02-0{}".format(n), "project": "p", "time": 10 * n,
+                                          "comment": "e{}".format(n)}) + "\n" for n in range(1, 6)))
+
+    writes = []
+    real_write = os.write
+
+    def write(fd, data):
+        writes.append(len(data))
+        return real_write(fd, data)
+
+    monkeypatch.setattr(os, "write", write)
+
+    result = CliRunner().invoke(cli, ["import", str(source)])
+
+    assert "Imported 5 of 5 entries" in result.output
+    assert len(writes) == 1
+    assert [entry.time for entry in create_driver(load_config(), "file").get_filtered_entries()] == \
+        [10, 20, 30, 40, 50]
+
+
+def test_harvest_import_reports_per_entry(harvest_home):
+    source = harvest_home / "in.csv"
+    source.write_text("date,project,time,comment,task\n"
+                      "2026-01-01,P00,30,fine,Task 1\n"
+                      "2026-01-01,P01,30,no task,\n")
+
+    result = CliRunner().invoke(cli, ["import", str(source)])
+
+    assert "Entry 2: Exception: Harvest requires a task" in result.output
+    assert "Imported 1 of 2 entries" in result.output
+
+
+def test_harvest_posts_batch_concurrently(home, stub_harvest):
+    from configparser import ConfigParser
+    from timetrack.harvest import TTHarvestDriver
+
+    config = ConfigParser()
+    config['timetrack'] = {"cache_dir": str(home / "cache")}
+    config['harvest'] = {"ACCESS_TOKEN": "token", "ACCOUNT_ID": "1", "endpoint": stub_harvest.endpoint,
+                         "outbox": "no", "concurrency": "3"}
+    driver = TTHarvestDriver(config)
+
+    entries = [{"date": "2026-01-01", "project": "P0{}".format(n % 3), "time": 30, "comment": "e{}".format(n),
+                "task": "Task 1"} for n in range(10)]
+    entries[4]['project'] = "NOPE"
+
+    failures = driver.add_entries(entries)
+
+    assert [position for position, _ in failures] == [4]
+    assert stub_harvest.posts == 9
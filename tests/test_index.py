@@ -0,0 +1,98 @@
+import json
+import os
+
+from configparser import ConfigParser
+from datetime import date
+
+from timetrack import TTFileDriver
+from timetrack.index import TTLogIndex, MAX_DELTA_LINES
+
+
+def file_driver(home):
+    config = ConfigParser()
+    config['timetrack'] = {"cache_dir": str(home / "cache")}
+    config['driver'] = {"track_file": str(home / "log"), "journal": "yes"}
+    return TTFileDriver(config)
+
+
+def add(driver, day, *comments):
+    driver.add_entries([{"project": "p{}".format(len(comment) % 3), "time": 10, "comment": comment,
+                         "date": day, "task": "t" if len(comment) % 2 else None}
+                        for comment in comments])
+
+
+def plain_scan(path, start, finish, project):
+    """What the driver should return, read straight from the log"""
+
+    lines = [json.loads(line) for line in open(path) if line.strip()]
+    entries = {record.get('id', lineno + 1): record for lineno, record in enumerate(lines) if 'op' not in record}
+
+    for record in lines:
+        if record.get('op') == "delete":
+            entries.pop(record['ref'], None)
+        elif record.get('op') == "update":
+            entries[record['ref']] = dict(entries[record['ref']], time=entries[record['ref']]['time'] + record['time'])
+
+    return sorted((record['date'], entry_id, record['time'], record['comment'])
+                  for entry_id, record in entries.items()
+                  if start <= record['date'] <= finish and project in (None, record['project']))
+
+
+def test_adds_go_to_the_delta(home):
+    driver = file_driver(home)
+    add(driver, "2026-01-01", "a", "bb")
+
+    sidecar = home / "log.idx"
+    before = sidecar.read_bytes()
+
+    add(driver, "2026-01-02", "ccc")
+    add(driver, "2026-01-03", "dddd")
+
+    assert sidecar.read_bytes() == before
+    assert len((home / "log.idx.delta").read_text().splitlines()) == 3
+
+    # a fresh process picks the appended lines up without rebuilding
+    index = TTLogIndex(str(home / "log"))
+    assert index.load()
+    assert index.lookup("2026-01-02", "2026-01-03") == [2, 3]
+
+
+def test_delta_folds_back_into_sidecar(home):
+    driver = file_driver(home)
+
+    for n in range(MAX_DELTA_LINES + 2):
+        add(driver, "2026-02-01", "e{}".format(n))
+
+    assert not (home / "log.idx.delta").exists() or \
+        len((home / "log.idx.delta").read_text().splitlines()) < MAX_DELTA_LINES
+
+    index = TTLogIndex(str(home / "log"))
+    assert index.load()
+    assert len(index.lookup()) == MAX_DELTA_LINES + 2
+
+
+def test_index_matches_plain_scan(home):
+    driver = file_driver(home)
+
+    for day in range(1, 10):
+        add(driver, "2026-03-0{}".format(day), *("x" * n for n in range(1, day + 1)))
+
+    driver.delete_entry(4)
+    driver.update_entry(7, 5)
+    add(driver, "2026-03-05", "late")
+
+    for start, finish, project in [("2026-03-01", "2026-03-09", None), ("2026-03-03", "2026-03-05", None),
+                                   ("2026-03-02", "2026-03-08", "p1")]:
+        expected = plain_scan(home / "log", start, finish, project)
+
+        # the warm in-memory index, then one loaded from the sidecar and delta
+        for fresh in (False, True):
+            if fresh:
+                driver = file_driver(home)
+
+            entries = driver.get_filtered_entries(*(date.fromisoformat(day) for day in (start, finish)),
+                                                  project=project)
+
+            assert sorted((entry.date, entry.id, entry.time, entry.comment) for entry in entries) == expected
+
+    assert os.path.exists(home / "log.idx.delta")
@@ -0,0 +1,62 @@
+from configparser import ConfigParser
+
+from timetrack import TTFileDriver
+
+
+def file_driver(home, journal):
+    config = ConfigParser()
+    config['timetrack'] = {"cache_dir": str(home / "cache")}
+    config['driver'] = {"track_file": str(home / "log"), "journal": "yes" if journal else "no"}
+    return TTFileDriver(config)
+
+
+def listing(driver):
+    return [(entry.id, entry.comment) for entry in driver.get_filtered_entries()]
+
+
+def add(driver, *comments):
+    driver.add_entries([{"project": "p", "time": 10, "comment": comment, "date": "2026-01-01"}
+                        for comment in comments])
+
+
+def test_journal_ids_survive_compaction(home):
+    driver = file_driver(home, True)
+    add(driver, "e1", "e2", "e3", "e4")
+
+    driver.delete_entry(2)
+    driver.update_entry(3, 5)
+    assert driver.compact()
+
+    add(driver, "new")
+
+    # IDs are never handed out twice, the journal lines took 5 and 6
+    assert listing(driver) == [(1, "e1"), (3, "e3"), (4, "e4"), (7, "new")]
+    assert driver.get_entry(3).time == 15
+    assert driver.get_entry(2) is None
+
+
+def test_plain_rm_after_compact_keeps_ids(home):
+    journal = file_driver(home, True)
+    add(journal, "e1", "e2", "e3")
+    journal.compact()
+    add(journal, "new")
+
+    plain = file_driver(home, False)
+    assert plain.delete_entry(1)
+    assert plain.delete_entry(2)
+
+    assert listing(plain) == [(3, "e3"), (5, "new")]
+
+    add(plain, "after")
+    ids = [entry_id for entry_id, _ in listing(plain)]
+
+    assert ids[:2] == [3, 5] and len(set(ids)) == 3
+
+
+def test_plain_rm_without_compaction_renumbers(home):
+    driver = file_driver(home, False)
+    add(driver, "e1", "e2", "e3")
+
+    driver.delete_entry(1)
+
+    assert listing(driver) == [(1, "e2"), (2, "e3")]
@@ -0,0 +1,59 @@
+import requests
+
+from datetime import date
+from configparser import ConfigParser
+
+from timetrack.harvest import TTHarvestDriver
+
+
+def driver_for(home, stub):
+    config = ConfigParser()
+    config['timetrack'] = {"cache_dir": str(home / "cache")}
+    config['harvest'] = {"ACCESS_TOKEN": "token", "ACCOUNT_ID": "1", "endpoint": stub.endpoint,
+                         "outbox_file": str(home / "outbox"), "max_retries": "0"}
+    return TTHarvestDriver(config)
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} error", response=response)
+
+
+def test_permanent_lookup_error_fails_the_entry(home, stub_harvest, monkeypatch):
+    driver = driver_for(home, stub_harvest)
+    today = date.today().strftime("%Y-%m-%d")
+
+    driver.add_entry("Client 0/P00/Project 0", 30, "first", when=today, task="Task 0")
+    driver.add_entry("Client 1/P01/Project 1", 30, "second", when=today, task="Task 1")
+
+    # both were attempted before, the first one's reference lookup is forbidden
+    first, second = [key for key, _ in driver.outbox.pending()]
+    driver.outbox.mark_attempted([first, second])
+
+    def find_by_reference(reference):
+        if reference == first:
+            raise http_error(403)
+
+    monkeypatch.setattr(driver, "find_by_reference", find_by_reference)
+
+    sent, failed, queued = driver.flush_outbox()
+
+    assert sent == 1 and queued == 0
+    assert len(failed) == 1 and "403" in failed[0][1]
+
+
+def test_rate_limited_lookup_is_retried(home, stub_harvest, monkeypatch):
+    driver = driver_for(home, stub_harvest)
+
+    driver.add_entry("Client 0/P00/Project 0", 30, "first", when=date.today().strftime("%Y-%m-%d"), task="Task 0")
+    driver.outbox.mark_attempted([key for key, _ in driver.outbox.pending()])
+
+    def find_by_reference(reference):
+        raise http_error(429)
+
+    monkeypatch.setattr(driver, "find_by_reference", find_by_reference)
+
+    sent, failed, queued = driver.flush_outbox()
+
+    assert (sent, failed, queued) == (0, [], 1)
@@ -0,0 +1,35 @@
+from datetime import date, timedelta
+from configparser import ConfigParser
+
+from timetrack.router import TTRouterDriver
+from timetrack.harvest import TTHarvestDriver
+
+
+def harvest_config(home, endpoint, section="harvest", **options):
+    config = ConfigParser()
+    config['timetrack'] = {"cache_dir": str(home / "cache")}
+    config[section] = dict({"ACCESS_TOKEN": "token", "ACCOUNT_ID": "1", "endpoint": endpoint,
+                            "outbox_file": str(home / "outbox")}, **options)
+    return config
+
+
+def test_harvest_rollups(home, stub_harvest):
+    driver = TTHarvestDriver(harvest_config(home, stub_harvest.endpoint))
+
+    rows = driver.get_rollups(date.today() - timedelta(days=30), date.today())
+
+    assert sum(row['time'] for row in rows) == 40 * 30
+    assert all(isinstance(row['task'], str) for row in rows)
+
+
+def test_router_rollups(home, stub_harvest):
+    config = harvest_config(home, stub_harvest.endpoint, section="remote", driver="harvest", prefix="H")
+    config['router'] = {"drivers": "remote,local"}
+    config['local'] = {"driver": "file", "prefix": "L", "track_file": str(home / "log")}
+
+    driver = TTRouterDriver(config)
+    driver.add_entry("L_local", "1h", "here", when=date.today().strftime("%Y-%m-%d"), task="L_dev")
+
+    rows = driver.get_rollups(date.today() - timedelta(days=30), date.today())
+
+    assert sum(row['time'] for row in rows) == 40 * 30 + 60
@@ -0,0 +1,64 @@
+import time
+import warnings
+
+from datetime import date, timedelta
+from configparser import ConfigParser
+
+from timetrack.router import TTRouterDriver, TTRouterWarning
+
+
+def router(home, endpoint, router_timeout="30", **remote):
+    config = ConfigParser()
+    config['timetrack'] = {"cache_dir": str(home / "cache")}
+    config['router'] = {"drivers": "remote,local", "concurrent": "yes", "timeout": router_timeout}
+    config['remote'] = dict({"driver": "harvest", "prefix": "H", "ACCESS_TOKEN": "token", "ACCOUNT_ID": "1",
+                             "endpoint": endpoint, "outbox_file": str(home / "outbox"), "max_retries": "0"},
+                            **remote)
+    config['local'] = {"driver": "file", "prefix": "L", "track_file": str(home / "log")}
+
+    driver = TTRouterDriver(config)
+    driver.add_entry("L_local", "1h", "here", when=date.today().strftime("%Y-%m-%d"), task="L_dev")
+
+    return driver
+
+
+def listing(driver):
+    start = date.today() - timedelta(days=30)
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        entries = list(driver.get_filtered_entries(start, date.today()))
+
+    return entries, [str(w.message) for w in caught if issubclass(w.category, TTRouterWarning)]
+
+
+def test_timeouts_are_per_driver(home, stub_harvest):
+    driver = router(home, stub_harvest.endpoint, timeout="0.2")
+
+    assert driver.timeouts == {"H": 0.2, "L": 30}
+
+
+def test_slow_driver_gives_partial_results(home, stub_harvest):
+    stub_harvest.latency = 2
+    driver = router(home, stub_harvest.endpoint, timeout="0.3")
+
+    began = time.monotonic()
+    entries, caught = listing(driver)
+
+    assert time.monotonic() - began < 1.5
+    assert [entry['id'] for entry in entries] == ["L_1"]
+    assert caught == ["Driver H sent nothing for 0.3s, results are partial"]
+
+
+def test_timeout_applies_between_results(home, stub_harvest):
+    # every page arrives within the router's timeout even though the whole listing takes longer
+    stub_harvest.latency = 0.1
+    driver = router(home, stub_harvest.endpoint, router_timeout="0.5", page_size="5")
+
+    began = time.monotonic()
+    entries, caught = listing(driver)
+
+    assert time.monotonic() - began > 0.5
+    assert caught == []
+    assert len(entries) == 41
+    assert [entry['date'] for entry in entries] == sorted(entry['date'] for entry in entries)
@@ -0,0 +1,58 @@
+from configparser import ConfigParser
+
+from timetrack import TTFileDriver
+
+
+def file_driver(home, parallel):
+    config = ConfigParser()
+    config['timetrack'] = {"cache_dir": str(home / "cache")}
+    config['driver'] = {"track_file": str(home / "log"), "index_file": str(home / "log.idx{}".format(parallel)),
+                        "journal": "yes", "scan_workers": "2" if parallel else "1", "parallel_scan_bytes": "1"}
+    return TTFileDriver(config)
+
+
+def test_parallel_scan_matches_serial(home):
+    serial = file_driver(home, False)
+    serial.add_entries([{"project": "p{}".format(i % 3), "time": 10 + i, "comment": "entry {}".format(i),
+                         "date": "2026-01-{:02d}".format(28 - i % 28)} for i in range(200)])
+
+    for entry_id in range(1, 200, 5):
+        serial.delete_entry(entry_id)
+
+    serial.update_entry(2, 5)
+
+    parallel = file_driver(home, True)
+
+    assert [e.to_dict() for e in parallel.get_filtered_entries()] == \
+        [e.to_dict() for e in serial.get_filtered_entries()]
+    assert [e.id for e in parallel.get_filtered_entries(project="p1")] == \
+        [e.id for e in serial.get_filtered_entries(project="p1")]
+
+
+def test_parallel_scan_can_stop_early(home):
+    driver = file_driver(home, True)
+    driver.add_entries([{"project": "p", "time": 10, "comment": "c", "date": "2026-01-01"} for _ in range(500)])
+
+    entries = driver.get_filtered_entries()
+    first = next(entries)
+    entries.close()
+
+    assert first.id == 1
+
+
+def test_parallel_scan_is_used(home):
+    from timetrack import profiling
+
+    driver = file_driver(home, True)
+    driver.add_entries([{"project": "p", "time": 10, "comment": "c", "date": "2026-01-01"} for _ in range(50)])
+    driver.delete_entry(3)
+
+    enabled = profiling.enabled
+    profiling.enabled = True
+    profiling.counters.clear()
+
+    try:
+        assert len(list(driver.get_filtered_entries())) == 49
+        assert profiling.counters["parallel_scans"] == 1
+    finally:
+        profiling.enabled = enabled
@@ -0,0 +1,32 @@
+from configparser import ConfigParser
+
+from timetrack import TTFileDriver
+
+
+def file_driver(home):
+    config = ConfigParser()
+    config['timetrack'] = {"cache_dir": str(home / "cache")}
+    config['driver'] = {"track_file": str(home / "log")}
+    return TTFileDriver(config)
+
+
+def test_search_uses_index(home):
+    driver = file_driver(home)
+    driver.add_entries([{"project": "a", "time": 10, "comment": "fix the parser", "date": "2026-01-02"},
+                        {"project": "b", "time": 20, "comment": "write docs", "date": "2026-01-01"},
+                        {"project": "a", "time": 30, "comment": "parser tests", "date": "2026-01-01"}])
+
+    assert [entry.comment for entry in driver.search_entries(["pars*"])] == ["parser tests", "fix the parser"]
+    assert [entry.comment for entry in driver.search_entries(["docs"], project="a")] == []
+
+
+def test_search_falls_back_when_segment_keeps_changing(home, monkeypatch):
+    driver = file_driver(home)
+    driver.add_entries([{"project": "a", "time": 10, "comment": "fix the parser", "date": "2026-01-02"},
+                        {"project": "b", "time": 20, "comment": "write docs", "date": "2026-01-01"}])
+
+    # as if another process replaced the segment after every rebuild
+    monkeypatch.setattr(driver.search, "lookup", lambda query: None)
+
+    assert [entry.comment for entry in driver.search_entries(["parser"])] == ["fix the parser"]
+    assert [entry.id for entry in driver.search_entries(["docs"])] == [2]
@@ -0,0 +1,96 @@
+from datetime import date
+from configparser import ConfigParser
+
+from click.testing import CliRunner
+
+from timetrack import TTFileDriver, profiling
+from timetrack.cli import cli
+from timetrack.segmented import TTSegmentedDriver
+
+
+def segmented_driver(home):
+    config = ConfigParser()
+    config['driver'] = {"segment_dir": str(home / "segments")}
+    return TTSegmentedDriver(config)
+
+
+def fill(driver):
+    driver.add_entries([{"project": project, "time": 10, "comment": "{} {}".format(project, day),
+                         "date": day, "task": "dev" if project == "a" else None}
+                        for day in ("2025-01-05", "2025-02-05", "2025-03-05") for project in ("a", "b")] +
+                       [{"project": "c", "time": 10, "comment": "only in march", "date": "2025-03-20"}])
+
+
+def segments_read(driver, *args, **kwargs):
+    profiling.counters.clear()
+    entries = list(driver.get_filtered_entries(*args, **kwargs))
+    return entries, profiling.counters["segments_read"]
+
+
+def test_manifest_prunes_segments(home, monkeypatch):
+    monkeypatch.setattr(profiling, "enabled", True)
+    driver = segmented_driver(home)
+    fill(driver)
+
+    entries, read = segments_read(driver, date(2025, 2, 1), date(2025, 2, 28))
+    assert [entry.id for entry in entries] == ["202502-1", "202502-2"]
+    assert read == 1
+
+    entries, read = segments_read(driver, project="c")
+    assert [entry.comment for entry in entries] == ["only in march"]
+    assert read == 1
+
+    # falls between January's last entry and February's first
+    entries, read = segments_read(driver, date(2025, 1, 10), date(2025, 2, 1))
+    assert entries == []
+    assert read == 0
+
+    assert segments_read(driver)[1] == 3
+    assert driver.get_projects() == {"a", "b", "c"}
+    assert driver.get_tasks("b") == set()
+
+
+def test_manifest_follows_edited_segments(home):
+    driver = segmented_driver(home)
+    fill(driver)
+    driver.get_projects()
+
+    # a hand edit behind the manifest's back is noticed from the segment's stamp
+    with open(str(home / "segments" / "2025-03.jsonl.gz"), "wb"):
+        pass
+
+    assert [entry.id for entry in driver.get_filtered_entries()] == ["202501-1", "202501-2", "202502-1", "202502-2"]
+    assert driver.get_projects() == {"a", "b"}
+
+
+def test_migrated_entries_keep_legacy_ids(home):
+    log = home / "log"
+    config = ConfigParser()
+    config['timetrack'] = {"cache_dir": str(home / "cache")}
+    config['driver'] = {"track_file": str(log)}
+    source = TTFileDriver(config)
+    source.add_entries([{"project": "p", "time": 10, "comment": "e{}".format(n), "date": day}
+                        for n, day in enumerate(["2025-01-01", "2025-02-01", "2025-01-15", "2025-02-20"], 1)])
+
+    (home / ".timetrack").write_text("[driver]\ntype = segmented\nsegment_dir = {}\ntrack_file = {}\n".format(
+        home / "segments", log))
+
+    result = CliRunner().invoke(cli, ["migrate-segments"])
+    assert result.exit_code == 0, result.output
+    assert "Migrated 4 entries" in result.output
+
+    driver = segmented_driver(home)
+
+    assert [(entry.id, entry.extra['legacy_id']) for entry in driver.get_filtered_entries()] == \
+        [("202501-1", 1), ("202501-2", 3), ("202502-1", 2), ("202502-2", 4)]
+
+    assert driver.get_entry("3").comment == "e3"
+    assert driver.get_entry(3).id == "202501-2"
+    assert driver.get_entry("5") is None
+
+    driver.update_entry("2", 5)
+    assert driver.get_entry("202502-1").time == 15
+
+    assert driver.delete_entry("4")
+    assert not driver.delete_entry("4")
+    assert [entry.comment for entry in driver.get_filtered_entries()] == ["e1", "e3", "e2"]
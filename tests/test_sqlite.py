@@ -0,0 +1,51 @@
+from click.testing import CliRunner
+
+from timetrack import create_driver, load_config
+from timetrack.cli import cli
+
+
+def sqlite_home(home):
+    (home / ".timetrack").write_text("\n".join([
+        "[timetrack]",
+        "cache_dir = {}".format(home / "cache"),
+        "",
+        "[driver]",
+        "type = sqlite",
+        "database = {}".format(home / "timetrack.db"),
+        "track_file = {}".format(home / "log"),
+        "",
+    ]))
+
+    return create_driver(load_config(), "sqlite")
+
+
+def test_fractional_minutes_round_trip(home):
+    driver = sqlite_home(home)
+
+    driver.add_entry("proj", 12.75, "work", when="2020-01-02", task="dev")
+
+    entry, = driver.get_filtered_entries()
+    assert entry.time == 12.75
+
+    driver.update_entry(entry.id, 1.5)
+
+    assert driver.get_entry(entry.id).time == 14.25
+
+
+def test_migrate_reports_taken_ids(home):
+    (home / "log").write_text("\n".join(
+        '{{"id": {0}, "date": "2020-01-0{0}", "project": "proj", "time": 30.5, "comment": "e{0}"}}'.format(n)
+        for n in range(1, 4)) + "\n")
+
+    driver = sqlite_home(home)
+
+    first = CliRunner().invoke(cli, ["migrate-sqlite"])
+    assert first.exit_code == 0, first.output
+    assert "Migrated 3 of 3 entries" in first.output
+
+    second = CliRunner().invoke(cli, ["migrate-sqlite"])
+    assert second.exit_code == 0, second.output
+    assert "Migrated 0 of 3 entries" in second.output
+    assert "Entry 2: TTSQLiteDriverException: Entry ID 2 is already taken" in second.output
+
+    assert [(entry.id, entry.time) for entry in driver.get_filtered_entries()] == [(1, 30.5), (2, 30.5), (3, 30.5)]
@@ -0,0 +1,98 @@
+import pytest
+
+from configparser import ConfigParser
+
+from timetrack import TTFileDriver
+from timetrack.sync import TTSyncEngine, TTSyncException
+
+
+def sync_config(home, endpoint, conflicts="remote", journal="yes"):
+    config = ConfigParser()
+    config['timetrack'] = {"cache_dir": str(home / "cache")}
+    config['driver'] = {"type": "file", "track_file": str(home / "log"), "journal": journal}
+    config['harvest'] = {"ACCESS_TOKEN": "token", "ACCOUNT_ID": "1", "endpoint": endpoint, "outbox": "no",
+                         "max_retries": "0"}
+    config['sync'] = {"conflicts": conflicts, "state_file": str(home / "sync.json")}
+    return config
+
+
+def remote_by_comment(stub):
+    return {entry['notes']: entry for entry in stub.time_entries}
+
+
+def local_by_comment(local):
+    return {entry.comment: entry for entry in local.get_filtered_entries()}
+
+
+def test_sync_needs_journal(home, stub_harvest):
+    with pytest.raises(TTSyncException):
+        TTSyncEngine(sync_config(home, stub_harvest.endpoint, journal="no"))
+
+
+def test_first_run_links_and_copies_both_ways(home, stub_harvest):
+    config = sync_config(home, stub_harvest.endpoint)
+    local = TTFileDriver(config)
+
+    first = stub_harvest.time_entries[0]
+    local.add_entry("P00", 30, "entry 0", when=first['spent_date'], task="Task 0")
+    local.add_entry("P01", 45, "local only", when="2026-01-05", task="Task 1")
+
+    stats, failed = TTSyncEngine(config).sync()
+
+    assert failed == []
+    assert stats['pushed_new'] == 1
+    assert stats['pulled_new'] == 39
+    assert len(stub_harvest.time_entries) == 41
+    assert len(list(local.get_filtered_entries())) == 41
+
+    # nothing changed, so nothing is sent and only the changed-entries listing is fetched
+    before = stub_harvest.requests
+    stats, _ = TTSyncEngine(config).sync()
+
+    assert sum(stats.values()) == 0
+    assert stub_harvest.posts == 1
+    assert stub_harvest.requests - before <= 3
+
+
+@pytest.mark.parametrize("conflicts", ["remote", "local"])
+def test_conflict_policy(home, stub_harvest, conflicts):
+    config = sync_config(home, stub_harvest.endpoint, conflicts)
+    local = TTFileDriver(config)
+    local.add_entry("P02", 60, "both", when="2026-01-06", task="Task 2")
+
+    TTSyncEngine(config).sync()
+
+    # changed on both sides since the last run
+    local.update_entry(local_by_comment(local)["both"].id, 5)
+    stub_harvest.edit(remote_by_comment(stub_harvest)["both"]['id'], hours=3.0)
+
+    stats, _ = TTSyncEngine(config).sync()
+
+    assert stats['conflicts'] == 1
+
+    expected = 180 if conflicts == "remote" else 65
+
+    assert local_by_comment(local)["both"].time == expected
+    assert remote_by_comment(stub_harvest)["both"]['hours'] * 60 == pytest.approx(expected)
+
+    # settled, the next run has nothing left to do
+    assert sum(TTSyncEngine(config).sync()[0].values()) == 0
+
+
+def test_local_changes_are_pushed(home, stub_harvest):
+    config = sync_config(home, stub_harvest.endpoint)
+    local = TTFileDriver(config)
+    local.add_entry("P01", 45, "keep", when="2026-01-05", task="Task 1")
+    local.add_entry("P01", 15, "drop", when="2026-01-05", task="Task 1")
+
+    TTSyncEngine(config).sync()
+
+    ids = {comment: entry.id for comment, entry in local_by_comment(local).items()}
+    local.update_entry(ids["keep"], 15)
+    local.delete_entry(ids["drop"])
+
+    stats, _ = TTSyncEngine(config).sync()
+
+    assert (stats['pushed_updated'], stats['pushed_deleted']) == (1, 1)
+    assert remote_by_comment(stub_harvest)["keep"]['hours'] == 1.0
+    assert "drop" not in remote_by_comment(stub_harvest)
@@ -0,0 +1,47 @@
+import json
+
+from click.testing import CliRunner
+
+from timetrack.cli import cli
+
+
+def run(*args):
+    result = CliRunner().invoke(cli, list(args))
+
+    if result.exception is not None and not isinstance(result.exception, SystemExit):
+        raise result.exception
+
+    return result
+
+
+def age_timers(home, seconds):
+    path = home / ".timetrack_timers"
+    timers = json.loads(path.read_text())
+
+    for timer in timers.values():
+        timer['started'] -= seconds
+
+    path.write_text(json.dumps(timers))
+
+
+def test_stop_keeps_timer_when_entry_is_gone(home):
+    run("add", "proj", "30m", "work")
+    run("append", "1", "live", "--detach")
+    run("rm", "1")
+    age_timers(home, 600)
+
+    result = run("stop")
+
+    assert result.exit_code == 1
+    assert "still running" in result.output
+    assert "entry-1" in run("status").output
+
+
+def test_stop_appends_to_entry(home):
+    run("add", "proj", "30m", "work")
+    run("append", "1", "live", "--detach")
+    age_timers(home, 600)
+
+    assert run("stop").exit_code == 0
+    assert "0h40m on proj" in run("ls").output
+    assert "No timers running" in run("status").output
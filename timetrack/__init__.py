@@ -1,20 +1,20 @@
 import os
-import sys
-import time
-import argparse
+import bisect
 import configparser
-import numpy
 import json
-import click
 
 from abc import abstractmethod, ABC
-from datetime import date, datetime, timedelta
-from collections import defaultdict
-from progressbar import ProgressBar, Timer
-from matplotlib import pyplot
-from collections import OrderedDict
+from datetime import date, datetime
 from typing import Optional, Union, List
 from configparser import ConfigParser
+from timetrack import profiling
+from timetrack.entry import Entry
+from timetrack.index import TTLogIndex, _day_str
+from timetrack.scan import TTLogScanner, TTScanStale
+from timetrack.locking import TTFileLock, tmp_path
+from timetrack.completion import TTCompletionCache
+from timetrack.rollup import TTRollupCache, rollup_entries, rollup_rows
+from timetrack.search import TTSearchIndex, parse_query, matches
 
 track_file = os.path.expanduser("~/.timetrack_log")
 
@@ -23,7 +23,13 @@ class TimerException(Exception):
     """Exception thrown when something goes wrong with timer"""
 
 class TTBaseDriver(ABC):
-    
+
+    # drivers that can cache their project/task catalogue set this to a TTCompletionCache
+    completion = None
+
+    # True if get_filtered_entries yields entries in date order
+    ordered_entries = False
+
     @abstractmethod
     def delete_entry(self, entry_id):
         """Remove entry from timetrack container"""
@@ -47,12 +53,99 @@ class TTBaseDriver(ABC):
     @abstractmethod
     def get_tasks(self, project=None):
         """Return task types from projects"""
+
+    def add_entries(self, entries):
+        """Add many entries at once.
+
+        entries is an iterable of dicts with project, time and optionally
+        comment, date and task keys. Returns a list of (position, exception)
+        for the entries that could not be added.
+        """
+
+        failures = []
+
+        for position, entry in enumerate(entries):
+            try:
+                self.add_entry(entry['project'], entry['time'], entry.get('comment', ""),
+                               when=entry.get('date'), task=entry.get('task'))
+            except Exception as e:
+                failures.append((position, e))
+
+        return failures
+
+    def get_entry(self, entry_id):
+        """Return a single entry by ID, or None. Drivers that can look entries up directly override this"""
+
+        for record in self.get_filtered_entries():
+            if str(record.id) == str(entry_id):
+                return record
+
+        return None
+
+    def compact(self):
+        """Rewrite underlying storage to drop superseded records. Returns False if unsupported"""
+        return False
+
+    def completion_stamp(self):
+        """Value that changes whenever the project/task catalogue might have changed"""
+        return None
+
+    def flush_outbox(self, drop_failed=False):
+        """Send entries queued for a remote backend.
+
+        Returns (sent, [(entry, error)], still_queued), or None if the driver
+        writes entries straight away. With drop_failed, entries the backend
+        rejected are reported one last time and then forgotten.
+        """
+        return None
+
+    def get_completions(self):
+        """Return (projects, tasks) for shell completion, cached where possible"""
+
+        if self.completion is None:
+            return self.get_projects(), self.get_tasks()
+
+        return self.completion.get(self)
+
+    def get_rollups(self, start=None, finish=None):
+        """Return per-(day, project, task) totals as entry-like records.
+
+        Drivers that keep materialised rollups override this, everyone else
+        sums their entries on the fly.
+        """
+        return rollup_rows(rollup_entries(self.get_filtered_entries(start, finish)))
+
+    def rebuild_rollups(self):
+        """Recompute materialised rollups from scratch. Returns False if the driver has none"""
+        return False
+
+    def search_entries(self, terms, start=None, finish=None, project=None):
+        """Yield entries whose comment contains every search term, in date order.
+
+        Drivers with a full-text index override this, everyone else scans
+        the entries in range.
+        """
+
+        query = parse_query(terms)
+        records = (record for record in self.get_filtered_entries(start, finish, project)
+                   if matches(query, record.get('comment')))
+
+        if not self.ordered_entries:
+            records = sorted(records, key=lambda r: r.day)
+
+        yield from records
+
+    def check_rollups(self):
+        """Return a list of differences between materialised rollups and a full scan"""
+        return []
         
 class TTFileDriverException(Exception):
     """Exception raised by file driver"""
 
 class TTFileDriver(TTBaseDriver):
 
+    ordered_entries = True
+
     def __init__(self, config: ConfigParser, rootsection: Optional[str] = "driver"):
         
         self.track_file = config.get(rootsection, "track_file")
@@ -60,8 +153,148 @@ class TTFileDriver(TTBaseDriver):
         if self.track_file is None:
             raise TTFileDriverException
 
-    def add_entry(self, project, time, comment, when=None, task=None):
-        """add new entry to file"""
+        # logs from parallel_scan_bytes up are decoded across scan_workers processes
+        workers = config.getint(rootsection, "scan_workers", fallback=0) or None
+        self.scanner = TTLogScanner(workers, config.getint(rootsection, "parallel_scan_bytes",
+                                                           fallback=32 * 1024 * 1024))
+
+        self.index = TTLogIndex(self.track_file,
+                                config.get(rootsection, "index_file", fallback=None), self.scanner)
+
+        self.journal = config.getboolean(rootsection, "journal", fallback=False)
+
+        self.completion = TTCompletionCache("file:" + os.path.abspath(self.track_file),
+                                            cache_dir=config.get("timetrack", "cache_dir", fallback=None))
+
+        self.rollups = TTRollupCache(config.get(rootsection, "rollup_file",
+                                                fallback=self.track_file + ".rollup"))
+
+        self.search = TTSearchIndex(config.get(rootsection, "search_file",
+                                               fallback=self.track_file + ".search"))
+
+        # readers take it shared, anything that writes to the log exclusive
+        self.lock = TTFileLock(config.get(rootsection, "lock_file", fallback=self.track_file + ".lock"))
+
+    def completion_stamp(self):
+        return list(self.index.log_stamp())
+
+    def _ensure_rollups(self):
+
+        with self.lock.shared():
+            stamp = self.completion_stamp()
+
+            if not self.rollups.load(stamp):
+                profiling.count("rollup_cache_misses")
+                self.rollups.rebuild(self.get_filtered_entries(), stamp)
+            else:
+                profiling.count("rollup_cache_hits")
+
+        return self.rollups
+
+    def get_rollups(self, start=None, finish=None):
+        """Read totals from the materialised rollups, rebuilding them if the log changed"""
+        return self._ensure_rollups().rows(start, finish)
+
+    def rebuild_rollups(self):
+
+        with self.lock.shared():
+            self.rollups.rebuild(self.get_filtered_entries(), self.completion_stamp())
+
+        return True
+
+    def check_rollups(self):
+
+        if not self.rollups.load():
+            return ["No rollups have been built yet"]
+
+        problems = self.rollups.compare(self.get_filtered_entries())
+
+        if self.rollups.stamp != self.completion_stamp():
+            problems.insert(0, "Rollups are stale, the log has changed since they were last updated")
+
+        return problems
+
+    def _append_records(self, records):
+        """Append records to the log with a single O_APPEND write and one fsync.
+
+        Callers hold the exclusive lock; writing the whole batch at once also
+        keeps it in one piece next to writers that don't take the lock. New
+        entries get an explicit ID only if it no longer matches the line
+        number. The index is extended as we go and saved once at the end.
+        Returns the IDs given to new entries.
+        """
+
+        # bring the index up to date before the append so it can be extended
+        index = self.index.ensure()
+
+        fd = os.open(self.track_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+        try:
+            offset = os.fstat(fd).st_size
+            chunks = []
+            ids = []
+
+            for record in records:
+                if 'op' not in record:
+                    entry_id = index.next_id()
+                    ids.append(entry_id)
+
+                    if entry_id != len(index.offsets) + 1:
+                        record['id'] = entry_id
+
+                line = "{}\n".format(json.dumps(record)).encode("utf8")
+                chunks.append(line)
+
+                index.add_line(offset, record)
+                offset += len(line)
+
+            data = memoryview(b"".join(chunks))
+
+            # regular files take the whole buffer in one go, loop just in case
+            while data:
+                data = data[os.write(fd, data):]
+
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        index.commit()
+
+        return ids
+
+    def _append_record(self, record):
+        """Append a single record to the log and extend the index with it"""
+        self._append_records([record])
+
+    def _rewrite(self, lines):
+        """Atomically replace the log with the given lines"""
+
+        tmpfile = tmp_path(self.track_file)
+
+        with open(tmpfile, "w") as f:
+            for line in lines:
+                f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmpfile, self.track_file)
+
+        self.index.invalidate()
+
+    def _live_line(self, entry_id):
+        """Find the line of a live entry, compacting first if the log has journal records"""
+
+        index = self.index.ensure()
+
+        if index.pending and not self.journal:
+            # journal records refer to IDs, fold them in before lines move around
+            self.compact()
+            index = self.index.ensure()
+
+        return index, index.line_for(int(entry_id))
+
+    def _make_record(self, project, time, comment, when=None, task=None):
+        """Validate an entry and turn it into a log record"""
 
         time = parse_time(time)
 
@@ -79,131 +312,420 @@ class TTFileDriver(TTBaseDriver):
         if type(comment) is list:
             comment = ' '.join(comment)
 
-        with open(self.track_file, "a") as f:
-            record = {"date": day.strftime("%Y-%m-%d"), "project":project, "time": time, "comment":comment }
-            
-            if task is not None:
-                record['task'] = task
-            
-            f.write("{}\n".format(json.dumps(record)))
+        record = {"date": day.strftime("%Y-%m-%d"), "project":project, "time": time, "comment":comment }
+
+        if task is not None:
+            record['task'] = task
+
+        return record
+
+    def add_entry(self, project, time, comment, when=None, task=None):
+        """add new entry to file"""
+        self._add_records([self._make_record(project, time, comment, when, task)])
+
+    def _add_records(self, records):
+        """Append new entries and fold them into the completion and rollup caches"""
+
+        with self.lock.exclusive():
+            before = self.completion_stamp()
+
+            ids = self._append_records(records)
+
+            after = self.completion_stamp()
+
+            self.completion.update(before, after,
+                                   [r['project'] for r in records], [r['task'] for r in records if 'task' in r])
+            self.rollups.update(before, after,
+                                [(r['date'], r['project'], r.get('task'), r['time']) for r in records])
+            self.search.update(before, after, zip(ids, [r['comment'] for r in records]))
+
+        return ids
+
+    def add_entries(self, entries):
+        """Validate a batch of entries and append them with a single write and fsync"""
+
+        records, failures = [], []
+
+        for position, entry in enumerate(entries):
+            try:
+                records.append(self._make_record(entry['project'], entry['time'], entry.get('comment', ""),
+                                                 entry.get('date'), entry.get('task')))
+            except Exception as e:
+                failures.append((position, e))
+
+        if records:
+            self._add_records(records)
+
+        return failures
+
+    def insert_entries(self, entries):
+        """Like add_entries but all or nothing, returning the IDs the new entries were given"""
+
+        return self._add_records([self._make_record(entry['project'], entry['time'], entry.get('comment', ""),
+                                                    entry.get('date'), entry.get('task')) for entry in entries])
+
+    def get_entry(self, entry_id):
+        """Return a single live entry by ID, or None"""
+
+        with self.lock.shared():
+            index = self.index.ensure()
+            line = index.line_for(int(entry_id))
+
+            if line is None:
+                return None
+
+            record = Entry.from_dict(index.read_record(line))
+
+        record.id = int(entry_id)
+        record.time += index.deltas.get(record.id, 0)
+
+        return record
+
+    def get_changes_since(self, cursor=None):
+        """Find the IDs of entries added, changed or deleted since a cursor from an earlier call.
+
+        While the log has only been appended to, which is always the case in
+        journal mode until the next compaction, just the new lines are read.
+        Returns (ids, cursor) where ids is None if the log was rewritten in
+        between and every entry has to be looked at.
+        """
+
+        with self.lock.shared():
+            index = self.index.ensure()
+
+            try:
+                f = open(self.track_file, "rb")
+            except FileNotFoundError:
+                return None, None
+
+        with f:
+            inode = os.fstat(f.fileno()).st_ino
+
+            # stop where the index does, anything appended since is for next time.
+            # The bytes just before the cursor tell a recycled inode from the same log
+            size = index.size
+            f.seek(max(size - 64, 0))
+            new_cursor = {"inode": inode, "size": size, "tail": f.read(size - max(size - 64, 0)).hex()}
+
+            if cursor is None or cursor['inode'] != inode or cursor['size'] > size:
+                return None, new_cursor
+
+            f.seek(max(cursor['size'] - 64, 0))
+
+            if f.read(cursor['size'] - max(cursor['size'] - 64, 0)).hex() != cursor['tail']:
+                return None, new_cursor
+
+            changed = set()
+            first = bisect.bisect_left(index.offsets, cursor['size'])
+
+            for lineno in range(first, len(index.offsets)):
+                f.seek(index.offsets[lineno])
+                line = f.readline()
+
+                if not line.strip():
+                    continue
+
+                record = json.loads(line)
+
+                if 'ref' in record:
+                    changed.add(record['ref'])
+                elif 'op' not in record:
+                    changed.add(index.entry_id(lineno, record))
+
+        return changed, new_cursor
 
     def delete_entry(self, entry_id):
 
-        line = int(entry_id) - 1
+        with self.lock.exclusive():
+            index, line = self._live_line(entry_id)
 
-        all_data = []
-        found = False
+            if line is None:
+                return False
 
-        with open(self.track_file, "r") as f:
-            for lineno, x in enumerate(f):
-                if lineno != line:
-                    all_data.append(x)
-                else:
-                    found = True
+            record = index.read_record(line)
+            change = (record['date'], record['project'], record.get('task'),
+                      -(record['time'] + index.deltas.get(int(entry_id), 0)))
 
-        with open(self.track_file, "w") as f:
-            for line in all_data:
-                f.write(line)
+            before = self.completion_stamp()
 
-        return found
+            # once compacted, entries carry explicit IDs and dropping a line would
+            # renumber only the ones that don't, so leave a tombstone instead
+            if self.journal or index.journal_lines or index.moved:
+                self._append_record({"op": "delete", "ref": int(entry_id)})
+                # searches skip IDs that no longer resolve, so the postings can stay
+                self.search.update(before, self.completion_stamp())
+            else:
+                with open(self.track_file, "r") as f:
+                    all_data = [x for lineno, x in enumerate(f) if lineno != line]
 
-    def update_entry(self, entry_id, time):
-        """Find an entry, update its time, rewrite file."""
+                self._rewrite(all_data)
+                # every entry after the deleted one has a new ID now
+                self.search.invalidate()
 
-        # identify the line to be updated
-        line = int(entry_id) - 1
+            self.rollups.update(before, self.completion_stamp(), [change])
 
-        all_data = []
-        record = None
+            return True
 
-        # read all the data from the log into memory
-        with open(self.track_file, "r") as f:
-            for lineno, x in enumerate(f):
-                if lineno != line:
-                    all_data.append(x)
-                else:
-                    record = json.loads(x)
+    def update_entry(self, entry_id, time):
+        """Find an entry and update its time, either in place or via a journal delta."""
 
-        # if after reading everything we didn't find the line, return error
-        if record is None:
-            print("Could not find entry with ID {}. Giving up.".format(entry_id))
-            return
+        with self.lock.exclusive():
+            index, line = self._live_line(entry_id)
+
+            # if we didn't find the line, return error
+            if line is None:
+                print("Could not find entry with ID {}. Giving up.".format(entry_id))
+                return
 
-        # run live timer or parse updated time
-        time_add = parse_time(time)
+            record = index.read_record(line)
 
-        # check time added was not less than 1 minute
-        if time_add == 1:
-            print("You must spend at least another minute \
+            # run live timer or parse updated time
+            time_add = parse_time(time)
+
+            # check time added was not less than 1 minute
+            if time_add == 1:
+                print("You must spend at least another minute \
                 on this task to update it.")
-            return
+                return
 
-        # add updated time to total
-        record['time'] += time_add
+            print("Appending {} minutes to entry {} ({})".format(time_add, entry_id,
+                                                                record['project']))
 
-        print("Appending {} minutes to entry {} ({})".format(time_add, entry_id,
-                                                            record['project']))
+            change = (record['date'], record['project'], record.get('task'), time_add)
+            before = self.completion_stamp()
 
-        # inject line into data
-        entry = json.dumps(record) + "\n"
+            if self.journal:
+                self._append_record({"op": "update", "ref": int(entry_id), "time": time_add})
+            else:
+                # add updated time to total
+                record['time'] += time_add
 
-        all_data.insert(line, entry)
+                with open(self.track_file, "r") as f:
+                    all_data = list(f)
 
-        # write data to file
-        with open(self.track_file, "w") as f:
-            for line in all_data:
-                f.write(line)
+                # inject line into data
+                all_data[line] = json.dumps(record) + "\n"
+
+                self._rewrite(all_data)
+
+            after = self.completion_stamp()
+            self.rollups.update(before, after, [change])
+            # only the time changed, the comment and ID are as they were
+            self.search.update(before, after)
+
+    def compact(self):
+        """Rewrite the log without journal records, folding them into the entries.
+
+        Entries keep their IDs by having them written out explicitly and a
+        header records the next ID to hand out so that deleted IDs are never
+        reused.
+        """
+
+        with self.lock.exclusive():
+            index = self.index.ensure()
+
+            lines = ["{}\n".format(json.dumps({"op": "compact", "next_id": index.next_id()}))]
+
+            for record in self.get_filtered_entries():
+                lines.append("{}\n".format(json.dumps(record.to_dict())))
+
+            before = self.completion_stamp()
+
+            self._rewrite(lines)
+
+            # the content is unchanged so the caches just need the new stamp
+            after = self.completion_stamp()
+            self.completion.update(before, after)
+            self.rollups.update(before, after)
+            self.search.update(before, after)
+
+            return True
 
     def get_filtered_entries(self, start=None, finish=None, project=None, task=None):
+        """Use the sidecar index to seek straight to matching lines, yielding them in date order"""
 
-        with open(self.track_file, "r") as f:
-            for lineno, line in enumerate(f):
-                record = json.loads(line)
+        # rewrites replace the log and appends only add to its end, so once
+        # open the file matches the index snapshot without holding the lock
+        with self.lock.shared():
+            index = self.index.ensure()
+            lines = index.lookup(start, finish, project, task)
 
-                dt = datetime.strptime(record['date'], "%Y-%m-%d")
-                record_date = date(dt.year, dt.month, dt.day)
+            if not lines:
+                return
 
-                if start != None and record_date < start:
-                    continue
+            f = open(self.track_file, "rb")
 
-                if finish != None and record_date > finish:
-                    continue
+        # reading most of a big log, decode it across processes instead of line by line
+        if self.scanner.worth_it(index.size) and len(lines) * 2 >= len(index.offsets):
+            with f:
+                yield from self._scan_entries(index, lines, f, start, finish, project, task)
+            return
 
-                if project != None and record['project'] != project:
-                    continue
-                
-                if task != None and record.get('task') != task:
-                    continue
+        decoded = 0
+        decoded_bytes = 0
+
+        try:
+            with f:
+                for lineno in lines:
+                    f.seek(index.offsets[lineno])
+                    line = f.readline()
+                    record = Entry.from_dict(json.loads(line))
+
+                    decoded += 1
+                    decoded_bytes += len(line)
+
+                    # the record ID is the line number +1 unless it was compacted
+                    record.id = index.entry_id(lineno, record)
+                    record.time += index.deltas.get(record.id, 0)
+                    yield record
+        finally:
+            profiling.count("log_lines_decoded", decoded)
+            profiling.count("log_bytes_decoded", decoded_bytes)
+
+    def _ensure_search(self):
+
+        with self.lock.shared():
+            stamp = self.completion_stamp()
+
+            if not self.search.load(stamp):
+                profiling.count("search_index_builds")
+                self.search.rebuild(self.get_filtered_entries(), stamp)
+
+        return self.search
+
+    def search_entries(self, terms, start=None, finish=None, project=None):
+        """Look the terms up in the inverted index and read just the matching lines"""
+
+        query = parse_query(terms)
+
+        with self.lock.shared():
+            index = self.index.ensure()
+            ids = self._ensure_search().lookup(query)
+
+            if ids is None:
+                # the segment was replaced by another process mid-way, start over
+                self.search.rebuild(self.get_filtered_entries(), self.completion_stamp())
+                ids = self.search.lookup(query)
+
+            if ids is not None:
+                lines = {index.line_for(entry_id) for entry_id in ids}
+                lines.discard(None)
+
+                if start is not None or finish is not None or project is not None:
+                    lines.intersection_update(index.lookup(start, finish, project))
+
+                if not lines:
+                    return
+
+                f = open(self.track_file, "rb")
+
+        if ids is None:
+            # replaced again already, rather than chasing it match comments while scanning
+            profiling.count("search_index_fallbacks")
+            yield from super().search_entries(terms, start, finish, project)
+            return
+
+        records = []
+
+        with f:
+            for lineno in lines:
+                f.seek(index.offsets[lineno])
+                record = Entry.from_dict(json.loads(f.readline()))
+                record.id = index.entry_id(lineno, record)
+                record.time += index.deltas.get(record.id, 0)
+                records.append((record.date, lineno, record))
+
+        profiling.count("log_lines_decoded", len(records))
+
+        for _, _, record in sorted(records, key=lambda item: item[:2]):
+            yield record
+
+    def _scan_entries(self, index, lines, f, start, finish, project, task):
+        """Yield the entries on lines, in that order, from a parallel scan of the log.
+
+        Ranges come back in line order, so while the log is in date order
+        (the usual case) entries are yielded as soon as their range is in and
+        only back-dated ones wait in memory.
+        """
+
+        records = {}
+        wanted = set(lines)
+        position = 0
+        decoded = 0
+
+        def make(fields):
+            day, proj, time, comment, tsk, entry_id, extra = fields
+            return Entry(day, proj, time + index.deltas.get(entry_id, 0), comment, tsk, entry_id, extra=extra)
+
+        try:
+            for found in self.scanner.decode(self.track_file, index.offsets, index.size, os.fstat(f.fileno()).st_ino,
+                                             _day_str(start), _day_str(finish), project, task):
+                # keep only what will be yielded, on a big log most others are deleted entries
+                records.update((lineno, fields) for lineno, fields in found.items() if lineno in wanted)
+                decoded += len(found)
+
+                while position < len(lines) and lines[position] in records:
+                    lineno = lines[position]
+                    yield make(records.pop(lineno))
+                    position += 1
+        except TTScanStale:
+            # replaced under us, the file we have open still matches the index
+            pass
+        finally:
+            profiling.count("parallel_scans")
+            profiling.count("log_lines_decoded", decoded)
+
+        # anything the scan didn't cover is read from the file we have open
+        for lineno in lines[position:]:
+            if lineno in records:
+                yield make(records.pop(lineno))
+                continue
+
+            f.seek(index.offsets[lineno])
+            record = Entry.from_dict(json.loads(f.readline()))
+            record.id = index.entry_id(lineno, record)
+            record.time += index.deltas.get(record.id, 0)
+            yield record
 
-                #add record ID which is just the line number +1
-                record['id'] = lineno + 1
-                yield record
-                
     def get_projects(self):
         """Return list of known projects"""
-        
-        projects = set()
-        
-        with open(self.track_file, "r") as f:
-            for line in f:
-                record = json.loads(line)
-                projects.add(record['project'])
-        
-        return projects
+
+        with self.lock.shared():
+            return self.index.ensure().get_projects()
 
     def get_tasks(self, project=None):
-        
-        tasks = set()
-        
-        with open(self.track_file, "r") as f:
-            for line in f:
-                record = json.loads(line)
-                if 'task' in record and (project is None or record['project'] == project):
-                    tasks.add(record.get('task'))
-            
-        return tasks
-                    
 
+        with self.lock.shared():
+            return self.index.ensure().get_tasks(project)
+
+
+
+class TTDriverException(Exception):
+    """Raised when a driver cannot be set up from config"""
+
+
+def create_driver(config: ConfigParser, dtype: str, rootsection: Optional[str] = None):
+    """Construct a driver by type name, only importing its module when it is used"""
+
+    if dtype == "file":
+        cls = TTFileDriver
+    elif dtype == "harvest":
+        from timetrack.harvest import TTHarvestDriver as cls
+    elif dtype == "router":
+        from timetrack.router import TTRouterDriver as cls
+    elif dtype == "compact":
+        from timetrack.compact import TTCompactDriver as cls
+    elif dtype == "sqlite":
+        from timetrack.sqlite import TTSQLiteDriver as cls
+    elif dtype == "segmented":
+        from timetrack.segmented import TTSegmentedDriver as cls
+    else:
+        raise TTDriverException(f"Unknown driver type {dtype}")
+
+    if rootsection is None:
+        return cls(config)
+
+    return cls(config, rootsection=rootsection)
 
 
 def load_config():
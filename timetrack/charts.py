@@ -0,0 +1,129 @@
+import os
+import json
+import hashlib
+
+from datetime import timedelta
+
+from timetrack.locking import tmp_path
+
+COLORS = ['c', 'm', 'y', 'r', 'g', 'b']
+
+
+def breakdown_title(start, end):
+    title = "Project Breakdown: {}".format(start.strftime("%Y-%m-%d"))
+
+    if start != end:
+        title += " to {}".format(end.strftime("%Y-%m-%d"))
+
+    return title
+
+
+def draw_breakdown(fig, projects, title, graph_type="bar"):
+    """Draw {project: minutes} as a bar or pie chart of hours, replacing whatever the figure held"""
+
+    fig.clear()
+    fig.suptitle(title, fontsize=14, fontweight='bold')
+
+    ax = fig.add_subplot(1, 1, 1)
+    fig.subplots_adjust(top=0.85)
+
+    names = list(projects)
+    hours = [minutes / 60.0 for minutes in projects.values()]
+
+    if graph_type == "pie":
+        ax.pie(hours, labels=names, autopct='%1.1f%%', colors=COLORS, startangle=90)
+        ax.axis('equal')
+    else:
+        ax.set_xlabel('Project')
+        ax.set_ylabel('Hours')
+        ax.barh(range(len(names)), hours, align='center', color=COLORS)
+        ax.set_yticks(range(len(names)))
+        ax.set_yticklabels(names)
+
+    return ax
+
+
+def iter_periods(start, end, per):
+    """Yield (name, first day, last day) for every week (Monday to Sunday) or month overlapping [start, end]"""
+
+    if per == "week":
+        day = start - timedelta(days=start.weekday())
+
+        while day <= end:
+            year, week, _ = day.isocalendar()
+            yield "{}-W{:02d}".format(year, week), day, day + timedelta(days=6)
+            day += timedelta(days=7)
+    else:
+        day = start.replace(day=1)
+
+        while day <= end:
+            following = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+            yield day.strftime("%Y-%m"), day, following - timedelta(days=1)
+            day = following
+
+
+class TTChartRenderer:
+    """Write report charts to files without a display.
+
+    Charts are drawn on a single Figure attached straight to matplotlib's
+    Agg canvas, so pyplot and its interactive backends are never loaded and
+    a series of charts only pays for figure setup once. A manifest in the
+    output directory keeps a hash of the data behind each file, and charts
+    whose data hasn't changed since they were written are skipped.
+    """
+
+    MANIFEST = ".timetrack-charts.json"
+
+    def __init__(self, out_dir: str, fmt: str = "png", graph_type: str = "bar"):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.graph_type = graph_type
+
+        self.fig = Figure()
+        FigureCanvasAgg(self.fig)
+
+        os.makedirs(out_dir, exist_ok=True)
+        self.manifest_path = os.path.join(out_dir, self.MANIFEST)
+
+        try:
+            with open(self.manifest_path, "r") as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+
+    def _digest(self, title, projects):
+        data = [title, self.graph_type, sorted(projects.items())]
+        return hashlib.sha1(json.dumps(data).encode("utf8")).hexdigest()
+
+    def render(self, name, title, projects):
+        """Write <name>.<fmt> unless it already shows the same data. Returns True if it was drawn."""
+
+        filename = "{}.{}".format(name, self.fmt)
+        path = os.path.join(self.out_dir, filename)
+        digest = self._digest(title, projects)
+
+        if self.manifest.get(filename) == digest and os.path.exists(path):
+            return False
+
+        draw_breakdown(self.fig, projects, title, self.graph_type)
+
+        tmpfile = tmp_path(path)
+        self.fig.savefig(tmpfile, format=self.fmt)
+        os.replace(tmpfile, path)
+
+        self.manifest[filename] = digest
+
+        return True
+
+    def save(self):
+        """Write the manifest out, call once the series is done"""
+
+        tmpfile = tmp_path(self.manifest_path)
+
+        with open(tmpfile, "w") as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+
+        os.replace(tmpfile, self.manifest_path)
@@ -1,15 +1,19 @@
+import os
 import click
 import time
 import traceback
-import moment
 from datetime import datetime, date, timedelta
-from collections import defaultdict
-from timetrack import TTFileDriver, load_config, human_time, day_remainder, day_spent, parse_time
-from progressbar import ProgressBar, Timer
-from matplotlib import pyplot
+from timetrack import create_driver, load_config, human_time, day_remainder, day_spent, parse_time
+from timetrack import profiling
+
+# NB: progressbar, moment and matplotlib are slow to import so they are only
+# loaded inside the commands that need them. Keep it that way - every tab
+# completion runs through this module.
 
 def live_time(project):
     """Run a timer actively in the window"""
+    from progressbar import ProgressBar, Timer
+
     start = datetime.now()
 
     print("Starting timer, press Ctrl + C at any time to end recording...")
@@ -33,43 +37,60 @@ def live_time(project):
     return (int(diff.total_seconds()) / 60)
 
 
-def report_generate(records, echo=True):
-    """Generate a list of items that have been tracked for given timeframe. """
-    day_records = defaultdict(lambda: [])
+def timer_store(ctx):
+    from timetrack.timers import TTTimerStore
 
-    for record in records:
-        dt = datetime.strptime(record['date'], "%Y-%m-%d")
-        record_date = date(dt.year, dt.month, dt.day)
-        day_records[record_date].append(record)
+    path = ctx.obj['CONFIG'].get("timetrack", "timers_file", fallback="~/.timetrack_timers")
 
-    if echo:  # only print if echo is on
-        for day in sorted(day_records):
-            records = day_records[day]
+    return TTTimerStore(os.path.expanduser(path))
 
-            print("\n{}\n---------".format(day.strftime("%Y-%m-%d")))
-            for record in records:
-                print(f"{record['id']}) {human_time(record['time'])} on {record['project']}: {record['comment']} ")
 
-    return day_records
+def start_timer(ctx, name, **fields):
+    """Start a detached timer, telling the user how to stop it"""
+    from timetrack.timers import TTTimerException
+
+    try:
+        timer_store(ctx).start(name, **fields)
+    except TTTimerException as e:
+        print(e)
+        ctx.exit(1)
+
+    print(f"Started timer {name}, run `timetrack stop {name}` to record the time")
+
 
 def init_context_obj():
     obj = {}
-    obj['CONFIG'] = load_config()
-    if obj['CONFIG']['timetrack'].get('driver', 'file') == "harvest":
-        from timetrack.harvest import TTHarvestDriver
-        
-        obj['DRIVER'] = TTHarvestDriver(obj['CONFIG'])
-    elif obj['CONFIG']['timetrack'].get('driver', 'file') == "router":
-        from timetrack.router import TTRouterDriver
-        
-        obj['DRIVER'] = TTRouterDriver(obj['CONFIG'])
-    else:
-        obj['DRIVER'] = TTFileDriver(obj['CONFIG'])
+
+    with profiling.span("load_config"):
+        obj['CONFIG'] = load_config()
+
+    # older configs pick the driver in [timetrack], newer ones with [driver] type=
+    dtype = obj['CONFIG'].get('timetrack', 'driver', fallback=None) or \
+        obj['CONFIG'].get('driver', 'type', fallback='file')
+
+    with profiling.span("create_driver"):
+        obj['DRIVER'] = create_driver(obj['CONFIG'], dtype)
+
+    if profiling.enabled:
+        profiling.instrument(obj['DRIVER'])
+
     return obj
 
 @click.group()
+@click.option("--profile", is_flag=True, help="Print where the command spent its time on exit")
+@click.option("--profile-output", type=click.Path(dir_okay=False), default=None,
+              help="Also write a Chrome trace (.json) or cProfile dump (any other extension)")
 @click.pass_context
-def cli(ctx):
+def cli(ctx, profile, profile_output):
+    # TIMETRACK_TRACE=1 (or =path) profiles without changing the command line
+    if profile or profile_output:
+        profiling.enable(profile_output)
+    else:
+        profiling.enable_from_env(os.environ)
+
+    if profiling.enabled:
+        ctx.call_on_close(profiling.finish)
+
     if ctx.obj is None:
         ctx.obj = init_context_obj()
     
@@ -81,7 +102,7 @@ def autocomplete_projects(ctx, args, incomplete):
         
     driver = ctx.obj['DRIVER']
     
-    projects = driver.get_projects()
+    projects, _ = driver.get_completions()
     
     options = [p for p in projects if  (len(incomplete) < 1) or (incomplete in p) ]
     
@@ -94,7 +115,7 @@ def autocomplete_tasks(ctx, args, incomplete):
     
     driver = ctx.obj['DRIVER']
     
-    tasks = driver.get_tasks()
+    _, tasks = driver.get_completions()
     
     #return args
     options = [t for t in tasks if (len(incomplete) < 1) or (incomplete in t)]
@@ -108,21 +129,27 @@ def autocomplete_tasks(ctx, args, incomplete):
 @click.argument("comment", type=str, nargs=-1)
 @click.option("-d", "--date")
 @click.option("-t", "--task", type=str, default=None, autocompletion=autocomplete_tasks)
-def add(ctx, project, time, comment, date, task):
+@click.option("--detach", is_flag=True, help="With live, start a background timer to end with timetrack stop")
+def add(ctx, project, time, comment, date, task, detach):
     """Add a time entry to a given project"""
     driver = ctx.obj['DRIVER']
 
-    if time == "live":
-        time = live_time(project)
-        
     comment = " ".join(comment)
     
     if date is None:
         when = datetime.now()
         
     else:
+        import moment
         when = moment.date(date).datetime
 
+    if time == "live" and detach:
+        start_timer(ctx, project, project=project, comment=comment, task=task, date=when.strftime("%Y-%m-%d"))
+        return
+
+    if time == "live":
+        time = live_time(project)
+
     print("Adding {} minutes to {} project".format(parse_time(time), project))
     try:
         driver.add_entry(project, time, comment, when=when, task=task)
@@ -130,33 +157,18 @@ def add(ctx, project, time, comment, date, task):
         print("ERROR:", e)
         traceback.print_exc()
 
-def parse_time_args(args):
-    """"Parse week or month args or uses today by default."""
-    if args.week:
-        end = datetime.now()
-        delta = timedelta(days=7)
-        start = end - delta
-        start_date = date(start.year, start.month, start.day)
-        end_date = date(end.year, end.month, end.day)
-    elif args.month:
-        end = datetime.now()
-        delta = timedelta(days=30)
-        start = end - delta
-        start_date = date(start.year, start.month, start.day)
-        end_date = date(end.year, end.month, end.day)
-    else:
-        start_date = date.today()
-        end_date = date.today()
-
-    return start_date, end_date
-
 @cli.command()
 @click.pass_context
 @click.argument("entry", type=str, autocompletion=autocomplete_projects)
 @click.argument("time", type=str)
-def append(ctx, entry, time):
+@click.option("--detach", is_flag=True, help="With live, start a background timer to end with timetrack stop")
+def append(ctx, entry, time, detach):
     """Append an amount of time to timetrack log"""
-    
+
+    if time == "live" and detach:
+        start_timer(ctx, f"entry-{entry}", entry=entry)
+        return
+
     if time == "live":
         time = live_time(f"Continuing work on entry {entry}")
         
@@ -166,6 +178,74 @@ def append(ctx, entry, time):
     
     driver.update_entry(entry, time)
 
+@cli.command()
+@click.pass_context
+@click.argument("project", type=str, autocompletion=autocomplete_projects)
+@click.argument("comment", type=str, nargs=-1)
+@click.option("-t", "--task", type=str, default=None, autocompletion=autocomplete_tasks)
+@click.option("-n", "--name", type=str, default=None, help="Name to stop the timer by, the project by default")
+def start(ctx, project, comment, task, name):
+    """Start a timer on a project that keeps going without a terminal open"""
+    start_timer(ctx, name or project, project=project, comment=" ".join(comment), task=task,
+                date=date.today().strftime("%Y-%m-%d"))
+
+@cli.command()
+@click.pass_context
+@click.argument("name", type=str, required=False)
+@click.option("--discard", is_flag=True, help="Throw the timer away without recording anything")
+def stop(ctx, name, discard):
+    """Stop a timer and record the time spent (NAME can be left out if only one is running)"""
+    from timetrack.timers import TTTimerException, elapsed_minutes
+
+    driver = ctx.obj['DRIVER']
+
+    try:
+        with timer_store(ctx).stopping(name) as (name, timer):
+            minutes = elapsed_minutes(timer)
+            entry = timer.get('entry')
+
+            if discard:
+                print("Discarded timer {} after {}".format(name, human_time(minutes)))
+            elif minutes < (2 if entry is not None else 1):
+                # the same minimums add and append apply
+                print("Timer {} ran for {}, too short to record".format(name, human_time(minutes)))
+            elif entry is not None:
+                # update_entry only prints when the entry is gone, which would lose the timer
+                if driver.get_entry(entry) is None:
+                    raise Exception(f"Could not find entry with ID {entry}")
+
+                driver.update_entry(entry, minutes)
+            else:
+                print("Adding {} minutes to {} project".format(minutes, timer['project']))
+                driver.add_entry(timer['project'], minutes, timer.get('comment', ""), when=timer.get('date'),
+                                 task=timer.get('task'))
+    except TTTimerException as e:
+        print(e)
+        ctx.exit(1)
+    except Exception as e:
+        print("ERROR:", e)
+        print("The timer is still running")
+        ctx.exit(1)
+
+@cli.command()
+@click.pass_context
+def status(ctx):
+    """Show running timers and how long they have been going"""
+    from timetrack.timers import elapsed_minutes
+
+    timers = timer_store(ctx).timers()
+
+    if not timers:
+        print("No timers running")
+        return
+
+    for name, timer in sorted(timers.items(), key=lambda item: item[1]['started']):
+        started = datetime.fromtimestamp(timer['started']).strftime("%Y-%m-%d %H:%M")
+        what = "entry {}".format(timer['entry']) if timer.get('entry') is not None else timer['project']
+        comment = ": {}".format(timer['comment']) if timer.get('comment') else ""
+
+        print("{}) {} on {}{} (since {})".format(name, human_time(elapsed_minutes(timer)), what, comment, started))
+
 @cli.command()
 @click.pass_context
 @click.option("-p", "--project", type=str, default=None)
@@ -193,13 +273,25 @@ def ls(ctx, project, week, month):
         end_date = date.today()
 
 
-    records = list(driver.get_filtered_entries(start_date, end_date, project))
+    from itertools import groupby
+
+    records = driver.get_filtered_entries(start_date, end_date, project)
+
+    if not driver.ordered_entries:
+        records = sorted(records, key=lambda r: r.day)
 
-    report_generate(records)
+    today_date = date.today()
+    today = []
 
-    today_str = date.today().strftime('%Y-%m-%d')
+    # print each day as the driver streams it rather than collecting everything first
+    for day, day_records in groupby(records, key=lambda r: r.day):
+        print("\n{}\n---------".format(day.strftime("%Y-%m-%d")))
 
-    today = [r for r in records if r['date']==today_str ]
+        for record in day_records:
+            print(f"{record.id}) {human_time(record.time)} on {record.project}: {record.comment} ")
+
+            if day == today_date:
+                today.append(record)
 
     print("-----------")
 
@@ -228,6 +320,28 @@ def ls_tasks(ctx, project):
     for task in driver.get_tasks(project):
         print(task)
 
+@cli.command()
+@click.pass_context
+@click.argument("terms", nargs=-1, required=True)
+@click.option("-s", "--start", type=click.DateTime(formats=["%Y-%m-%d"]), default=None)
+@click.option("-e", "--end", type=click.DateTime(formats=["%Y-%m-%d"]), default=None)
+@click.option("-p", "--project", type=str, default=None)
+def search(ctx, terms, start, end, project):
+    """Find entries whose comment contains every term (end a term with * to match the start of a word)"""
+
+    driver = ctx.obj['DRIVER']
+
+    found = 0
+    total = 0
+
+    for record in driver.search_entries(terms, start and start.date(), end and end.date(), project):
+        print(f"{record.date} {record.id}) {human_time(record.time)} on {record.project}: {record.comment}")
+        found += 1
+        total += record.time
+
+    print("-----------")
+    print("{} matching entries, {} in total".format(found, human_time(total)))
+
 @cli.command()
 @click.pass_context
 @click.argument("entry_id")
@@ -242,6 +356,185 @@ def rm(ctx, entry_id):
     else:
         print("Could not find entry")
 
+@cli.command()
+@click.pass_context
+def compact(ctx):
+    "Rewrite the log, folding in deletes and appends made in journal mode"
+    driver = ctx.obj['DRIVER']
+
+    if driver.compact():
+        print("Compacted log")
+    else:
+        print("This driver does not support compaction")
+
+
+@cli.command()
+@click.pass_context
+@click.argument("output", type=click.File("w"), default="-")
+def export_jsonl(ctx, output):
+    "Stream every entry out as JSON lines (the file driver's log format)"
+    from timetrack.export import write_jsonl
+
+    driver = ctx.obj['DRIVER']
+
+    write_jsonl(driver.get_filtered_entries(), output)
+
+
+@cli.command()
+@click.pass_context
+@click.option("-f", "--format", "fmt", type=click.Choice(["csv", "jsonl", "ical"]), default="csv")
+@click.option("-o", "--output", type=click.File("w"), default="-")
+@click.option("-s", "--start", type=click.DateTime(formats=["%Y-%m-%d"]), default=None)
+@click.option("-e", "--end", type=click.DateTime(formats=["%Y-%m-%d"]), default=None)
+@click.option("-p", "--project", type=str, default=None)
+def export(ctx, fmt, output, start, end, project):
+    """Stream entries to a file or stdout without holding them all in memory"""
+    from timetrack.export import WRITERS
+
+    driver = ctx.obj['DRIVER']
+
+    records = driver.get_filtered_entries(start and start.date(), end and end.date(), project)
+
+    if not driver.ordered_entries:
+        records = sorted(records, key=lambda r: r.day)
+
+    WRITERS[fmt](records, output)
+
+
+@cli.command()
+@click.pass_context
+@click.argument("input", type=click.File("r"))
+def import_jsonl(ctx, input):
+    "Load a JSON lines log into the compact driver, keeping entry IDs"
+    from timetrack.compact import TTCompactDriver
+
+    driver = ctx.obj['DRIVER']
+
+    if not isinstance(driver, TTCompactDriver):
+        print("import-jsonl needs the compact driver ([driver] type = compact)")
+        return
+
+    imported, failures = driver.import_records(input)
+
+    for lineno, error in failures:
+        print("Line {}: {}: {}".format(lineno + 1, type(error).__name__, error))
+
+    print("Imported {} of {} entries".format(imported, imported + len(failures)))
+
+
+@cli.command(name="import")
+@click.pass_context
+@click.argument("input", type=click.File("r"))
+@click.option("-f", "--format", "fmt", type=click.Choice(["csv", "jsonl"]), default=None,
+              help="Input format, guessed from the file extension by default")
+def import_entries(ctx, input, fmt):
+    """Bulk add entries from CSV (date,project,time,comment,task columns) or JSON lines"""
+    import csv
+    import json
+
+    driver = ctx.obj['DRIVER']
+
+    if fmt is None:
+        fmt = "csv" if input.name.endswith(".csv") else "jsonl"
+
+    if fmt == "csv":
+        rows = ({key: value for key, value in row.items() if value not in (None, "")}
+                for row in csv.DictReader(input))
+    else:
+        rows = (json.loads(line) for line in input if line.strip())
+
+    total = 0
+
+    def counted(rows):
+        nonlocal total
+        for row in rows:
+            total += 1
+            yield row
+
+    failures = driver.add_entries(counted(rows))
+
+    for position, error in failures:
+        print("Entry {}: {}: {}".format(position + 1, type(error).__name__, error))
+
+    print("Imported {} of {} entries".format(total - len(failures), total))
+
+
+@cli.command()
+@click.pass_context
+@click.option("-s", "--source", type=click.Path(exists=True, dir_okay=False), default=None,
+              help="JSON lines log to migrate, defaults to the configured track_file")
+@click.option("-b", "--batch-size", type=int, default=1000)
+def migrate_sqlite(ctx, source, batch_size):
+    "Copy a JSON lines log into the SQLite driver, keeping entry IDs"
+    from configparser import ConfigParser
+    from timetrack import TTFileDriver
+    from timetrack.sqlite import TTSQLiteDriver
+
+    driver = ctx.obj['DRIVER']
+
+    if not isinstance(driver, TTSQLiteDriver):
+        print("migrate-sqlite needs the sqlite driver ([driver] type = sqlite)")
+        return
+
+    if source is None:
+        source = ctx.obj['CONFIG'].get('driver', 'track_file')
+
+    source_config = ConfigParser()
+    source_config['driver'] = {"track_file": source}
+
+    total, failures = driver.migrate(TTFileDriver(source_config).get_filtered_entries(), batch_size=batch_size)
+
+    for entry_id, error in failures:
+        print("Entry {}: {}: {}".format(entry_id, type(error).__name__, error))
+
+    print("Migrated {} of {} entries from {}".format(total, total + len(failures), source))
+
+
+@cli.command()
+@click.pass_context
+@click.option("-s", "--source", type=click.Path(exists=True, dir_okay=False), default=None,
+              help="JSON lines log to migrate, defaults to the configured track_file")
+@click.option("-b", "--batch-size", type=int, default=10000)
+def migrate_segments(ctx, source, batch_size):
+    "Copy a JSON lines log into monthly segments. Entries get new month-based IDs"
+    from configparser import ConfigParser
+    from timetrack import TTFileDriver
+    from timetrack.segmented import TTSegmentedDriver
+
+    driver = ctx.obj['DRIVER']
+
+    if not isinstance(driver, TTSegmentedDriver):
+        print("migrate-segments needs the segmented driver ([driver] type = segmented)")
+        return
+
+    if source is None:
+        source = ctx.obj['CONFIG'].get('driver', 'track_file')
+
+    source_config = ConfigParser()
+    source_config['driver'] = {"track_file": source}
+
+    total = driver.migrate(TTFileDriver(source_config).get_filtered_entries(), batch_size=batch_size)
+
+    print("Migrated {} entries from {} into {}".format(total, source, driver.segment_dir))
+    print("Entries have new IDs, rm and append still accept the old ones")
+
+
+@cli.command()
+@click.pass_context
+def check_rollups(ctx):
+    "Compare cached daily totals against a full scan of the log"
+    driver = ctx.obj['DRIVER']
+
+    problems = driver.check_rollups()
+
+    for problem in problems:
+        print(problem)
+
+    if problems:
+        ctx.exit(1)
+
+    print("Rollups are consistent")
+
 
 @cli.command()
 @click.pass_context
@@ -249,11 +542,24 @@ def rm(ctx, entry_id):
 @click.option("-m", "--month", is_flag=True)
 @click.option("-g", "--graph", is_flag=True)
 @click.option("--graph-type", type=click.Choice(['bar','pie'], case_sensitive=False), default='bar')
-def report(ctx, week, month, graph, graph_type):
+@click.option("--out", "out_dir", type=click.Path(file_okay=False), default=None,
+              help="Write the chart to this directory instead of showing it (implies --graph)")
+@click.option("--per", type=click.Choice(['week', 'month']), default=None,
+              help="With --out, write one chart per week or month, covering all history unless -w or -m is given")
+@click.option("--format", "fmt", type=click.Choice(['png', 'svg']), default='png', help="Image format for --out")
+@click.option("--rebuild-rollups", is_flag=True, help="Recompute cached daily totals before reporting")
+def report(ctx, week, month, graph, graph_type, out_dir, per, fmt, rebuild_rollups):
     """Summarise total time spent per project instead of per day"""
     
     
     driver = ctx.obj['DRIVER']
+
+    if per and not out_dir:
+        print("--per needs --out to say where to write the charts")
+        ctx.exit(1)
+
+    if rebuild_rollups:
+        driver.rebuild_rollups()
     
     if week:
         end = datetime.now()
@@ -267,21 +573,75 @@ def report(ctx, week, month, graph, graph_type):
         start = end - delta
         start_date = date(start.year, start.month, start.day)
         end_date = date(end.year, end.month, end.day)
+    elif per:
+        start_date = None
+        end_date = date.today()
     else:
         start_date = date.today()
         end_date = date.today()
 
-    projects = defaultdict(lambda: 0)
-    
-    for record in driver.get_filtered_entries(start_date, end_date, project=None):
+    from timetrack.table import EntryTable
+
+    if per:
+        from timetrack.charts import iter_periods
+
+        table = None
+
+        if start_date is None:
+            table = EntryTable.from_entries(driver.get_rollups(None, end_date))
+
+            if not len(table):
+                print("Nothing recorded to chart")
+                return {}
+
+            start_date = table.dates.min().astype(date)
+
+        # charts always cover whole weeks or months, even at the ends of the range
+        periods = list(iter_periods(start_date, end_date, per))
+
+        if table is None:
+            table = EntryTable.from_entries(driver.get_rollups(periods[0][1], periods[-1][2]))
+
+        projects = table.by_project()
+    else:
+        table = EntryTable.from_entries(driver.get_rollups(start_date, end_date))
+        projects = table.between(start_date, end_date).by_project()
+
+    if out_dir:
+        with profiling.span("import matplotlib"):
+            from timetrack.charts import TTChartRenderer, breakdown_title
+
+            renderer = TTChartRenderer(out_dir, fmt, graph_type)
+
+        if per:
+            charts = [(name, breakdown_title(first, last), table.between(first, last).by_project())
+                      for name, first, last in periods]
+        else:
+            name = start_date.strftime("%Y-%m-%d")
+
+            if start_date != end_date:
+                name += "_to_" + end_date.strftime("%Y-%m-%d")
+
+            charts = [(name, breakdown_title(start_date, end_date), projects)]
+
+        written = unchanged = 0
 
-        dt = datetime.strptime(record['date'], "%Y-%m-%d")
-        record_date = date(dt.year, dt.month, dt.day)
+        with profiling.span("render"):
+            for name, title, period_projects in charts:
+                # leave gaps in the series rather than drawing empty charts
+                if not period_projects:
+                    continue
 
-        if record_date >= start_date and record_date <= end_date:
-            projects[record['project']] += record['time']
+                if renderer.render(name, title, period_projects):
+                    written += 1
+                else:
+                    unchanged += 1
 
-    if not graph:
+            renderer.save()
+
+        print("Wrote {} chart(s) to {}, {} unchanged".format(written, out_dir, unchanged))
+
+    elif not graph:
         print("\nProject Breakdown: {} to {} \n----------".format(
             start_date.strftime("%Y-%m-%d"),
             end_date.strftime("%Y-%m-%d")))
@@ -289,36 +649,97 @@ def report(ctx, week, month, graph, graph_type):
         for project, spent in projects.items():
             print("{}: {}".format(project, human_time(spent)))
     else:
-        fig = pyplot.figure()
-        titleString = "Project Breakdown: {}".format(start_date.strftime("%Y-%m-%d"))
+        with profiling.span("import matplotlib"):
+            from matplotlib import pyplot
+            from timetrack.charts import draw_breakdown, breakdown_title
 
-        if start_date != end_date:
-            titleString+=" to {}".format(end_date.strftime("%Y-%m-%d"))
+        with profiling.span("render"):
+            draw_breakdown(pyplot.figure(), projects, breakdown_title(start_date, end_date), graph_type)
 
-        fig.suptitle(titleString, fontsize=14, fontweight='bold')
+        pyplot.show()
 
-        ax = fig.add_subplot(1,1,1)
-        fig.subplots_adjust(top=0.85)
-        num_reports = len(projects)
+    return projects
 
-        my_colors = ['c','m','y','r', 'g', 'b']
 
-        for key in projects.keys():
-            projects[key] = projects[key]/60.0
+@cli.command()
+@click.pass_context
+@click.option("--drop-failed", is_flag=True, help="Forget entries Harvest rejected instead of listing them again")
+def sync(ctx, drop_failed):
+    """Send entries waiting in the outbox, then sync the log with Harvest if [sync] is set up"""
+    from timetrack.locking import TTLockBusy
 
-        if graph_type == "pie":
-            pyplot.axis('equal')
-            pyplot.pie(projects.values(), labels=list(projects.keys()), autopct='%1.1f%%', colors=my_colors, startangle=90)
-        else:
-            ax.set_xlabel('Project')
-            ax.set_ylabel('Hours')
-            pyplot.barh(range(num_reports), projects.values(), align='center', color=my_colors)
-            pyplot.yticks(range(num_reports), list(projects.keys()))
+    driver = ctx.obj['DRIVER']
+    config = ctx.obj['CONFIG']
+    problems = False
 
-    pyplot.show()
+    try:
+        result = driver.flush_outbox(drop_failed=drop_failed)
+    except TTLockBusy:
+        print("Another timetrack process is already sending queued entries")
+        ctx.exit(1)
 
-    return projects
+    if result is None and not config.has_section("sync"):
+        print("Nothing to sync, this driver sends entries straight away")
+        return
+
+    if result is not None:
+        sent, failed, queued = result
+
+        print("Sent {} queued entries, {} still queued".format(sent, queued))
+
+        for entry, error in failed:
+            print("Rejected {} {} on {}: {}".format(entry['date'], human_time(entry['time']), entry['project'], error))
+
+        if failed and drop_failed:
+            print("Dropped {} rejected entries".format(len(failed)))
+        elif failed:
+            print("Fix or re-add them, then run sync --drop-failed to clear them")
 
+        problems = (failed and not drop_failed) or queued
+
+    if config.has_section("sync"):
+        from timetrack.sync import TTSyncEngine, TTSyncException
+
+        try:
+            engine = TTSyncEngine(config)
+            stats, failed = engine.sync()
+        except TTLockBusy:
+            print("Another timetrack sync is already running")
+            ctx.exit(1)
+        except TTSyncException as e:
+            print(e)
+            ctx.exit(1)
+
+        print("Pushed {} new, {} changed and {} deleted entries, pulled {} new and {} changed entries".format(
+            stats['pushed_new'], stats['pushed_updated'], stats['pushed_deleted'],
+            stats['pulled_new'], stats['pulled_updated']))
+
+        if stats['conflicts']:
+            print("{} entries had changed on both sides, kept the {} copy".format(stats['conflicts'], engine.conflicts))
+
+        for entry_id, error in failed:
+            print("Could not sync entry {}: {}".format(entry_id, error))
+
+        problems = problems or failed
+
+    if problems:
+        ctx.exit(1)
+
+
+@cli.command()
+@click.option("--socket", "socket_path", type=click.Path(dir_okay=False), default=None,
+              help="Socket to listen on (default $TIMETRACK_SOCKET, $XDG_RUNTIME_DIR/timetrack.sock or ~/.timetrack.sock)")
+@click.option("--poll", type=float, default=1.0, help="Seconds between checks of the config and log for changes")
+@click.option("--sync-interval", type=float, default=60.0,
+              help="Seconds between sends of queued Harvest entries, 0 to leave it to timetrack sync")
+def serve(socket_path, poll, sync_interval):
+    """Run a daemon that keeps config, drivers and caches warm for other timetrack calls"""
+    from timetrack.daemon import TTDaemon, TTDaemonException
+
+    try:
+        TTDaemon(socket_path, poll_interval=poll, sync_interval=sync_interval).serve_forever()
+    except TTDaemonException as e:
+        print(e)
 
 
 if __name__ == "__main__":
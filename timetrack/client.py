@@ -0,0 +1,116 @@
+"""Thin client for `timetrack serve`.
+
+This is the console script entry point. When a daemon is listening it sends
+the command line over the daemon's Unix socket and prints what comes back,
+skipping config loading, driver construction and index loading. Otherwise,
+or for commands that need the terminal (live timers, graphs) or the caller's
+working directory (import/export), it runs the CLI in process as before.
+
+Keep the imports here to the standard library - the point is to start fast.
+"""
+import os
+import sys
+import json
+import socket
+
+# commands the daemon may run on our behalf, everything else runs locally
+DAEMON_COMMANDS = {"add", "append", "ls", "ls-prj", "ls-tasks", "search", "rm", "report", "compact", "check-rollups",
+                   "sync", "start", "stop", "status"}
+
+# what click's shell completion reads from the environment
+COMPLETE_VAR = "_TIMETRACK_COMPLETE"
+COMPLETE_ENV = (COMPLETE_VAR, "COMP_WORDS", "COMP_CWORD")
+
+
+def default_socket_path(environ=os.environ):
+    """TIMETRACK_SOCKET, else timetrack.sock in XDG_RUNTIME_DIR, else ~/.timetrack.sock"""
+
+    if environ.get("TIMETRACK_SOCKET"):
+        return environ["TIMETRACK_SOCKET"]
+
+    if environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(environ["XDG_RUNTIME_DIR"], "timetrack.sock")
+
+    return os.path.expanduser("~/.timetrack.sock")
+
+
+def should_forward(argv, environ=os.environ):
+    """Decide whether a command line can be answered by the daemon"""
+
+    if environ.get("TIMETRACK_NO_DAEMON") or environ.get("TIMETRACK_TRACE", "0").lower() not in ("", "0", "no", "false"):
+        return False
+
+    if environ.get(COMPLETE_VAR):
+        return True
+
+    # global options such as --profile come before the command and run locally
+    if not argv or argv[0] not in DAEMON_COMMANDS:
+        return False
+
+    # a live timer needs the terminal, a detached one doesn't
+    if argv[0] in ("add", "append") and "live" in argv and "--detach" not in argv:
+        return False
+
+    # charts need matplotlib and --out paths are relative to the caller's directory
+    if argv[0] == "report" and any(arg in ("-g", "--graph") or arg.startswith("--out") for arg in argv):
+        return False
+
+    return True
+
+
+def call(request, socket_path=None, timeout=300.0):
+    """Send a request to the daemon, returning its response or None if no daemon is listening"""
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        sock.settimeout(0.5)
+
+        try:
+            sock.connect(socket_path or default_socket_path())
+        except OSError:
+            return None
+
+        # from here on the daemon may have acted on the request, so failures
+        # are reported rather than retried locally
+        chunks = []
+
+        try:
+            sock.settimeout(timeout)
+            sock.sendall(json.dumps(request).encode("utf8") + b"\n")
+            sock.shutdown(socket.SHUT_WR)
+
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+
+            return json.loads(b"".join(chunks).decode("utf8"))
+        except (OSError, ValueError) as e:
+            return {"stdout": "", "stderr": "timetrack: lost the connection to the daemon ({})\n".format(e),
+                    "code": 1}
+    finally:
+        sock.close()
+
+
+def main():
+    argv = sys.argv[1:]
+
+    if should_forward(argv):
+        env = {key: os.environ[key] for key in COMPLETE_ENV if key in os.environ}
+        response = call({"argv": argv, "env": env})
+
+        if response is not None:
+            sys.stdout.write(response['stdout'])
+            sys.stderr.write(response['stderr'])
+            sys.stdout.flush()
+            return response['code']
+
+    from timetrack.cli import cli
+
+    return cli(prog_name="timetrack")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+import os
+import json
+import struct
+import numpy
+
+from datetime import date, datetime
+from configparser import ConfigParser
+from typing import Optional
+
+from timetrack import TTBaseDriver, Entry, TimerException, parse_time
+
+# day ordinal, minutes, project string id, task string id (-1 for none),
+# comment offset into the heap, comment length in bytes, flags. Minutes are
+# a double so live timer and fractional times survive a round trip exactly
+RECORD = struct.Struct("<IdiiQII")
+
+RECORD_DTYPE = numpy.dtype([
+    ("day", "<u4"),
+    ("minutes", "<f8"),
+    ("project", "<i4"),
+    ("task", "<i4"),
+    ("comment_offset", "<u8"),
+    ("comment_length", "<u4"),
+    ("flags", "<u4"),
+])
+
+FLAG_DELETED = 1
+
+
+class TTCompactDriverException(Exception):
+    """Exception raised by the compact driver"""
+
+
+class TTCompactDriver(TTBaseDriver):
+    """Stores entries as fixed-width binary records instead of JSON lines.
+
+    Three files make up the log:
+
+     * <compact_file> - one RECORD per entry, read through numpy.memmap
+     * <compact_file>.strings - interned project and task names, one JSON string per line
+     * <compact_file>.heap - comments as raw UTF-8, addressed by offset and length
+
+    The entry ID is the record number + 1. Deletes and time updates are made
+    in place so IDs never move.
+    """
+
+    ordered_entries = True
+
+    def __init__(self, config: ConfigParser, rootsection: Optional[str] = "driver"):
+
+        track_file = config.get(rootsection, "track_file", fallback=None)
+        self.compact_file = config.get(rootsection, "compact_file",
+                                       fallback=None if track_file is None else track_file + ".bin")
+
+        if self.compact_file is None:
+            raise TTCompactDriverException("You must supply a compact_file or track_file")
+
+        self.strings_file = self.compact_file + ".strings"
+        self.heap_file = self.compact_file + ".heap"
+
+        self._strings = None
+        self._string_ids = None
+
+    def _load_strings(self):
+        if self._strings is None:
+            self._strings = []
+
+            if os.path.exists(self.strings_file):
+                with open(self.strings_file, "r") as f:
+                    self._strings = [json.loads(line) for line in f]
+
+            self._string_ids = {s: i for i, s in enumerate(self._strings)}
+
+        return self._strings
+
+    def _intern(self, name):
+        """Return the string id for name, adding it to the table if it is new"""
+
+        self._load_strings()
+
+        if name not in self._string_ids:
+            with open(self.strings_file, "a") as f:
+                f.write(json.dumps(name) + "\n")
+
+            self._string_ids[name] = len(self._strings)
+            self._strings.append(name)
+
+        return self._string_ids[name]
+
+    def _records(self):
+        """Map the record file into memory, None if there are no records yet"""
+
+        if not os.path.exists(self.compact_file) or os.path.getsize(self.compact_file) == 0:
+            return None
+
+        return numpy.memmap(self.compact_file, dtype=RECORD_DTYPE, mode="r")
+
+    def _count(self):
+        if not os.path.exists(self.compact_file):
+            return 0
+        return os.path.getsize(self.compact_file) // RECORD.size
+
+    def _pack(self, day, minutes, project, task, comment, heap, flags=0):
+
+        comment = comment.encode("utf8")
+        offset = heap.seek(0, os.SEEK_END)
+        heap.write(comment)
+
+        return RECORD.pack(day.toordinal(), minutes, self._intern(project),
+                           -1 if task is None else self._intern(task),
+                           offset, len(comment), flags)
+
+    def add_entry(self, project, time, comment, when=None, task=None):
+        """Append a single fixed-width record"""
+
+        time = parse_time(time)
+
+        if time < 1:
+            raise TimerException("You must spend at least a minute on a task to record it.")
+
+        if when is None:
+            day = date.today()
+        elif type(when) is datetime:
+            day = when.date()
+        else:
+            day = datetime.strptime(when, "%Y-%m-%d").date()
+
+        if type(comment) is list:
+            comment = ' '.join(comment)
+
+        with open(self.heap_file, "ab") as heap, open(self.compact_file, "ab") as f:
+            f.write(self._pack(day, time, project, task, comment, heap))
+
+    def _record_at(self, entry_id):
+        """Return (offset, record tuple) for a live entry or (None, None)"""
+
+        index = int(entry_id) - 1
+
+        if index < 0 or index >= self._count():
+            return None, None
+
+        with open(self.compact_file, "rb") as f:
+            f.seek(index * RECORD.size)
+            record = RECORD.unpack(f.read(RECORD.size))
+
+        if record[6] & FLAG_DELETED:
+            return None, None
+
+        return index * RECORD.size, record
+
+    def _overwrite(self, offset, record):
+        with open(self.compact_file, "r+b") as f:
+            f.seek(offset)
+            f.write(RECORD.pack(*record))
+
+    def delete_entry(self, entry_id):
+
+        offset, record = self._record_at(entry_id)
+
+        if record is None:
+            return False
+
+        self._overwrite(offset, record[:6] + (record[6] | FLAG_DELETED,))
+
+        return True
+
+    def update_entry(self, entry_id, time):
+        """Add time to an entry in place"""
+
+        offset, record = self._record_at(entry_id)
+
+        if record is None:
+            print("Could not find entry with ID {}. Giving up.".format(entry_id))
+            return
+
+        time_add = parse_time(time)
+
+        if time_add == 1:
+            print("You must spend at least another minute \
+                on this task to update it.")
+            return
+
+        print("Appending {} minutes to entry {} ({})".format(time_add, entry_id,
+                                                            self._load_strings()[record[2]]))
+
+        self._overwrite(offset, (record[0], record[1] + time_add) + record[2:])
+
+    def import_records(self, lines):
+        """Load the lines of a JSONL log, keeping entry IDs and applying journal records.
+
+        Entries without an explicit ID take their line number, blank and
+        journal lines included, as they do in the file driver. Gaps in the
+        IDs are filled with deleted records so that every entry lands at the
+        position its ID refers to. Entries whose ID is already taken and
+        lines that don't decode are skipped. Returns (entries imported,
+        [(line, exception)]) for the ones that were skipped.
+        """
+
+        count = self._count()
+        imported = 0
+        failures = []
+
+        with open(self.heap_file, "ab") as heap, open(self.compact_file, "ab") as f:
+            for lineno, line in enumerate(lines):
+
+                if not line.strip():
+                    continue
+
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    failures.append((lineno, e))
+                    continue
+
+                op = record.get('op')
+
+                if op is not None:
+                    f.flush()
+
+                    if op == "delete":
+                        self.delete_entry(record['ref'])
+                    elif op == "update":
+                        offset, target = self._record_at(record['ref'])
+                        if target is not None:
+                            self._overwrite(offset, (target[0], target[1] + record['time']) + target[2:])
+
+                    continue
+
+                entry_id = record.get('id', lineno + 1)
+
+                if entry_id <= count:
+                    failures.append((lineno, TTCompactDriverException(f"Entry ID {entry_id} is already taken")))
+                    continue
+
+                day = datetime.strptime(record['date'], "%Y-%m-%d").date()
+
+                while count + 1 < entry_id:
+                    f.write(self._pack(day, 0, record['project'], None, "", heap, FLAG_DELETED))
+                    count += 1
+
+                f.write(self._pack(day, record['time'], record['project'], record.get('task'),
+                                   record.get('comment', ""), heap))
+                count += 1
+                imported += 1
+
+        return imported, failures
+
+    def _select(self, records, start=None, finish=None, project=None, task=None):
+        """Return the row numbers of live records matching the filters, in date order"""
+
+        mask = (records['flags'] & FLAG_DELETED) == 0
+
+        if start is not None:
+            mask &= records['day'] >= start.toordinal()
+
+        if finish is not None:
+            mask &= records['day'] <= finish.toordinal()
+
+        self._load_strings()
+
+        for name, column in ((project, 'project'), (task, 'task')):
+            if name is None:
+                continue
+
+            if name not in self._string_ids:
+                return numpy.array([], dtype=int)
+
+            mask &= records[column] == self._string_ids[name]
+
+        rows = numpy.nonzero(mask)[0]
+
+        return rows[numpy.argsort(records['day'][rows], kind="stable")]
+
+    def get_filtered_entries(self, start=None, finish=None, project=None, task=None):
+
+        records = self._records()
+
+        if records is None:
+            return
+
+        rows = self._select(records, start, finish, project, task)
+        strings = self._load_strings()
+
+        with open(self.heap_file, "rb") as heap:
+            for row in rows:
+                day, minutes, project_id, task_id, offset, length, _ = records[row].tolist()
+
+                heap.seek(offset)
+
+                day = date.fromordinal(day)
+
+                yield Entry(day.isoformat(), strings[project_id], int(minutes) if minutes.is_integer() else minutes,
+                            heap.read(length).decode("utf8"),
+                            task=strings[task_id] if task_id >= 0 else None,
+                            id=int(row) + 1, day=day)
+
+    def _live_names(self, column, project=None):
+
+        records = self._records()
+
+        if records is None:
+            return set()
+
+        rows = self._select(records, project=project)
+        strings = self._load_strings()
+
+        return {strings[i] for i in numpy.unique(records[column][rows]) if i >= 0}
+
+    def get_projects(self):
+        return self._live_names('project')
+
+    def get_tasks(self, project=None):
+        return self._live_names('task', project)
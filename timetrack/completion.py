@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import hashlib
+
+from typing import Optional
+
+from timetrack import profiling
+from timetrack.locking import tmp_path
+
+
+def default_cache_dir():
+    """Where timetrack keeps caches that can be thrown away at any time"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "timetrack")
+
+
+class TTCompletionCache:
+    """Small on-disk catalogue of project and task names used by shell completion.
+
+    The catalogue is tagged with a stamp supplied by the driver (for example
+    the size and mtime of a log file) and optionally an expiry time. It is
+    only trusted while the driver still reports the same stamp and it has not
+    expired, otherwise it is refreshed from the driver.
+    """
+
+    def __init__(self, name: str, ttl: Optional[float] = None, cache_dir: Optional[str] = None):
+        key = hashlib.sha1(name.encode("utf8")).hexdigest()[:16]
+        self.path = os.path.join(cache_dir or default_cache_dir(), "completion-{}.json".format(key))
+        self.ttl = ttl
+
+    def _read(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, data):
+        tmpfile = tmp_path(self.path)
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmpfile, "w") as f:
+                json.dump(data, f)
+            os.replace(tmpfile, self.path)
+        except OSError:
+            pass
+
+    def _is_valid(self, data, stamp):
+        if data is None or data.get('stamp') != stamp:
+            return False
+
+        return data.get('expires') is None or time.time() < data['expires']
+
+    def refresh(self, driver):
+        """Rebuild the catalogue from the driver itself"""
+
+        data = {
+            "stamp": driver.completion_stamp(),
+            "expires": None if self.ttl is None else time.time() + self.ttl,
+            "projects": sorted(driver.get_projects()),
+            "tasks": sorted(driver.get_tasks()),
+        }
+
+        self._write(data)
+
+        return data
+
+    def get(self, driver):
+        """Return (projects, tasks), only asking the driver if the cache is stale"""
+
+        data = self._read()
+
+        if not self._is_valid(data, driver.completion_stamp()):
+            profiling.count("completion_cache_misses")
+            data = self.refresh(driver)
+        else:
+            profiling.count("completion_cache_hits")
+
+        return data['projects'], data['tasks']
+
+    def update(self, before, after, projects=(), tasks=()):
+        """Fold the projects and tasks of newly added entries into the catalogue.
+
+        before is the driver stamp from just before the entry was written. If
+        the catalogue was not current at that point it is left alone and will
+        be refreshed on next use instead.
+        """
+
+        data = self._read()
+
+        if not self._is_valid(data, before):
+            return
+
+        for new_names, names in ((projects, data['projects']), (tasks, data['tasks'])):
+            for name in set(new_names).difference(names):
+                if name is not None:
+                    names.append(name)
+
+            names.sort()
+
+        data['stamp'] = after
+
+        self._write(data)
@@ -0,0 +1,251 @@
+import io
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import threading
+import traceback
+
+from contextlib import redirect_stdout, redirect_stderr
+
+from timetrack.client import COMPLETE_VAR, COMPLETE_ENV, default_socket_path
+from timetrack.locking import TTLockBusy
+
+
+class TTDaemonException(Exception):
+    """Raised when the daemon cannot start"""
+
+
+class TTDaemon:
+    """Serve CLI commands over a Unix socket with the config and driver kept warm.
+
+    Requests are run one at a time through the real click commands, with
+    stdout and stderr captured and sent back to the client. A watcher thread
+    polls the config file and any logs the driver reads, reloading the config
+    when it changes and re-warming the driver's index and completion
+    catalogue when a log is written by another process. Every sync_interval
+    seconds it also sends anything waiting in the driver's outbox.
+    """
+
+    def __init__(self, socket_path=None, poll_interval=1.0, sync_interval=60.0):
+        self.socket_path = socket_path or default_socket_path()
+        self.poll_interval = poll_interval
+        self.sync_interval = sync_interval
+        self.obj = None
+        self._lock = threading.Lock()
+        self._stamps = {}
+        self._stopping = threading.Event()
+
+    def _load(self):
+        """Load config and build the driver, as a CLI invocation would"""
+        from timetrack.cli import init_context_obj
+
+        self.obj = init_context_obj()
+        self._warm()
+        self._stamps = self._watch_stamps()
+
+    def _drivers(self):
+        driver = self.obj['DRIVER']
+        return [driver] + list(getattr(driver, "drivers", {}).values())
+
+    def _warm(self):
+        """Pull indexes and catalogues into memory so the next request doesn't"""
+
+        for driver in self._drivers():
+            index = getattr(driver, "index", None)
+
+            if index is not None:
+                index.ensure()
+
+        try:
+            self.obj['DRIVER'].get_completions()
+        except Exception:
+            # e.g. Harvest being unreachable, the request will report it
+            pass
+
+    def _watch_paths(self):
+        paths = [os.path.expanduser("~/.timetrack")]
+        paths.extend(driver.track_file for driver in self._drivers() if getattr(driver, "track_file", None))
+        return paths
+
+    def _watch_stamps(self):
+        stamps = {}
+
+        for path in self._watch_paths():
+            try:
+                st = os.stat(path)
+                stamps[path] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                stamps[path] = None
+
+        return stamps
+
+    def _check_changes(self):
+        config_path = os.path.expanduser("~/.timetrack")
+
+        with self._lock:
+            stamps = self._watch_stamps()
+
+            if stamps == self._stamps:
+                return
+
+            try:
+                if stamps.get(config_path) != self._stamps.get(config_path):
+                    self._load()
+                else:
+                    self._warm()
+                    self._stamps = self._watch_stamps()
+            except Exception:
+                traceback.print_exc()
+                self._stamps = stamps
+
+    def _flush(self):
+        """Send queued entries without holding the request lock.
+
+        The outbox guards its own journal with file locks, as it does against
+        `timetrack sync` in another process, so requests keep being answered
+        while entries are on the wire. The lock is only taken to pick up the
+        current driver.
+        """
+
+        with self._lock:
+            driver = self.obj['DRIVER']
+
+        try:
+            driver.flush_outbox()
+        except TTLockBusy:
+            # `timetrack sync` in another process got there first
+            pass
+        except Exception:
+            traceback.print_exc()
+
+    def _watch(self):
+        next_sync = time.monotonic()
+
+        while not self._stopping.wait(self.poll_interval):
+            self._check_changes()
+
+            if self.sync_interval and time.monotonic() >= next_sync:
+                next_sync = time.monotonic() + self.sync_interval
+                self._flush()
+
+    def handle(self, request):
+        """Run one request and return the response sent back to the client"""
+        from click._bashcomplete import bashcomplete
+        from timetrack.cli import cli
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        env = request.get("env", {})
+        code = 0
+
+        with self._lock, redirect_stdout(stdout), redirect_stderr(stderr):
+
+            # every context click creates, including completion's, gets the warm obj
+            cli.context_settings['obj'] = self.obj
+
+            try:
+                if env.get(COMPLETE_VAR):
+                    os.environ.update({key: env[key] for key in COMPLETE_ENV if key in env})
+
+                    try:
+                        bashcomplete(cli, "timetrack", COMPLETE_VAR, env[COMPLETE_VAR])
+                    finally:
+                        for key in COMPLETE_ENV:
+                            os.environ.pop(key, None)
+                else:
+                    cli.main(args=request['argv'], prog_name="timetrack", standalone_mode=True)
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except Exception:
+                traceback.print_exc()
+                code = 1
+            finally:
+                cli.context_settings.pop('obj', None)
+
+        return {"stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "code": code}
+
+    def _bind(self):
+
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                # left behind by a daemon that died
+                os.remove(self.socket_path)
+            else:
+                raise TTDaemonException(f"A timetrack daemon is already listening on {self.socket_path}")
+            finally:
+                probe.close()
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        # only the user running the daemon may talk to it
+        umask = os.umask(0o077)
+
+        try:
+            server.bind(self.socket_path)
+        finally:
+            os.umask(umask)
+
+        server.listen(16)
+
+        return server
+
+    def _serve_one(self, conn):
+
+        with conn:
+            chunks = []
+
+            while True:
+                chunk = conn.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+
+            try:
+                request = json.loads(b"".join(chunks).decode("utf8"))
+            except ValueError:
+                return
+
+            response = self.handle(request)
+            conn.sendall(json.dumps(response).encode("utf8"))
+
+    def serve_forever(self):
+        """Listen until interrupted or sent SIGTERM, removing the socket afterwards"""
+
+        self._load()
+        server = self._bind()
+
+        def terminate(signum, frame):
+            raise KeyboardInterrupt
+
+        signal.signal(signal.SIGTERM, terminate)
+
+        watcher = threading.Thread(target=self._watch, daemon=True)
+        watcher.start()
+
+        print(f"timetrack daemon listening on {self.socket_path}", file=sys.stderr)
+
+        try:
+            while True:
+                conn, _ = server.accept()
+
+                try:
+                    self._serve_one(conn)
+                except OSError:
+                    # the client went away, nothing to tell it
+                    pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stopping.set()
+            server.close()
+
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
@@ -0,0 +1,106 @@
+from datetime import datetime
+from functools import lru_cache
+
+# the fields every entry has a slot for, in the order they are listed
+FIELDS = ("date", "project", "time", "comment", "task", "id")
+
+
+@lru_cache(maxsize=4096)
+def parse_date(value):
+    """Parse a YYYY-MM-DD string.
+
+    A log repeats the same few hundred days over and over so the results are
+    memoised, which makes parsing a date per entry nearly free.
+    """
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+class Entry:
+    """A time entry as yielded by the drivers.
+
+    `day` holds the entry's date already parsed into a date object while
+    `date` keeps the YYYY-MM-DD string. Entries still behave like the dicts
+    drivers used to yield - entry['project'], entry.get('task'), 'task' in
+    entry - and any driver specific fields (e.g. Harvest's) live in `extra`.
+    """
+
+    __slots__ = ("date", "day", "project", "time", "comment", "task", "id", "extra")
+
+    def __init__(self, date, project, time, comment="", task=None, id=None, day=None, extra=None):
+        self.date = date
+        self.day = day if day is not None else parse_date(date)
+        self.project = project
+        self.time = time
+        self.comment = comment
+        self.task = task
+        self.id = id
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, record):
+        """Build an entry from a log record, keeping unknown keys in extra"""
+
+        extra = {key: value for key, value in record.items() if key not in FIELDS}
+
+        return cls(record['date'], record['project'], record['time'], record.get('comment', ""),
+                   record.get('task'), record.get('id'), extra=extra or None)
+
+    def __getitem__(self, key):
+        if key in FIELDS:
+            value = getattr(self, key)
+
+            if value is None and key in ("task", "id"):
+                raise KeyError(key)
+
+            return value
+
+        if self.extra is None:
+            raise KeyError(key)
+
+        return self.extra[key]
+
+    def __setitem__(self, key, value):
+        if key == "date":
+            self.day = parse_date(value)
+
+        if key in FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+
+        return True
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [key for key in FIELDS if key in self] + list(self.extra or ())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, (Entry, dict)):
+            return self.to_dict() == dict(other)
+
+        return NotImplemented
+
+    def __repr__(self):
+        return "Entry({!r})".format(self.to_dict())
@@ -0,0 +1,91 @@
+import csv
+import json
+
+from datetime import datetime, timezone
+
+from timetrack import human_time
+
+# fields written by the csv and jsonl exporters, in this order
+FIELDS = ("date", "project", "time", "comment", "task", "id")
+
+
+def jsonl_line(record):
+    """Render an entry in the file driver's JSON lines format"""
+    return json.dumps({key: record[key] for key in FIELDS if key in record}) + "\n"
+
+
+def write_jsonl(records, out):
+    for record in records:
+        out.write(jsonl_line(record))
+
+
+def write_csv(records, out):
+    writer = csv.DictWriter(out, fieldnames=FIELDS, extrasaction="ignore")
+    writer.writeheader()
+
+    for record in records:
+        writer.writerow(record)
+
+
+def _ical_text(text):
+    """Escape a value for an iCalendar TEXT property"""
+    return (str(text).replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\n", "\\n"))
+
+
+def _ical_line(line):
+    """Fold a content line so that no line is longer than 75 octets"""
+
+    data = line.encode("utf8")
+    parts = []
+
+    while len(data) > 75:
+        cut = 75 if not parts else 74
+
+        # don't split a multi-byte character
+        while cut > 0 and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+
+        parts.append(data[:cut].decode("utf8"))
+        data = data[cut:]
+
+    parts.append(data.decode("utf8"))
+
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def write_ical(records, out):
+    """Write entries as all-day VEVENTs"""
+
+    out.write(_ical_line("BEGIN:VCALENDAR"))
+    out.write(_ical_line("VERSION:2.0"))
+    out.write(_ical_line("PRODID:-//timetrack//timetrack 1.0//EN"))
+
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    for record in records:
+        day = record['date'].replace("-", "")
+        summary = "{}: {}".format(record['project'], human_time(record['time']))
+
+        out.write(_ical_line("BEGIN:VEVENT"))
+        out.write(_ical_line("UID:{}-{}@timetrack".format(record.get('id', ""), day)))
+        out.write(_ical_line("DTSTAMP:" + stamp))
+        out.write(_ical_line("DTSTART;VALUE=DATE:{}".format(day)))
+        out.write(_ical_line("SUMMARY:" + _ical_text(summary)))
+
+        if record.get('comment'):
+            out.write(_ical_line("DESCRIPTION:" + _ical_text(record['comment'])))
+
+        if record.get('task'):
+            out.write(_ical_line("CATEGORIES:" + _ical_text(record['task'])))
+
+        out.write(_ical_line("END:VEVENT"))
+
+    out.write(_ical_line("END:VCALENDAR"))
+
+
+WRITERS = {
+    "csv": write_csv,
+    "jsonl": write_jsonl,
+    "ical": write_ical,
+}
@@ -1,13 +1,33 @@
+import os
+import time
 import requests
 
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-from timetrack import TTBaseDriver, parse_time
+from requests.adapters import HTTPAdapter
+from timetrack import TTBaseDriver, Entry, parse_time, profiling
+from timetrack.completion import TTCompletionCache
+from timetrack.outbox import TTOutbox
 from configparser import ConfigParser
 from typing import Optional
 
 USER_AGENT = "timetrack 1.0"
 HARVEST_ENDPOINT = "https://api.harvestapp.com/v2"
 
+# statuses worth another go - 429 is Harvest's rate limiter telling us to back off
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+
+def transient_error(error):
+    """True for errors that say nothing about the entry, only that Harvest can't be reached right now"""
+
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in RETRY_STATUSES
+
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
 class TTHarvestDriverException(Exception):
     """Exceptions raised by timetrack harvst driver"""
 
@@ -27,8 +47,38 @@ class TTHarvestDriver(TTBaseDriver):
         
         self.access_token = ACCESS_TOKEN
         self.account_id = ACCOUNT_ID
+        self.endpoint = config.get(rootsection, "endpoint", fallback=HARVEST_ENDPOINT)
         self._user_profile = None
         self._project_map = None
+
+        self.max_retries = config.getint(rootsection, "max_retries", fallback=3)
+        self.backoff = config.getfloat(rootsection, "backoff", fallback=0.5)
+        self.cache_ttl = config.getfloat(rootsection, "cache_ttl", fallback=300)
+        self.page_size = config.getint(rootsection, "page_size", fallback=100)
+        self.prefetch = config.getboolean(rootsection, "prefetch", fallback=True)
+        self.concurrency = config.getint(rootsection, "concurrency", fallback=4)
+        self._cache = {}
+
+        # one keep-alive session per driver so requests share pooled connections
+        self.session = requests.Session()
+        self.session.headers.update(self.get_default_headers())
+
+        adapter = HTTPAdapter(pool_maxsize=config.getint(rootsection, "pool_size", fallback=10))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # new entries are queued on disk and sent by `timetrack sync` (or the daemon)
+        self.outbox = None
+        self.sync_batch_size = config.getint(rootsection, "sync_batch_size", fallback=20)
+
+        if config.getboolean(rootsection, "outbox", fallback=True):
+            self.outbox = TTOutbox(config.get(rootsection, "outbox_file",
+                                              fallback=os.path.expanduser(f"~/.timetrack_harvest_outbox_{ACCOUNT_ID}")))
+
+        # project assignments rarely change so completion can go stale for a while
+        self.completion = TTCompletionCache(f"harvest:{ACCOUNT_ID}:{ACCESS_TOKEN}",
+                                            ttl=config.getfloat(rootsection, "completion_ttl", fallback=3600),
+                                            cache_dir=config.get("timetrack", "cache_dir", fallback=None))
         
     def get_default_headers(self):
         return {
@@ -44,32 +94,169 @@ class TTHarvestDriver(TTBaseDriver):
             
         return self._user_profile
         
-    def request(self, rqfunc, endpoint, additional_headers={}, *args, **kwargs):
-        
-        headers = self.get_default_headers()
-        headers.update(additional_headers)
-        
-        r = rqfunc(f"{HARVEST_ENDPOINT}{endpoint}", headers=headers, *args, **kwargs)
+    def _retry_delay(self, response, attempt):
+        """Honour Harvest's Retry-After header, otherwise back off exponentially"""
+
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+
+        if retry_after is not None:
+            try:
+                return max(float(retry_after), 0)
+            except ValueError:
+                pass
+
+        return self.backoff * (2 ** attempt)
+
+    def request(self, method, endpoint, additional_headers={}, *args, **kwargs):
+        """Send a request over the pooled session, retrying rate limits and server errors"""
+
+        url = endpoint if endpoint.startswith("http") else f"{self.endpoint}{endpoint}"
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                profiling.count("http_requests")
+                r = self.session.request(method, url, headers=additional_headers, *args, **kwargs)
+            except requests.ConnectionError:
+                if method not in IDEMPOTENT_METHODS or attempt == self.max_retries:
+                    raise
+                time.sleep(self._retry_delay(None, attempt))
+                continue
+
+            if profiling.enabled:
+                profiling.count("http_bytes_received", len(r.content))
+
+            if r.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return r
+
+            profiling.count("http_retries")
+
+            # a POST that hit a server error may have gone through, only retry rate limits
+            if r.status_code != 429 and method not in IDEMPOTENT_METHODS:
+                return r
+
+            time.sleep(self._retry_delay(r, attempt))
+
         return r
-        
+
+    def get_cached(self, endpoint, params=None):
+        """GET a read-only resource, re-using responses within cache_ttl and revalidating with ETags after"""
+
+        key = (endpoint, tuple(sorted((params or {}).items())))
+        cached = self._cache.get(key)
+
+        if cached is not None and time.time() < cached['expires']:
+            profiling.count("http_cache_hits")
+            return cached['data']
+
+        headers = {}
+        if cached is not None and cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+
+        r = self.request("GET", endpoint, headers, params=params)
+
+        if r.status_code == 304 and cached is not None:
+            profiling.count("http_cache_revalidated")
+            data = cached['data']
+        else:
+            r.raise_for_status()
+            data = r.json()
+
+        self._cache[key] = {
+            "expires": time.time() + self.cache_ttl,
+            "etag": r.headers.get("ETag"),
+            "data": data
+        }
+
+        return data
+
+    def iter_pages(self, endpoint, key, params=None, page_size=None, prefetch=None):
+        """Yield the items of a paginated listing page by page, following next_page.
+
+        With prefetch on, the next page is requested on a background thread
+        while the caller works through the current one.
+        """
+
+        params = dict(params or {}, per_page=page_size or self.page_size)
+        prefetch = self.prefetch if prefetch is None else prefetch
+
+        def fetch(page):
+            r = self.request("GET", endpoint, params=dict(params, page=page))
+            r.raise_for_status()
+            return r.json()
+
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+
+        try:
+            data = fetch(1)
+
+            while True:
+                next_page = data.get('next_page')
+                pending = None
+
+                if next_page is not None and executor is not None:
+                    pending = executor.submit(fetch, next_page)
+
+                yield from data[key]
+
+                if next_page is None:
+                    break
+
+                data = pending.result() if pending is not None else fetch(next_page)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
     def get_user_info(self):
-        
-        r = self.request(requests.get, "/users/me")
-        return r.json()
+        return self.get_cached("/users/me")
+
+    def get_project_assignments(self):
+        return self.get_cached(f"/users/{self.user_profile['id']}/project_assignments")['project_assignments']
     
+    def _queue_record(self, project, time, comment, when=None, task=None):
+        """Check what can be checked offline and turn an entry into an outbox record"""
+
+        time = parse_time(time)
+
+        if task is None:
+            raise Exception("Harvest requires a task, please provide valid task (use timetrack ls-tasks)")
+
+        return {
+            "date": when if isinstance(when, str) else (when or datetime.now()).strftime("%Y-%m-%d"),
+            "project": project,
+            "time": time,
+            "comment": comment,
+            "task": task,
+        }
+
     def add_entry(self, project, time, comment, when=datetime.now(), task=None):
+        """Queue an entry in the outbox, or POST it straight away if the outbox is turned off"""
+
+        if self.outbox is not None:
+            self.outbox.put([self._queue_record(project, time, comment, when, task)])
+            return True
+
+        r = self.request("POST", "/time_entries", json=self._time_entry(project, time, comment, when, task))
+
+        return r.status_code == 201
+
+    def _project_code(self, project):
         projbits = project.split("/")
-        
+
+        if len(projbits) < 2: #expect ProjectCode or Projectcode/ProjectName
+            return projbits[0]
+        else: #expect Client/ProjectCode/ProjectName
+            return projbits[1]
+
+    def _time_entry(self, project, time, comment, when=None, task=None):
+        """Resolve project and task names into the JSON body of a Harvest time entry"""
+
         time = parse_time(time)
         
         if task is None:
             raise Exception("Harvest requires a task, please provide valid task (use timetrack ls-tasks)")
-        
-        if len(projbits) < 2: #expect ProjectCode or Projectcode/ProjectName
-            project_id = projbits[0]
-        else: #expect Client/ProjectCode/ProjectName
-            project_id = projbits[1]
-            
+
+        project_id = self._project_code(project)
+
         # get user project assignments
         project_map = self.get_project_map()
         
@@ -88,25 +275,152 @@ class TTHarvestDriver(TTBaseDriver):
             raise Exception(f"Invalid task {task} on project {project} - double check that this task is associated with this project!")
         
         time_entry = {
-            "user_id": self._user_profile['id'],
+            "user_id": self.user_profile['id'],
             "project_id": proj['project']['id'],
             "task_id": task_id,
-            "spent_date": when.strftime("%Y-%m-%d"),
+            "spent_date": when if isinstance(when, str) else (when or datetime.now()).strftime("%Y-%m-%d"),
             "hours": time / 60, # convert from timetrack time (minutes) to hours
             "notes": comment
         }
-        
-        
-        r = self.request(requests.post, "/time_entries", json=time_entry)
-        
-        return r.status_code == 201
-            
-        
-        
-            
-            
-            
-    
+
+        return time_entry
+
+    def _send_queued(self, key, item):
+        """Send one outbox entry, returning "done", "retry" or an error message to give up with"""
+
+        entry = item['entry']
+
+        try:
+            # an earlier attempt may have gone through before we lost the response
+            if item['attempted'] and self.find_by_reference(key) is not None:
+                return "done"
+
+            time_entry = self._time_entry(entry['project'], entry['time'], entry.get('comment', ""),
+                                          entry['date'], entry.get('task'))
+            time_entry['external_reference'] = {"id": key, "group_id": "timetrack", "permalink": f"timetrack:{key}"}
+
+            r = self.request("POST", "/time_entries", json=time_entry)
+        except requests.RequestException as e:
+            if transient_error(e):
+                return "retry"
+
+            # e.g. a 403 or 422 looking up the reference, retrying would only block the queue
+            status = e.response.status_code if e.response is not None else None
+            return f"Harvest rejected the entry ({status}): {e}"
+        except Exception as e:
+            return str(e)
+
+        if r.status_code == 201:
+            return "done"
+
+        if r.status_code in RETRY_STATUSES:
+            return "retry"
+
+        return f"Harvest rejected the entry ({r.status_code}): {r.text[:200]}"
+
+    def flush_outbox(self, drop_failed=False):
+        """Send queued entries in batches of sync_batch_size, `concurrency` at a time.
+
+        Sending stops at the first batch Harvest could not take (it is down or
+        rate limiting us) and the rest stay queued. Returns (sent, failed,
+        still_queued) where failed lists (entry, error) for entries Harvest
+        rejected outright.
+        """
+
+        if self.outbox is None:
+            return None
+
+        sent = 0
+
+        with self.outbox.flushing():
+            queued = self.outbox.pending()
+
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                for start in range(0, len(queued), self.sync_batch_size):
+                    batch = queued[start:start + self.sync_batch_size]
+
+                    self.outbox.mark_attempted([key for key, item in batch if not item['attempted']])
+
+                    outcomes = list(executor.map(lambda queued_item: self._send_queued(*queued_item), batch))
+
+                    done = [key for (key, _), outcome in zip(batch, outcomes) if outcome == "done"]
+                    rejected = {key: outcome for (key, _), outcome in zip(batch, outcomes)
+                                if outcome not in ("done", "retry")}
+
+                    self.outbox.mark_done(done)
+                    self.outbox.mark_failed(rejected)
+                    sent += len(done)
+
+                    if "retry" in outcomes:
+                        break
+
+            self.outbox.compact()
+
+        failed = [(item['entry'], item['error']) for _, item in self.outbox.failed()]
+
+        if drop_failed:
+            self.outbox.drop_failed()
+
+        return sent, failed, len(self.outbox.pending())
+
+    def _post_entry(self, entry):
+        ok = self.add_entry(entry['project'], entry['time'], entry.get('comment', ""),
+                            when=entry.get('date'), task=entry.get('task'))
+
+        if not ok:
+            raise TTHarvestDriverException("Harvest did not accept the time entry")
+
+    def add_entries(self, entries):
+        """POST entries through a bounded pool of concurrent requests.
+
+        At most twice `concurrency` entries are in flight or queued at once so
+        that a large import is streamed rather than read into memory up front.
+        """
+
+        if self.outbox is not None:
+            return self._queue_entries(entries)
+
+        # fetch the shared lookups once before fanning out
+        self.get_project_map()
+
+        failures = []
+        pending = {}
+
+        def collect(futures):
+            for future in futures:
+                position = pending.pop(future)
+                if future.exception() is not None:
+                    failures.append((position, future.exception()))
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for position, entry in enumerate(entries):
+                pending[executor.submit(self._post_entry, entry)] = position
+
+                if len(pending) >= self.concurrency * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+
+            collect(list(pending))
+
+        return sorted(failures, key=lambda failure: failure[0])
+
+    def _queue_entries(self, entries):
+        """Queue a batch with one write to the outbox, returning offline validation failures"""
+
+        records, failures = [], []
+
+        for position, entry in enumerate(entries):
+            try:
+                records.append(self._queue_record(entry['project'], entry['time'], entry.get('comment', ""),
+                                                  entry.get('date'), entry.get('task')))
+            except Exception as e:
+                failures.append((position, e))
+
+        if records:
+            self.outbox.put(records)
+
+        return failures
+
     def delete_entry(self, entry_id):
         pass
     
@@ -115,20 +429,21 @@ class TTHarvestDriver(TTBaseDriver):
     
     def get_project_map(self):
         if self._project_map is None:
-            r = self.request(requests.get, f"/users/{self.user_profile['id']}/project_assignments")
-        
-            self._project_map = {p['project']['code']: p for p in r.json()['project_assignments']}
+            self._project_map = {p['project']['code']: p for p in self.get_project_assignments()}
             
         return self._project_map
         
             
-    def get_filtered_entries(self, start=None, finish=None, project=None):
+    def get_filtered_entries(self, start=None, finish=None, project=None, task=None, page_size=None):
+        """Stream time entries, fetching further pages only as they are needed"""
         
-        params = {
-            "user": self.user_profile['id'],
-            "from": start.strftime("%Y-%m-%d"),
-            "to": finish.strftime("%Y-%m-%d")
-        }
+        params = {"user": self.user_profile['id']}
+
+        if start is not None:
+            params['from'] = start.strftime("%Y-%m-%d")
+
+        if finish is not None:
+            params['to'] = finish.strftime("%Y-%m-%d")
         
         #we need this later but we need it for filtering by project too
         project_map = self.get_project_map()
@@ -140,32 +455,129 @@ class TTHarvestDriver(TTBaseDriver):
             
             params['project_id'] = project_map[project]['project']['id']
             
-        r = self.request(requests.get, f"/time_entries", params=params)
-        
         id2code = {p['project']['id']: p['project']['code'] for p in project_map.values()}
         
-        entries = []
-        for entry in r.json()['time_entries']:
-            entry['date'] = entry['spent_date']
-            entry['project'] = entry['client']['name'] + "/" + id2code[entry['project']['id']] + "/" + entry['project']['name']
-            entry['time'] = entry['hours'] * 60
-            entry['comment'] = entry.get('notes', "")
-            yield entry
+        for entry in self.iter_pages("/time_entries", "time_entries", params, page_size=page_size):
+
+            if task is not None and entry['task']['name'] != task:
+                continue
+
+            yield self._to_entry(entry, id2code)
+
+        yield from self.get_queued_entries(start, finish, project, task)
+
+    def _to_entry(self, entry, id2code):
+        """Turn a Harvest time entry into an Entry, keeping Harvest's own fields in extra"""
+
+        code = id2code.get(entry['project']['id'], entry['project']['name'])
+
+        entry['date'] = entry['spent_date']
+        entry['project'] = entry['client']['name'] + "/" + code + "/" + entry['project']['name']
+        entry['time'] = entry['hours'] * 60
+        entry['comment'] = entry.get('notes', "")
+
+        # callers group and filter by task name, Harvest gives {"id", "name"}
+        if isinstance(entry.get('task'), dict):
+            entry['task'] = entry['task']['name']
+
+        return Entry.from_dict(entry)
+
+    def get_changed_entries(self, updated_since=None):
+        """Stream every entry of ours created or changed since an updated_at high-water mark.
+
+        Harvest does not report deletions here, so an entry deleted in Harvest
+        is not noticed.
+        """
+
+        params = {"user_id": self.user_profile['id']}
+
+        if updated_since is not None:
+            params['updated_since'] = updated_since
+
+        id2code = {p['project']['id']: p['project']['code'] for p in self.get_project_map().values()}
+
+        for entry in self.iter_pages("/time_entries", "time_entries", params):
+            yield self._to_entry(entry, id2code)
+
+    def create_time_entry(self, entry, reference=None):
+        """POST an entry straight away, returning Harvest's copy of it"""
+
+        time_entry = self._time_entry(entry['project'], entry['time'], entry.get('comment', ""),
+                                      entry['date'], entry.get('task'))
+
+        if reference is not None:
+            time_entry['external_reference'] = {"id": reference, "group_id": "timetrack",
+                                                "permalink": f"timetrack:{reference}"}
+
+        r = self.request("POST", "/time_entries", json=time_entry)
+        r.raise_for_status()
+
+        return r.json()
+
+    def update_time_entry(self, remote_id, entry):
+        """PATCH a time entry to match a local entry, returning Harvest's copy of it"""
+
+        time_entry = self._time_entry(entry['project'], entry['time'], entry.get('comment', ""),
+                                      entry['date'], entry.get('task'))
+        del time_entry['user_id']
+
+        r = self.request("PATCH", f"/time_entries/{remote_id}", json=time_entry)
+        r.raise_for_status()
+
+        return r.json()
+
+    def delete_time_entry(self, remote_id):
+        """DELETE a time entry, treating one that is already gone as deleted"""
+
+        r = self.request("DELETE", f"/time_entries/{remote_id}")
+
+        if r.status_code != 404:
+            r.raise_for_status()
+
+    def find_by_reference(self, reference):
+        """Return the time entry we created with this external reference, if any"""
+
+        r = self.request("GET", "/time_entries", params={"external_reference_id": reference})
+        r.raise_for_status()
+
+        entries = r.json()['time_entries']
+
+        return entries[0] if entries else None
+
+    def get_queued_entries(self, start=None, finish=None, project=None, task=None):
+        """Entries still waiting in the outbox, with IDs of the form queued-<key>"""
+
+        if self.outbox is None:
+            return
+
+        start = start.strftime("%Y-%m-%d") if start is not None else None
+        finish = finish.strftime("%Y-%m-%d") if finish is not None else None
+
+        for key, item in self.outbox.pending():
+            entry = item['entry']
+
+            if (start is not None and entry['date'] < start) or (finish is not None and entry['date'] > finish):
+                continue
+
+            if project is not None and self._project_code(entry['project']) != project:
+                continue
+
+            if task is not None and entry.get('task') != task:
+                continue
+
+            yield Entry(entry['date'], entry['project'], entry['time'], entry.get('comment', ""),
+                        task=entry.get('task'), id="queued-" + key[:8], extra={"queued": True})
         
     def get_projects(self):
         """Return a list of projects that the authenticated user is allowed to see"""
 
-        r = self.request(requests.get, f"/users/{self.user_profile['id']}/project_assignments")
-        
         return sorted([p['client']['name'] + '/' + p['project']['code'] + "/" + p['project']['name'] 
-                for p in r.json()['project_assignments'] if p['is_active']])
+                for p in self.get_project_assignments() if p['is_active']])
         
     def get_tasks(self, project=None):
         """Return list of tasks supported by harvest"""
         
-        r = self.request(requests.get, f"/users/{self.user_profile['id']}/project_assignments")
-        
-        projects = [p for p in r.json()['project_assignments'] if p['is_active']]
+        projects = [p for p in self.get_project_assignments() if p['is_active']]
         
         tasks = []
         
@@ -0,0 +1,436 @@
+import os
+import json
+
+from typing import Optional
+
+from timetrack import profiling
+from timetrack.locking import tmp_path
+from timetrack.scan import TTScanStale
+
+INDEX_VERSION = 3
+
+# appended lines replayed from the delta file before it is folded back into the sidecar
+MAX_DELTA_LINES = 512
+
+
+def _day_str(day):
+    """Turn a date (or ISO string) into the YYYY-MM-DD key used by the index"""
+    if day is None or isinstance(day, str):
+        return day
+    return day.strftime("%Y-%m-%d")
+
+
+class TTLogIndex:
+    """Sidecar index for a JSONL track file.
+
+    The index keeps the byte offset of every line in the log along with
+    date -> line, project -> line and task -> line lookups so that filtered
+    queries only need to seek to and decode the lines that match. It is
+    stamped with the size and mtime of the log and rebuilt with a single scan
+    whenever the log has changed behind its back.
+
+    Journal records (``{"op": "delete"|"update"|"compact", ...}``) are folded
+    in as the log is indexed: deleted entries drop out of the lookups and time
+    deltas are summed per entry ID so readers can apply them.
+
+    Entries appended after the sidecar was written go to a delta file next
+    to it, one line per commit, which is replayed on load. Once it holds
+    MAX_DELTA_LINES lines the sidecar is rewritten and the delta dropped, so
+    adding an entry doesn't rewrite the whole index.
+
+    Given a TTLogScanner, big logs are decoded across several processes
+    when the index has to be built from scratch.
+    """
+
+    def __init__(self, track_file: str, index_file: Optional[str] = None, scanner=None):
+        self.track_file = track_file
+        self.index_file = index_file or track_file + ".idx"
+        self.delta_file = self.index_file + ".delta"
+        self.scanner = scanner
+        self._reset()
+
+    def _reset(self):
+        self.loaded = False
+        self.size = 0
+        self.mtime = 0
+        self.offsets = []
+        self.dates = {}
+        self.projects = {}
+        self.tasks = {}
+        self.moved = {}
+        self.deleted = set()
+        self.deltas = {}
+        self.journal_lines = []
+        self.pending = 0
+        self.max_id = 0
+        self._reserved_lines = set()
+        # the log stamp the sidecar and delta on disk describe, and lines added since
+        self._saved = None
+        self._unsaved = []
+        self._delta_lines = 0
+
+    def log_stamp(self):
+        try:
+            st = os.stat(self.track_file)
+        except FileNotFoundError:
+            return 0, 0
+        return st.st_size, st.st_mtime_ns
+
+    def is_current(self):
+        """Check whether the in-memory index still describes the log"""
+        return self.loaded and (self.size, self.mtime) == self.log_stamp()
+
+    def load(self):
+        """Load the sidecar from disk, returning True if it matches the log"""
+
+        try:
+            with open(self.index_file, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        profiling.count("index_loads")
+
+        if data.get("version") != INDEX_VERSION:
+            return False
+
+        deltas = []
+
+        try:
+            with open(self.delta_file, "r") as f:
+                for line in f:
+                    deltas.append(json.loads(line))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError):
+            # a torn delta from a crash mid-write, the log has moved past the sidecar
+            return False
+
+        stamp = (data['size'], data['mtime'])
+
+        for delta in deltas:
+            if tuple(delta['from']) != stamp:
+                return False
+            stamp = tuple(delta['to'])
+
+        if stamp != self.log_stamp():
+            return False
+
+        self._reset()
+        self.size = data['size']
+        self.mtime = data['mtime']
+        self.offsets = data['offsets']
+        self.dates = data['dates']
+        self.projects = data['projects']
+        self.tasks = data['tasks']
+        self.moved = {entry_id: lineno for entry_id, lineno in data['moved']}
+        self.deleted = set(data['deleted'])
+        self.deltas = {entry_id: minutes for entry_id, minutes in data['deltas']}
+        self.journal_lines = data['journal_lines']
+        self.pending = data['pending']
+        self.max_id = data['max_id']
+        self._reserved_lines = set(self.moved.values()).union(self.journal_lines)
+
+        for delta in deltas:
+            for offset, record in delta['lines']:
+                self.add_line(offset, record)
+
+        self.size, self.mtime = stamp
+        self._saved = stamp
+        self._unsaved = []
+        self._delta_lines = sum(len(delta['lines']) for delta in deltas)
+        self.loaded = True
+
+        return True
+
+    def save(self):
+        """Write the whole index next to the log and drop the delta. Failure to write is not fatal."""
+
+        data = {
+            "version": INDEX_VERSION,
+            "size": self.size,
+            "mtime": self.mtime,
+            "offsets": self.offsets,
+            "dates": self.dates,
+            "projects": self.projects,
+            "tasks": self.tasks,
+            "moved": list(self.moved.items()),
+            "deleted": list(self.deleted),
+            "deltas": list(self.deltas.items()),
+            "journal_lines": self.journal_lines,
+            "pending": self.pending,
+            "max_id": self.max_id,
+        }
+
+        tmpfile = tmp_path(self.index_file)
+        self._saved = None
+
+        try:
+            # deltas left next to a newer sidecar would no longer chain on from it
+            if os.path.exists(self.delta_file):
+                os.remove(self.delta_file)
+
+            with open(tmpfile, "w") as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmpfile, self.index_file)
+        except OSError:
+            return
+
+        self._saved = (self.size, self.mtime)
+        self._unsaved = []
+        self._delta_lines = 0
+
+    def invalidate(self):
+        """Drop the index so that it is rebuilt on next use"""
+        self._reset()
+
+        for path in (self.index_file, self.delta_file):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def build(self):
+        """Scan the whole log once and rebuild every lookup"""
+
+        self._reset()
+
+        offset = 0
+
+        if os.path.exists(self.track_file):
+            with open(self.track_file, "rb") as f:
+                st = os.fstat(f.fileno())
+
+                if self.scanner is not None and self.scanner.worth_it(st.st_size):
+                    try:
+                        offset = self._build_parallel(st)
+                    except TTScanStale:
+                        # replaced under us, start again on the file we have open
+                        self._reset()
+
+                if not self.loaded:
+                    for lineno, line in enumerate(f):
+                        self.offsets.append(offset)
+                        offset += len(line)
+
+                        if line.strip():
+                            self._add(lineno, json.loads(line))
+
+        profiling.count("index_builds")
+        profiling.count("log_lines_decoded", len(self.offsets))
+        profiling.count("log_bytes_decoded", offset)
+
+        self.size, self.mtime = self.log_stamp()
+        self.loaded = True
+        self.save()
+
+    def _build_parallel(self, st):
+        """Fill the lookups from ranges of the log decoded by the scanner's workers"""
+
+        for offsets, records in self.scanner.index_chunks(self.track_file, st.st_size, st.st_ino):
+            base = len(self.offsets)
+            self.offsets.extend(offsets)
+
+            for item in records:
+                lineno = base + item[0]
+
+                # entries come as (line, date, project, task, id) tuples, journal records as (line, record)
+                if len(item) == 2:
+                    self._add(lineno, item[1])
+                else:
+                    self._add_entry(lineno, item[1], item[2], item[3], item[4] or lineno + 1)
+
+        profiling.count("parallel_scans")
+
+        # only stops build() scanning it again, build() marks the index loaded anyway
+        self.loaded = True
+
+        return st.st_size
+
+    def ensure(self):
+        """Make sure the index is loaded and up to date with the log"""
+
+        if self.is_current():
+            return self
+
+        if not self.load():
+            self.build()
+
+        return self
+
+    def _add(self, lineno, record):
+
+        op = record.get('op')
+
+        if op is None:
+            self._add_entry(lineno, record['date'], record['project'], record.get('task'),
+                            record.get('id', lineno + 1))
+            return
+
+        self.journal_lines.append(lineno)
+        self._reserved_lines.add(lineno)
+
+        if op == "compact":
+            self.max_id = max(self.max_id, record['next_id'] - 1)
+            return
+
+        self.pending += 1
+
+        if op == "delete":
+            target = self.line_for(record['ref'])
+
+            if target is not None:
+                self._unlist(target, self.read_record(target))
+                self.deleted.add(record['ref'])
+
+        elif op == "update":
+            self.deltas[record['ref']] = self.deltas.get(record['ref'], 0) + record['time']
+
+    def _add_entry(self, lineno, day, project, task, entry_id):
+
+        if entry_id != lineno + 1:
+            self.moved[entry_id] = lineno
+            self._reserved_lines.add(lineno)
+
+        self.max_id = max(self.max_id, entry_id)
+
+        self.dates.setdefault(day, []).append(lineno)
+        self.projects.setdefault(project, []).append(lineno)
+
+        if task is not None:
+            self.tasks.setdefault(task, []).append(lineno)
+
+    def _unlist(self, lineno, record):
+        """Remove a line from the lookups once its entry has been deleted"""
+
+        for key, lookup in ((record['date'], self.dates),
+                            (record['project'], self.projects),
+                            (record.get('task'), self.tasks)):
+            lines = lookup.get(key)
+
+            if lines is None:
+                continue
+
+            lines.remove(lineno)
+
+            if not lines:
+                del lookup[key]
+
+    def read_record(self, lineno):
+        """Seek to and decode a single line of the log"""
+
+        with open(self.track_file, "rb") as f:
+            f.seek(self.offsets[lineno])
+            return json.loads(f.readline())
+
+    def entry_id(self, lineno, record):
+        """Entries carry an explicit ID once compacted, otherwise it is the line number"""
+        return record.get('id', lineno + 1)
+
+    def line_for(self, entry_id):
+        """Return the line holding a live entry, or None if there is no such entry"""
+
+        if entry_id in self.deleted:
+            return None
+
+        if entry_id in self.moved:
+            return self.moved[entry_id]
+
+        lineno = entry_id - 1
+
+        if lineno < 0 or lineno >= len(self.offsets):
+            return None
+
+        # the line may be taken by a journal record or an entry with another ID
+        if lineno in self._reserved_lines:
+            return None
+
+        return lineno
+
+    def next_id(self):
+        """The ID that the next appended entry should carry"""
+        return max(self.max_id, len(self.offsets)) + 1
+
+    def add_line(self, offset, record):
+        """Extend the in-memory index with a line appended to the log at offset.
+
+        The caller must have called ensure() before writing so that the index
+        covered everything up to offset, and commit() once done appending.
+        """
+        lineno = len(self.offsets)
+        self.offsets.append(offset)
+        self._add(lineno, record)
+
+        # comments play no part in the lookups, keep them out of the delta
+        self._unsaved.append((offset, {key: value for key, value in record.items() if key != 'comment'}))
+
+        return lineno
+
+    def commit(self):
+        """Stamp the index with the log as it is now and write the new lines out.
+
+        The lines go to the delta file when the sidecar on disk is the one
+        they follow on from, otherwise (or once the delta is full) the whole
+        index is saved.
+        """
+
+        previous = (self.size, self.mtime)
+        self.size, self.mtime = self.log_stamp()
+
+        if self._saved != previous or self._delta_lines + len(self._unsaved) > MAX_DELTA_LINES:
+            self.save()
+            return
+
+        delta = {"from": previous, "to": (self.size, self.mtime), "lines": self._unsaved}
+        self._saved = None
+
+        try:
+            with open(self.delta_file, "a") as f:
+                f.write(json.dumps(delta, separators=(',', ':')) + "\n")
+        except OSError:
+            return
+
+        self._saved = (self.size, self.mtime)
+        self._delta_lines += len(self._unsaved)
+        self._unsaved = []
+
+    def append(self, offset, record):
+        """Record a single appended line and save the index"""
+        lineno = self.add_line(offset, record)
+        self.commit()
+
+        return lineno
+
+    def lookup(self, start=None, finish=None, project=None, task=None):
+        """Return line numbers of records matching the filters, ordered by date then line"""
+
+        start, finish = _day_str(start), _day_str(finish)
+
+        filters = [set(lookup.get(key, [])) for key, lookup in ((project, self.projects), (task, self.tasks))
+                   if key is not None]
+
+        lines = []
+
+        for day in sorted(self.dates):
+            if start is not None and day < start:
+                continue
+            if finish is not None and day > finish:
+                break
+
+            lines.extend(lineno for lineno in self.dates[day]
+                         if all(lineno in f for f in filters))
+
+        return lines
+
+    def get_projects(self):
+        return set(self.projects)
+
+    def get_tasks(self, project=None):
+
+        if project is None:
+            return set(self.tasks)
+
+        project_lines = set(self.projects.get(project, []))
+
+        return {task for task, lines in self.tasks.items()
+                if not project_lines.isdisjoint(lines)}
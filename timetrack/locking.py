@@ -0,0 +1,89 @@
+import os
+import threading
+
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - no advisory locks on Windows
+    fcntl = None
+
+
+class TTLockBusy(Exception):
+    """Raised when a lock asked for without waiting is held elsewhere"""
+
+
+def tmp_path(path):
+    """A temp file name next to path that no other process will be writing to"""
+    return "{}.{}.tmp".format(path, os.getpid())
+
+
+class TTFileLock:
+    """Advisory fcntl lock shared by every process using the same log.
+
+    The lock lives on a separate file because rewrites replace the log with a
+    new inode, which would leave a lock on the log itself guarding nothing.
+    Locks are re-entrant within a driver: a writer holding the exclusive lock
+    can call the driver's readers, and a reader that turns into a writer has
+    its shared lock upgraded for the duration.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self._depth = 0
+        self._exclusive = False
+        self._mutex = threading.RLock()
+
+    @contextmanager
+    def _hold(self, exclusive, wait=True):
+
+        with self._mutex:
+            if fcntl is None:
+                yield
+                return
+
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+            upgrade = exclusive and not self._exclusive
+
+            if self._depth == 0 or upgrade:
+                try:
+                    fcntl.flock(self._fd, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                                | (0 if wait else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    if self._depth == 0:
+                        os.close(self._fd)
+                        self._fd = None
+                    raise TTLockBusy(self.path)
+
+            if upgrade:
+                self._exclusive = True
+
+            self._depth += 1
+
+            try:
+                yield
+            finally:
+                self._depth -= 1
+
+                if self._depth == 0:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                    os.close(self._fd)
+                    self._fd = None
+                    self._exclusive = False
+                elif upgrade:
+                    fcntl.flock(self._fd, fcntl.LOCK_SH)
+                    self._exclusive = False
+
+    def shared(self):
+        """Hold the lock for reading, other readers may hold it at the same time"""
+        return self._hold(False)
+
+    def exclusive(self, wait=True):
+        """Hold the lock for writing, waiting until every other holder lets go.
+
+        With wait=False TTLockBusy is raised straight away instead of waiting.
+        """
+        return self._hold(True, wait)
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import uuid
+
+from timetrack.locking import TTFileLock, tmp_path
+
+
+class TTOutbox:
+    """Durable queue of entries waiting to be sent to a remote backend.
+
+    The queue is a JSON lines journal that is only ever appended to while in
+    use and replayed on every read:
+
+        {"op": "add", "key": ..., "entry": {...}, "queued": ...}
+        {"op": "attempt", "keys": [...]}    a send was started, outcome unknown
+        {"op": "done", "keys": [...]}       accepted by the backend
+        {"op": "failed", "key": ..., "error": ...}   rejected, won't be retried
+
+    Every entry gets a random key when queued which the sender passes on as
+    an idempotency key, so that an entry whose send attempt was interrupted
+    can be looked up rather than sent twice. Once nothing is left waiting the
+    journal is rewritten down to the failed entries.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # guards the journal itself, held briefly by both adding and sending
+        self.lock = TTFileLock(path + ".lock")
+        # held for the whole of a flush so that only one process sends at a time
+        self.flush_lock = TTFileLock(path + ".flush.lock")
+
+    def _append(self, records):
+        data = "".join(json.dumps(record) + "\n" for record in records).encode("utf8")
+
+        with self.lock.exclusive():
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+            try:
+                os.write(fd, data)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _replay(self):
+        """Return {key: item} in queue order, items being dicts of entry, attempted and error"""
+
+        items = {}
+
+        with self.lock.shared():
+            try:
+                f = open(self.path, "r")
+            except FileNotFoundError:
+                return items
+
+            with f:
+                for line in f:
+                    if not line.strip():
+                        continue
+
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # a torn last line from a crash mid-write, the entry was never acknowledged
+                        continue
+
+                    op = record['op']
+
+                    if op == "add":
+                        items[record['key']] = {"entry": record['entry'], "queued": record.get('queued'),
+                                                "attempted": False, "error": None}
+                    elif op == "attempt":
+                        for key in record['keys']:
+                            if key in items:
+                                items[key]['attempted'] = True
+                    elif op == "done":
+                        for key in record['keys']:
+                            items.pop(key, None)
+                    elif op == "failed" and record['key'] in items:
+                        items[record['key']]['error'] = record['error']
+
+        return items
+
+    def put(self, entries):
+        """Queue entries, returning their keys"""
+
+        now = time.time()
+        records = [{"op": "add", "key": uuid.uuid4().hex, "entry": entry, "queued": now} for entry in entries]
+
+        self._append(records)
+
+        return [record['key'] for record in records]
+
+    def pending(self):
+        """[(key, item)] still waiting to be sent, oldest first"""
+        return [(key, item) for key, item in self._replay().items() if item['error'] is None]
+
+    def failed(self):
+        """[(key, item)] the backend rejected"""
+        return [(key, item) for key, item in self._replay().items() if item['error'] is not None]
+
+    def mark_attempted(self, keys):
+        if keys:
+            self._append([{"op": "attempt", "keys": list(keys)}])
+
+    def mark_done(self, keys):
+        if keys:
+            self._append([{"op": "done", "keys": list(keys)}])
+
+    def mark_failed(self, failures):
+        """Record {key: error message} for entries that should not be retried"""
+        self._append([{"op": "failed", "key": key, "error": error} for key, error in failures.items()])
+
+    def drop_failed(self):
+        """Forget about rejected entries, returning how many there were"""
+
+        failed = self.failed()
+        self.mark_done([key for key, _ in failed])
+        self.compact()
+
+        return len(failed)
+
+    def compact(self):
+        """Rewrite the journal keeping only entries that are still queued or failed"""
+
+        with self.lock.exclusive():
+            items = self._replay()
+            records = []
+
+            for key, item in items.items():
+                records.append({"op": "add", "key": key, "entry": item['entry'], "queued": item['queued']})
+
+                if item['attempted']:
+                    records.append({"op": "attempt", "keys": [key]})
+
+                if item['error'] is not None:
+                    records.append({"op": "failed", "key": key, "error": item['error']})
+
+            tmpfile = tmp_path(self.path)
+
+            with open(tmpfile, "w") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+            os.replace(tmpfile, self.path)
+
+    def flushing(self):
+        """Hold the flush lock, raising TTLockBusy if another process is already sending"""
+        return self.flush_lock.exclusive(wait=False)
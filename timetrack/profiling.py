@@ -0,0 +1,200 @@
+"""Opt-in timing instrumentation for finding out where a command spends its time.
+
+Turned on with `timetrack --profile` or the TIMETRACK_TRACE environment
+variable. While disabled every hook here is a cheap no-op.
+
+ * spans time named sections (config loading, driver calls, HTTP requests)
+ * counters tally work done (lines and bytes decoded, HTTP requests, cache hits)
+ * on exit a summary goes to stderr, and optionally a Chrome trace (.json) or
+   a cProfile dump (any other extension) is written out
+"""
+import os
+import sys
+import json
+import time
+import threading
+import functools
+
+from collections import Counter
+from contextlib import contextmanager
+
+# as close to process start as we can get without help from the interpreter
+_START = time.perf_counter()
+
+# driver methods wrapped with spans by instrument()
+DRIVER_METHODS = ("add_entry", "add_entries", "delete_entry", "update_entry", "get_filtered_entries",
+                  "get_projects", "get_tasks", "get_completions", "get_rollups", "compact", "request")
+
+enabled = False
+counters = Counter()
+spans = []
+
+_output = None
+_profiler = None
+
+
+def enable(output=None):
+    """Start collecting spans and counters, optionally writing a trace file at finish()"""
+
+    global enabled, _output, _profiler
+
+    enabled = True
+    _output = output
+
+    if output is not None and not output.endswith(".json"):
+        import cProfile
+
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+    # everything up to now was interpreter start up and imports
+    _record("imports", 0, time.perf_counter() - _START)
+
+
+def enable_from_env(environ=os.environ):
+    """Honour TIMETRACK_TRACE: 1/yes/true for a summary, anything else is a trace file path"""
+
+    trace = environ.get("TIMETRACK_TRACE", "").strip()
+
+    if trace.lower() in ("", "0", "no", "false"):
+        return False
+
+    enable(None if trace.lower() in ("1", "yes", "true") else trace)
+
+    return True
+
+
+def count(name, n=1):
+    if enabled:
+        counters[name] += n
+
+
+def _record(name, start, duration):
+    spans.append((name, start - _START if start else 0, duration, threading.get_ident()))
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block"""
+
+    if not enabled:
+        yield
+        return
+
+    start = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        _record(name, start, time.perf_counter() - start)
+
+
+def traced(name, func):
+    """Wrap func in a span. Generators are timed across all of their steps,
+    leaving out the time the caller spends between them."""
+    # inspect is slow to import and only needed once profiling is on
+    import inspect
+
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            busy = 0.0
+            gen = func(*args, **kwargs)
+
+            try:
+                while True:
+                    step = time.perf_counter()
+                    try:
+                        item = next(gen)
+                    except StopIteration:
+                        return
+                    finally:
+                        busy += time.perf_counter() - step
+
+                    yield item
+            finally:
+                gen.close()
+                _record(name, start, busy)
+
+        return wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(name):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def instrument(driver):
+    """Wrap a driver's public methods (and a router's sub-drivers) with spans"""
+
+    name = type(driver).__name__
+
+    for method in DRIVER_METHODS:
+        if hasattr(driver, method):
+            setattr(driver, method, traced(f"{name}.{method}", getattr(driver, method)))
+
+    for sub_driver in getattr(driver, "drivers", {}).values():
+        instrument(sub_driver)
+
+    return driver
+
+
+def summary():
+    """Human readable totals per span name plus the counters"""
+
+    totals = {}
+
+    for name, _, duration, _ in spans:
+        calls, total = totals.get(name, (0, 0.0))
+        totals[name] = (calls + 1, total + duration)
+
+    lines = ["", "timetrack profile (wall {:.1f}ms)".format((time.perf_counter() - _START) * 1000),
+             "{:45s} {:>7s} {:>11s}".format("span", "calls", "total ms")]
+
+    for name, (calls, total) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        lines.append("{:45s} {:7d} {:11.2f}".format(name, calls, total * 1000))
+
+    if counters:
+        lines.append("")
+        lines.extend("{:45s} {:>19d}".format(name, value) for name, value in sorted(counters.items()))
+
+    return "\n".join(lines)
+
+
+def chrome_trace():
+    """Spans in the Chrome trace event format, viewable in about:tracing or Perfetto"""
+
+    pid = os.getpid()
+
+    events = [{"name": name, "ph": "X", "ts": start * 1e6, "dur": duration * 1e6, "pid": pid, "tid": tid}
+              for name, start, duration, tid in spans]
+
+    events.extend({"name": name, "ph": "C", "ts": 0, "pid": pid, "args": {"value": value}}
+                  for name, value in counters.items())
+
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def finish():
+    """Print the summary and write any requested trace file"""
+
+    global enabled
+
+    if not enabled:
+        return
+
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(_output)
+    elif _output is not None:
+        with open(_output, "w") as f:
+            json.dump(chrome_trace(), f)
+
+    print(summary(), file=sys.stderr)
+
+    enabled = False
+    counters.clear()
+    del spans[:]
@@ -0,0 +1,126 @@
+import os
+import json
+
+from timetrack.entry import Entry
+from timetrack.index import _day_str
+from timetrack.locking import tmp_path
+
+
+def rollup_entries(entries):
+    """Sum entries into {(day, project, task): minutes}. task is "" for entries without one."""
+
+    totals = {}
+
+    for entry in entries:
+        key = (entry['date'], entry['project'], entry.get('task') or "")
+        totals[key] = totals.get(key, 0) + entry['time']
+
+    return totals
+
+
+def rollup_rows(totals, start=None, finish=None):
+    """Turn rollup totals back into entry-like records for aggregation"""
+
+    start, finish = _day_str(start), _day_str(finish)
+
+    for (day, project, task), minutes in sorted(totals.items()):
+        if start is not None and day < start:
+            continue
+        if finish is not None and day > finish:
+            continue
+
+        yield Entry(day, project, minutes, task=task or None)
+
+
+class TTRollupCache:
+    """Per-(day, project, task) minute totals kept next to a log.
+
+    Like the index, the rollups are stamped with the log's size and mtime.
+    Writers pass the stamp from before and after their change so that the
+    totals are only patched when they were current to begin with.
+    """
+
+    def __init__(self, rollup_file: str):
+        self.rollup_file = rollup_file
+        self.stamp = None
+        self.totals = None
+
+    def load(self, stamp=None):
+        """Load the rollups from disk, returning True if they match stamp"""
+
+        if self.totals is None:
+            try:
+                with open(self.rollup_file, "r") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                return False
+
+            self.stamp = data['stamp']
+            self.totals = {}
+
+            for day, projects in data['days'].items():
+                for project, tasks in projects.items():
+                    for task, minutes in tasks.items():
+                        self.totals[(day, project, task)] = minutes
+
+        return stamp is None or self.stamp == stamp
+
+    def save(self):
+
+        days = {}
+
+        for (day, project, task), minutes in self.totals.items():
+            days.setdefault(day, {}).setdefault(project, {})[task] = minutes
+
+        tmpfile = tmp_path(self.rollup_file)
+
+        try:
+            with open(tmpfile, "w") as f:
+                json.dump({"stamp": self.stamp, "days": days}, f, separators=(',', ':'))
+            os.replace(tmpfile, self.rollup_file)
+        except OSError:
+            pass
+
+    def rebuild(self, entries, stamp):
+        """Recompute every total from a full scan of entries"""
+
+        self.totals = rollup_entries(entries)
+        self.stamp = stamp
+        self.save()
+
+    def update(self, before, after, changes=()):
+        """Apply (day, project, task, minutes) deltas if the rollups were current as of before"""
+
+        if not self.load(before):
+            return False
+
+        for day, project, task, minutes in changes:
+            key = (day, project, task or "")
+            total = self.totals.get(key, 0) + minutes
+
+            if total:
+                self.totals[key] = total
+            else:
+                self.totals.pop(key, None)
+
+        self.stamp = after
+        self.save()
+
+        return True
+
+    def rows(self, start=None, finish=None):
+        return rollup_rows(self.totals, start, finish)
+
+    def compare(self, entries):
+        """Check the rollups against a full scan, returning a list of mismatch descriptions"""
+
+        expected = rollup_entries(entries)
+        problems = []
+
+        for key in sorted(set(expected) | set(self.totals)):
+            if expected.get(key, 0) != self.totals.get(key, 0):
+                day, project, task = key
+                problems.append("{} {} {}: rollup has {} minutes, log has {}".format(
+                    day, project, task or "-", self.totals.get(key, 0), expected.get(key, 0)))
+
+        return problems
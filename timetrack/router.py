@@ -1,12 +1,23 @@
+import heapq
+import queue
+import warnings
+import threading
+
 from datetime import datetime
 
-from timetrack import TTBaseDriver
+from timetrack import TTBaseDriver, create_driver
 from typing import Optional
 from configparser import ConfigParser
 
 class TTRouterException(Exception):
     """Exceptions thrown by timetrack router"""
 
+class TTRouterWarning(UserWarning):
+    """Raised when a sub-driver fails or times out and results are partial"""
+
+# sentinel put on a sub-driver's queue once it has produced everything
+_DONE = object()
+
 class TTRouterDriver(TTBaseDriver):
     """This ttrouter allows you to mix and match multiple drivers"""
     
@@ -14,6 +25,13 @@ class TTRouterDriver(TTBaseDriver):
         
         
         self.drivers = {}
+
+        self.concurrent = config.getboolean(rootsection, "concurrent", fallback=False)
+
+        # only the concurrent path merges sub-driver streams by date
+        self.ordered_entries = self.concurrent
+        self.timeout = config.getfloat(rootsection, "timeout", fallback=30)
+        self.timeouts = {}
         
         drivernames = config.get(rootsection, "drivers", fallback="").split(",")
         
@@ -25,17 +43,10 @@ class TTRouterDriver(TTBaseDriver):
             dtype = config.get(driver, "driver")
             prefix = config.get(driver, "prefix")
             
-            if dtype == "harvest":
-                from timetrack.harvest import TTHarvestDriver
-                
-                dr = TTHarvestDriver(config, rootsection=driver)
-                
-            elif dtype == "file":
-                from timetrack import TTFileDriver
-                
-                dr = TTFileDriver(config, rootsection=driver)
+            dr = create_driver(config, dtype, rootsection=driver)
                 
             self.drivers[prefix] = dr
+            self.timeouts[prefix] = config.getfloat(driver, "timeout", fallback=self.timeout)
             
     def add_entry(self, project, time, comment, when=datetime.now(), task=None):
         
@@ -53,7 +64,117 @@ class TTRouterDriver(TTBaseDriver):
         
         return driver.add_entry(project_name, time, comment, when, taskname)
     
+    def _spawn(self, func, *args):
+        """Run func on a daemon thread, streaming whatever it returns into a queue.
+
+        Daemon threads are used rather than an executor so that a hung backend
+        can't stop the process from exiting.
+        """
+
+        out = queue.Queue()
+
+        def run():
+            try:
+                for item in func(*args):
+                    out.put(item)
+                out.put(_DONE)
+            except Exception as e:
+                out.put(e)
+
+        threading.Thread(target=run, daemon=True).start()
+
+        return out
+
+    def _drain(self, prefix, out):
+        """Yield items from a sub-driver queue until done, failed or it goes quiet for its timeout"""
+
+        timeout = self.timeouts[prefix]
+
+        while True:
+            try:
+                item = out.get(timeout=timeout)
+            except queue.Empty:
+                warnings.warn(f"Driver {prefix} sent nothing for {timeout}s, results are partial",
+                              TTRouterWarning)
+                return
+
+            if item is _DONE:
+                return
+
+            if isinstance(item, Exception):
+                warnings.warn(f"Driver {prefix} failed ({item}), results are partial", TTRouterWarning)
+                return
+
+            yield item
+
+    def _entry_stream(self, prefix, dr, out):
+
+        stream = self._drain(prefix, out)
+
+        if not dr.ordered_entries:
+            stream = iter(sorted(stream, key=lambda e: e['date']))
+
+        for entry in stream:
+            entry['id'] = prefix + "_" + str(entry['id'])
+            entry['project'] = prefix + "_" + str(entry['project'])
+            yield entry
+
+    def _get_filtered_entries_concurrent(self, start, finish, project):
+        """Query all sub-drivers at once and k-way merge their streams by date"""
+
+        streams = [self._entry_stream(prefix, dr, self._spawn(dr.get_filtered_entries, start, finish, project))
+                   for prefix, dr in self.drivers.items()]
+
+        return heapq.merge(*streams, key=lambda e: e['date'])
+
+    def _gather_concurrent(self, method):
+        """Call a list-returning method on every sub-driver at once, prefixing results"""
+
+        outs = [(prefix, self._spawn(lambda dr=dr: [getattr(dr, method)()]))
+                for prefix, dr in self.drivers.items()]
+
+        results = []
+
+        for prefix, out in outs:
+            for items in self._drain(prefix, out):
+                results.extend([f"{prefix}_{item}" for item in items])
+
+        return results
+
+    def add_entries(self, entries):
+        """Split a batch by driver prefix and hand each part to its driver's batch API"""
+
+        batches = {}
+        failures = []
+
+        for position, entry in enumerate(entries):
+            try:
+                pre, project_name = entry['project'].split("_", maxsplit=1)
+
+                if pre not in self.drivers:
+                    raise TTRouterException(f"Unknown driver prefix {pre}")
+
+                entry = dict(entry, project=project_name)
+
+                if entry.get('task') is not None:
+                    entry['task'] = entry['task'].split("_", maxsplit=1)[1]
+
+            except (ValueError, IndexError, TTRouterException) as e:
+                failures.append((position, e))
+                continue
+
+            batches.setdefault(pre, []).append((position, entry))
+
+        for pre, batch in batches.items():
+            for index, e in self.drivers[pre].add_entries([entry for _, entry in batch]):
+                failures.append((batch[index][0], e))
+
+        return sorted(failures, key=lambda failure: failure[0])
+
     def get_filtered_entries(self, start=None, finish=None, project=None):
+
+        if self.concurrent:
+            return self._get_filtered_entries_concurrent(start, finish, project)
         
         entries = []
         
@@ -71,6 +192,9 @@ class TTRouterDriver(TTBaseDriver):
     def get_projects(self):
         """Return a list of projects that the authenticated user is allowed to see"""
 
+        if self.concurrent:
+            return self._gather_concurrent("get_projects")
+
         projects = []
         
         for prefix, dr in self.drivers.items():
@@ -80,9 +204,67 @@ class TTRouterDriver(TTBaseDriver):
     
     def delete_entry(self, entry_id):
         return super().delete_entry(entry_id)
+
+    def compact(self):
+        """Compact every sub-driver that supports it"""
+
+        compacted = False
+
+        for dr in self.drivers.values():
+            compacted = dr.compact() or compacted
+
+        return compacted
     
+    def flush_outbox(self, drop_failed=False):
+        """Flush every sub-driver's outbox, adding up the results"""
+
+        results = [dr.flush_outbox(drop_failed) for dr in self.drivers.values()]
+        results = [result for result in results if result is not None]
+
+        if not results:
+            return None
+
+        return (sum(sent for sent, _, _ in results),
+                [failure for _, failed, _ in results for failure in failed],
+                sum(queued for _, _, queued in results))
+
+    def get_rollups(self, start=None, finish=None):
+
+        for prefix, dr in self.drivers.items():
+            for row in dr.get_rollups(start, finish):
+                row['project'] = prefix + "_" + row['project']
+                yield row
+
+    def rebuild_rollups(self):
+
+        rebuilt = False
+
+        for dr in self.drivers.values():
+            rebuilt = dr.rebuild_rollups() or rebuilt
+
+        return rebuilt
+
+    def check_rollups(self):
+        return [f"{prefix}: {problem}" for prefix, dr in self.drivers.items()
+                for problem in dr.check_rollups()]
+
+    def get_completions(self):
+        """Gather cached completions from each sub-driver"""
+
+        projects, tasks = [], []
+
+        for prefix, dr in self.drivers.items():
+            dr_projects, dr_tasks = dr.get_completions()
+            projects.extend([f"{prefix}_{p}" for p in dr_projects])
+            tasks.extend([f"{prefix}_{t}" for t in dr_tasks])
+
+        return projects, tasks
+
     def get_tasks(self, project=None):
         
+        if self.concurrent:
+            return self._gather_concurrent("get_tasks")
+
         tasks = []
         
         for prefix, dr in self.drivers.items():
@@ -0,0 +1,202 @@
+"""Decode big JSON lines logs on several cores.
+
+The log is cut into byte ranges that start and end on line boundaries and
+each range is decoded by a worker process. Results come back in file order,
+a few ranges ahead of the reader, so callers can stream them. Workers only
+open the log by name, so each one checks it is still the file the caller
+has open and gives up if a rewrite replaced it in the meantime.
+
+multiprocessing is only imported once a log is big enough to be worth it.
+"""
+import os
+import json
+
+
+class TTScanStale(Exception):
+    """Raised when the log was replaced while a parallel scan was reading it"""
+
+
+def split_ranges(path, size, parts):
+    """Split the first `size` bytes of a file into up to `parts` newline aligned (start, end) ranges"""
+
+    bounds = [0]
+
+    with open(path, "rb") as f:
+        for part in range(1, parts):
+            pos = size * part // parts
+
+            if pos <= bounds[-1]:
+                continue
+
+            # finish the line that pos falls in, unless pos is already a line start
+            f.seek(pos - 1)
+            f.readline()
+            pos = f.tell()
+
+            if pos >= size:
+                break
+
+            if pos > bounds[-1]:
+                bounds.append(pos)
+
+    bounds.append(size)
+
+    return list(zip(bounds, bounds[1:]))
+
+
+def _open_checked(path, inode):
+    f = open(path, "rb")
+
+    if inode is not None and os.fstat(f.fileno()).st_ino != inode:
+        f.close()
+        raise TTScanStale(path)
+
+    return f
+
+
+def index_range(path, inode, start, end):
+    """Offsets of every line in [start, end) and what the index needs from the non-blank ones.
+
+    Entries come back as (line, date, project, task, id) tuples, which are
+    much cheaper to send between processes than dicts, and journal records
+    as (line, record). Line numbers are relative to the start of the range,
+    so id is None for entries whose ID is their line number.
+    """
+
+    offsets, records = [], []
+    offset = start
+
+    with _open_checked(path, inode) as f:
+        f.seek(start)
+
+        for lineno, line in enumerate(f):
+            if offset >= end:
+                break
+
+            offsets.append(offset)
+            offset += len(line)
+
+            if not line.strip():
+                continue
+
+            record = json.loads(line)
+
+            if 'op' in record:
+                records.append((lineno, record))
+            else:
+                records.append((lineno, record['date'], record['project'], record.get('task'), record.get('id')))
+
+    return offsets, records
+
+
+def decode_range(path, inode, start, end, first_line, day_from=None, day_to=None, project=None, task=None):
+    """Decode the entries in [start, end) that pass the filters.
+
+    Returns {line number: (date, project, time, comment, task, id, extra)}
+    with line numbers counted from the start of the log, first_line being
+    the line the range starts on.
+    """
+
+    found = {}
+    offset = start
+
+    with _open_checked(path, inode) as f:
+        f.seek(start)
+
+        for lineno, line in enumerate(f, first_line):
+            if offset >= end:
+                break
+
+            offset += len(line)
+
+            if not line.strip():
+                continue
+
+            record = json.loads(line)
+
+            if 'op' in record:
+                continue
+
+            day = record['date']
+
+            if (day_from is not None and day < day_from) or (day_to is not None and day > day_to):
+                continue
+
+            if (project is not None and record['project'] != project) or \
+                    (task is not None and record.get('task') != task):
+                continue
+
+            extra = {key: value for key, value in record.items()
+                     if key not in ("date", "project", "time", "comment", "task", "id")}
+
+            found[lineno] = (day, record['project'], record['time'], record.get('comment', ""),
+                             record.get('task'), record.get('id', lineno + 1), extra or None)
+
+    return found
+
+
+class TTLogScanner:
+    """Decide when a log is big enough to scan in parallel, and run the scan.
+
+    workers is the size of the process pool and threshold the log size in
+    bytes from which it is used, so that small logs never pay for starting
+    processes. Fewer than two workers or a threshold of 0 turns it off.
+    """
+
+    def __init__(self, workers=None, threshold=32 * 1024 * 1024):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.threshold = threshold
+
+    def worth_it(self, size):
+        return self.workers > 1 and self.threshold > 0 and size >= self.threshold
+
+    def _map(self, func, jobs):
+        """Run func over jobs in the pool, yielding results in order with a bounded number in flight"""
+        from collections import deque
+        from concurrent.futures import ProcessPoolExecutor
+
+        pool = ProcessPoolExecutor(max_workers=self.workers)
+        jobs = iter(jobs)
+        in_flight = deque()
+
+        try:
+            for job in jobs:
+                in_flight.append(pool.submit(func, *job))
+
+                if len(in_flight) >= self.workers * 2:
+                    yield in_flight.popleft().result()
+
+            while in_flight:
+                yield in_flight.popleft().result()
+        finally:
+            # stopped early, don't wait for ranges nobody will read (shutdown's cancel_futures is 3.9+)
+            for future in in_flight:
+                future.cancel()
+
+            pool.shutdown(wait=True)
+
+    def index_chunks(self, path, size, inode=None):
+        """Yield (offsets, records) as returned by index_range for consecutive ranges covering size bytes"""
+
+        ranges = split_ranges(path, size, self.workers * 4)
+
+        return self._map(index_range, [(path, inode, start, end) for start, end in ranges])
+
+    def decode(self, path, offsets, size, inode=None, day_from=None, day_to=None, project=None, task=None):
+        """Yield dicts of decoded entries (see decode_range) range by range in line order.
+
+        The ranges are cut at line starts taken from the index's offsets.
+        """
+
+        if not offsets:
+            return iter(())
+
+        parts = min(self.workers * 4, len(offsets))
+        firsts = sorted({len(offsets) * part // parts for part in range(parts)})
+        jobs = []
+
+        for first, last in zip(firsts, firsts[1:] + [len(offsets)]):
+            end = offsets[last] if last < len(offsets) else size
+            jobs.append((path, inode, offsets[first], end, first, day_from, day_to, project, task))
+
+        return self._map(decode_range, jobs)
@@ -0,0 +1,249 @@
+import os
+import re
+import json
+
+from array import array
+
+from timetrack.locking import tmp_path
+
+SEARCH_VERSION = 1
+
+TOKEN_RE = re.compile(r"\w+")
+
+# segment files start with the ID of the header that describes them
+SEGMENT_ID_BYTES = 16
+
+
+def tokenize(text):
+    """The distinct lower-cased words of a comment"""
+
+    if isinstance(text, list):
+        text = " ".join(text)
+
+    return set(TOKEN_RE.findall((text or "").lower()))
+
+
+def parse_query(terms):
+    """Turn search terms into [(word, is_prefix)]. A term ending in * matches any word it starts."""
+
+    query = []
+
+    for term in terms:
+        words = TOKEN_RE.findall(term.lower())
+
+        for position, word in enumerate(words):
+            query.append((word, term.endswith("*") and position == len(words) - 1))
+
+    return query
+
+
+def matches(query, text):
+    """Check a comment against a parsed query without an index"""
+
+    words = tokenize(text)
+
+    return all(word in words if not prefix else any(w.startswith(word) for w in words)
+               for word, prefix in query)
+
+
+class TTSearchIndex:
+    """Inverted index of comment words to entry IDs kept next to a log.
+
+    The bulk of the postings live in a binary segment of sorted uint32 IDs
+    that is only ever read a word at a time, with a JSON header holding the
+    vocabulary (word -> offset and count in the segment) and the postings of
+    entries added since the segment was written. Adding entries only
+    rewrites the header; once it holds merge_at postings they are folded
+    into a new segment. Like the rollups, the index is stamped with the
+    log's size and mtime and writers pass the stamp from before and after
+    their change so it is only patched when it was current to begin with.
+
+    Deleted entries are not removed from the postings, callers drop IDs
+    that no longer resolve to a live entry.
+    """
+
+    def __init__(self, search_file: str, merge_at: int = 5000):
+        self.search_file = search_file
+        self.segment_file = search_file + ".bin"
+        self.merge_at = merge_at
+        self._reset()
+
+    def _reset(self):
+        self.stamp = None
+        self.segment_id = None
+        self.vocab = None
+        self.delta = None
+
+    def load(self, stamp=None):
+        """Load the header from disk, returning True if it matches stamp"""
+
+        # another process may have moved the index on since we last read it
+        if self.vocab is None or (stamp is not None and self.stamp != stamp):
+            try:
+                with open(self.search_file, "r") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                return False
+
+            if data.get("version") != SEARCH_VERSION:
+                return False
+
+            self.stamp = data['stamp']
+            self.segment_id = data['segment_id']
+            self.vocab = data['vocab']
+            self.delta = data['delta']
+
+        return stamp is None or self.stamp == stamp
+
+    def save(self):
+
+        data = {
+            "version": SEARCH_VERSION,
+            "stamp": self.stamp,
+            "segment_id": self.segment_id,
+            "vocab": self.vocab,
+            "delta": self.delta,
+        }
+
+        tmpfile = tmp_path(self.search_file)
+
+        try:
+            with open(tmpfile, "w") as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmpfile, self.search_file)
+        except OSError:
+            pass
+
+    def invalidate(self):
+        """Drop the index so that it is rebuilt on next use"""
+        self._reset()
+
+        try:
+            os.remove(self.search_file)
+        except OSError:
+            pass
+
+    def _write_segment(self, postings):
+        """Write {word: [ids]} out as a new segment and point the vocabulary at it"""
+
+        segment_id = os.urandom(SEGMENT_ID_BYTES).hex()
+        vocab = {}
+        offset = 0
+
+        tmpfile = tmp_path(self.segment_file)
+
+        with open(tmpfile, "wb") as f:
+            f.write(bytes.fromhex(segment_id))
+
+            for word in sorted(postings):
+                ids = array("I", sorted(set(postings[word])))
+                ids.tofile(f)
+                vocab[word] = [offset, len(ids)]
+                offset += len(ids)
+
+        os.replace(tmpfile, self.segment_file)
+
+        self.segment_id = segment_id
+        self.vocab = vocab
+        self.delta = {}
+
+    def rebuild(self, entries, stamp):
+        """Index every entry's comment from a full scan"""
+
+        postings = {}
+
+        for entry in entries:
+            for word in tokenize(entry.get('comment')):
+                postings.setdefault(word, []).append(entry.id)
+
+        self._write_segment(postings)
+        self.stamp = stamp
+        self.save()
+
+    def update(self, before, after, entries=()):
+        """Add (id, comment) pairs if the index was current as of before"""
+
+        if not self.load(before):
+            return False
+
+        for entry_id, comment in entries:
+            for word in tokenize(comment):
+                self.delta.setdefault(word, []).append(entry_id)
+
+        self.stamp = after
+
+        if sum(len(ids) for ids in self.delta.values()) >= self.merge_at:
+            f = self._open_segment()
+
+            if f is None:
+                self.invalidate()
+                return False
+
+            with f:
+                postings = {word: list(self._segment_ids(word, f)) + self.delta.get(word, [])
+                            for word in set(self.vocab) | set(self.delta)}
+
+            self._write_segment(postings)
+
+        self.save()
+
+        return True
+
+    def _open_segment(self):
+        """Open the segment, or return None if it is missing or was written for another header"""
+
+        try:
+            f = open(self.segment_file, "rb")
+        except FileNotFoundError:
+            return None
+
+        if f.read(SEGMENT_ID_BYTES).hex() != self.segment_id:
+            f.close()
+            return None
+
+        return f
+
+    def _segment_ids(self, word, f):
+        if word not in self.vocab:
+            return ()
+
+        offset, count = self.vocab[word]
+        ids = array("I")
+        f.seek(SEGMENT_ID_BYTES + offset * ids.itemsize)
+        ids.fromfile(f, count)
+
+        return ids
+
+    def lookup(self, query):
+        """Return the set of IDs whose comment has every (word, is_prefix) in the query.
+
+        Returns None if the segment on disk doesn't belong to this header,
+        in which case the index needs rebuilding.
+        """
+
+        f = self._open_segment()
+
+        if f is None:
+            return None
+
+        with f:
+            found = None
+
+            for word, prefix in query:
+                if prefix:
+                    words = [w for w in set(self.vocab) | set(self.delta) if w.startswith(word)]
+                else:
+                    words = [word]
+
+                ids = set()
+
+                for w in words:
+                    ids.update(self._segment_ids(w, f))
+                    ids.update(self.delta.get(w, ()))
+
+                found = ids if found is None else found & ids
+
+                if not found:
+                    return set()
+
+        return found or set()
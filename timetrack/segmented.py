@@ -0,0 +1,560 @@
+"""Keep the log as one JSON lines file per month.
+
+<segment_dir>/2026-10.jsonl holds the entries dated October 2026 and once
+a month is over its file is gzipped to 2026-10.jsonl.gz. manifest.json
+records each segment's first and last date, entry count and projects (with
+their tasks), so queries only open the months that can match and listing
+projects or tasks opens none. The manifest keeps the size and mtime of
+every segment it describes and summarises a segment again if it was
+changed behind its back.
+
+Entry IDs look like 202610-3: the month an entry belongs to and a number
+within that month that is never handed out twice, so rm and append go
+straight to one segment and IDs stay put however other months change.
+Entries copied in by migrate() keep their old ID as legacy_id, and the
+manifest records the range of legacy IDs in each segment so that rm and
+append can still find them by it.
+"""
+import os
+import re
+import gzip
+import json
+
+from datetime import date, datetime
+from configparser import ConfigParser
+from itertools import islice
+from typing import Optional
+
+from timetrack import TTBaseDriver, Entry, TimerException, parse_time, profiling
+from timetrack.index import _day_str
+from timetrack.locking import TTFileLock, tmp_path
+
+MANIFEST_VERSION = 1
+
+SEGMENT_RE = re.compile(r"^(\d{4}-\d{2})\.jsonl(\.gz)?$")
+ID_RE = re.compile(r"^(\d{4})(\d{2})-(\d+)$")
+
+
+class TTSegmentedDriverException(Exception):
+    """Exception raised by the segmented driver"""
+
+
+def make_entry_id(month, number):
+    return "{}-{}".format(month.replace("-", ""), number)
+
+
+def parse_entry_id(value):
+    """Split an ID like 202610-3 into its month (2026-10) and number, or return None"""
+
+    match = ID_RE.match(str(value).strip())
+
+    if match is None:
+        return None
+
+    return "{}-{}".format(match.group(1), match.group(2)), int(match.group(3))
+
+
+def _open_segment(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf8")
+
+    return open(path, "r", encoding="utf8")
+
+
+def _decode(f):
+    """Read an open segment, returning (records, next number to hand out)"""
+
+    records, next_id = [], 1
+
+    for line in f:
+        if not line.strip():
+            continue
+
+        record = json.loads(line)
+
+        if 'op' in record:
+            next_id = max(next_id, record['next_id'])
+        else:
+            records.append(record)
+            next_id = max(next_id, record['id'] + 1)
+
+    return records, next_id
+
+
+def summarise(name, records, next_id, st, summary=None):
+    """Describe a segment for the manifest, adding records to an existing summary if given"""
+
+    projects = {project: set(tasks) for project, tasks in summary['projects'].items()} if summary else {}
+    dates = [summary['min'], summary['max']] if summary and summary['count'] else []
+    legacy = list(summary['legacy']) if summary and summary.get('legacy') else []
+
+    for record in records:
+        tasks = projects.setdefault(record['project'], set())
+        dates.append(record['date'])
+
+        if record.get('task') is not None:
+            tasks.add(record['task'])
+
+        if record.get('legacy_id') is not None:
+            legacy.append(record['legacy_id'])
+
+    return {
+        "file": name,
+        "stamp": [st.st_size, st.st_mtime_ns],
+        "min": min(dates, default=None),
+        "max": max(dates, default=None),
+        "count": len(records) + (summary['count'] if summary else 0),
+        "next_id": next_id,
+        "projects": {project: sorted(tasks) for project, tasks in projects.items()},
+        "legacy": [min(legacy), max(legacy)] if legacy else None,
+    }
+
+
+class TTSegmentedDriver(TTBaseDriver):
+    """Stores entries in monthly JSON lines segments described by a manifest.
+
+    Entries for the current month are appended to its plain segment. Past
+    months are gzipped (unless compress = no) the first time the log is
+    written to after they end, and writes to them rewrite the whole,
+    small, segment atomically. Every rewrite starts the segment with a
+    header recording the next number to hand out so that deleting the last
+    entry of a month doesn't free its ID.
+    """
+
+    ordered_entries = True
+
+    def __init__(self, config: ConfigParser, rootsection: Optional[str] = "driver"):
+
+        track_file = config.get(rootsection, "track_file", fallback=None)
+        segment_dir = config.get(rootsection, "segment_dir",
+                                 fallback=None if track_file is None else track_file + ".segments")
+
+        if segment_dir is None:
+            raise TTSegmentedDriverException("You must supply a segment_dir or track_file")
+
+        self.segment_dir = os.path.expanduser(segment_dir)
+        self.compress = config.getboolean(rootsection, "compress", fallback=True)
+
+        os.makedirs(self.segment_dir, exist_ok=True)
+
+        self.manifest_file = os.path.join(self.segment_dir, "manifest.json")
+        self.lock = TTFileLock(os.path.join(self.segment_dir, ".lock"))
+
+    def _path(self, name):
+        return os.path.join(self.segment_dir, name)
+
+    def _manifest(self):
+        """Return {month: summary} in month order, summarising segments the manifest is out of date for.
+
+        Callers hold the lock.
+        """
+
+        try:
+            with open(self.manifest_file, "r") as f:
+                data = json.load(f)
+
+            segments = data['segments'] if data.get('version') == MANIFEST_VERSION else {}
+        except (OSError, ValueError):
+            segments = {}
+
+        found = {}
+
+        for dirent in os.scandir(self.segment_dir):
+            match = SEGMENT_RE.match(dirent.name)
+
+            # a plain segment next to a gzipped one means gzipping it was cut short, the plain one is complete
+            if match is None or (match.group(1) in found and match.group(2)):
+                continue
+
+            found[match.group(1)] = dirent
+
+        changed = set(segments) != set(found)
+
+        for month, dirent in found.items():
+            st = dirent.stat()
+            summary = segments.get(month)
+
+            if summary is not None and summary['file'] == dirent.name and \
+                    summary['stamp'] == [st.st_size, st.st_mtime_ns]:
+                continue
+
+            profiling.count("segments_summarised")
+
+            with _open_segment(dirent.path) as f:
+                records, next_id = _decode(f)
+
+            if summary is not None:
+                next_id = max(next_id, summary['next_id'])
+
+            segments[month] = summarise(dirent.name, records, next_id, st)
+            changed = True
+
+        segments = {month: segments[month] for month in sorted(found)}
+
+        if changed:
+            self._save_manifest(segments)
+
+        return segments
+
+    def _save_manifest(self, segments):
+
+        tmpfile = tmp_path(self.manifest_file)
+
+        with open(tmpfile, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, "segments": segments}, f, separators=(',', ':'))
+
+        os.replace(tmpfile, self.manifest_file)
+
+    def _read_segment(self, summary):
+        with _open_segment(self._path(summary['file'])) as f:
+            return _decode(f)
+
+    def _write_segment(self, month, records, next_id, compress):
+        """Atomically replace a month's segment, returning its new summary"""
+
+        name = month + (".jsonl.gz" if compress else ".jsonl")
+        path = self._path(name)
+
+        lines = [json.dumps({"op": "segment", "next_id": next_id})]
+        lines.extend(json.dumps(record) for record in records)
+        data = ("\n".join(lines) + "\n").encode("utf8")
+
+        if compress:
+            data = gzip.compress(data)
+
+        tmpfile = tmp_path(path)
+
+        with open(tmpfile, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmpfile, path)
+
+        # only once the new segment is in place, see _manifest
+        other = self._path(month + (".jsonl" if compress else ".jsonl.gz"))
+
+        if os.path.exists(other):
+            os.remove(other)
+
+        return summarise(name, records, next_id, os.stat(path))
+
+    def _append_segment(self, month, summary, records, next_id):
+        """Append records to a month's plain segment with one write and fsync, returning its new summary"""
+
+        name = month + ".jsonl"
+        data = "".join("{}\n".format(json.dumps(record)) for record in records).encode("utf8")
+
+        fd = os.open(self._path(name), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+        try:
+            data = memoryview(data)
+
+            while data:
+                data = data[os.write(fd, data):]
+
+            os.fsync(fd)
+            st = os.fstat(fd)
+        finally:
+            os.close(fd)
+
+        return summarise(name, records, next_id, st, summary)
+
+    def _closed(self, month):
+        return self.compress and month < date.today().strftime("%Y-%m")
+
+    def _close_months(self, segments):
+        """gzip the plain segments of months that are over"""
+
+        for month, summary in segments.items():
+            if self._closed(month) and not summary['file'].endswith(".gz"):
+                records, next_id = self._read_segment(summary)
+                segments[month] = self._write_segment(month, records, next_id, True)
+
+    def _make_record(self, project, time, comment, when=None, task=None):
+
+        time = parse_time(time)
+
+        if time < 1:
+            raise TimerException("You must spend at least a minute on a task to record it.")
+
+        if when is None:
+            day = date.today()
+        elif type(when) is datetime:
+            day = when.date()
+        else:
+            day = datetime.strptime(when, "%Y-%m-%d").date()
+
+        if type(comment) is list:
+            comment = ' '.join(comment)
+
+        record = {"date": day.strftime("%Y-%m-%d"), "project": project, "time": time, "comment": comment}
+
+        if task is not None:
+            record['task'] = task
+
+        return record
+
+    def _add_records(self, records):
+        """Number records within their month and write each month's batch at once. Returns their IDs."""
+
+        with self.lock.exclusive():
+            segments = self._manifest()
+            months = {}
+
+            for record in records:
+                months.setdefault(record['date'][:7], []).append(record)
+
+            for month, batch in months.items():
+                summary = segments.get(month)
+                next_id = summary['next_id'] if summary else 1
+
+                for record in batch:
+                    record['id'] = next_id
+                    next_id += 1
+
+                if self._closed(month) or (summary is not None and summary['file'].endswith(".gz")):
+                    existing = self._read_segment(summary)[0] if summary else []
+                    segments[month] = self._write_segment(month, existing + batch, next_id, self._closed(month))
+                else:
+                    segments[month] = self._append_segment(month, summary, batch, next_id)
+
+            self._close_months(segments)
+            self._save_manifest(dict(sorted(segments.items())))
+
+        return [make_entry_id(record['date'][:7], record['id']) for record in records]
+
+    def add_entry(self, project, time, comment, when=None, task=None):
+        self._add_records([self._make_record(project, time, comment, when, task)])
+
+    def add_entries(self, entries):
+        """Validate a batch of entries and write each month's share with one write"""
+
+        records, failures = [], []
+
+        for position, entry in enumerate(entries):
+            try:
+                records.append(self._make_record(entry['project'], entry['time'], entry.get('comment', ""),
+                                                 entry.get('date'), entry.get('task')))
+            except Exception as e:
+                failures.append((position, e))
+
+        if records:
+            self._add_records(records)
+
+        return failures
+
+    def _find(self, segments, value):
+        """Return (month, records, next_id, position) for a live entry, or None"""
+
+        parsed = parse_entry_id(value)
+
+        if parsed is None:
+            return self._find_legacy(segments, value)
+
+        if parsed[0] not in segments:
+            return None
+
+        month, number = parsed
+        records, next_id = self._read_segment(segments[month])
+
+        for position, record in enumerate(records):
+            if record['id'] == number:
+                return month, records, next_id, position
+
+        return None
+
+    def _find_legacy(self, segments, value):
+        """Look an entry up by the ID it had before it was migrated"""
+
+        try:
+            legacy_id = int(value)
+        except ValueError:
+            return None
+
+        for month, summary in segments.items():
+            legacy = summary.get('legacy')
+
+            if not legacy or not legacy[0] <= legacy_id <= legacy[1]:
+                continue
+
+            records, next_id = self._read_segment(summary)
+
+            for position, record in enumerate(records):
+                if record.get('legacy_id') == legacy_id:
+                    return month, records, next_id, position
+
+        return None
+
+    def _replace(self, segments, month, records, next_id):
+        compress = segments[month]['file'].endswith(".gz")
+        segments[month] = self._write_segment(month, records, next_id, compress)
+        self._save_manifest(segments)
+
+    def get_entry(self, entry_id):
+
+        with self.lock.shared():
+            found = self._find(self._manifest(), entry_id)
+
+        if found is None:
+            return None
+
+        month, records, _, position = found
+        entry = Entry.from_dict(records[position])
+        entry.id = make_entry_id(month, records[position]['id'])
+
+        return entry
+
+    def delete_entry(self, entry_id):
+
+        with self.lock.exclusive():
+            segments = self._manifest()
+            found = self._find(segments, entry_id)
+
+            if found is None:
+                return False
+
+            month, records, next_id, position = found
+            del records[position]
+
+            self._replace(segments, month, records, next_id)
+
+            return True
+
+    def update_entry(self, entry_id, time):
+        """Add time to an entry, rewriting just its month's segment"""
+
+        with self.lock.exclusive():
+            segments = self._manifest()
+            found = self._find(segments, entry_id)
+
+            if found is None:
+                print("Could not find entry with ID {}. Giving up.".format(entry_id))
+                return
+
+            month, records, next_id, position = found
+
+            time_add = parse_time(time)
+
+            if time_add == 1:
+                print("You must spend at least another minute \
+                on this task to update it.")
+                return
+
+            print("Appending {} minutes to entry {} ({})".format(time_add, entry_id,
+                                                                records[position]['project']))
+
+            records[position]['time'] += time_add
+
+            self._replace(segments, month, records, next_id)
+
+    def compact(self):
+        """gzip every month that is over, otherwise segments have nothing to fold in"""
+
+        with self.lock.exclusive():
+            segments = self._manifest()
+            self._close_months(segments)
+            self._save_manifest(segments)
+
+        return True
+
+    def _matches(self, summary, day_from, day_to, project, task):
+        """Check a segment's summary to see if it can hold matching entries"""
+
+        if not summary['count']:
+            return False
+
+        if (day_from is not None and summary['max'] < day_from) or (day_to is not None and summary['min'] > day_to):
+            return False
+
+        if project is not None and project not in summary['projects']:
+            return False
+
+        if task is not None:
+            return any(task in tasks for name, tasks in summary['projects'].items()
+                       if project is None or name == project)
+
+        return True
+
+    def get_filtered_entries(self, start=None, finish=None, project=None, task=None):
+        """Read only the segments the manifest says can match, yielding entries in date order"""
+
+        day_from, day_to = _day_str(start), _day_str(finish)
+
+        # segments are only appended to or replaced whole, so once open they
+        # can be read without holding the lock
+        with self.lock.shared():
+            files = [(month, _open_segment(self._path(summary['file'])))
+                     for month, summary in self._manifest().items()
+                     if self._matches(summary, day_from, day_to, project, task)]
+
+        decoded = 0
+
+        try:
+            for month, f in files:
+                with f:
+                    records = _decode(f)[0]
+
+                decoded += len(records)
+                selected = []
+
+                for record in records:
+                    if (day_from is not None and record['date'] < day_from) or \
+                            (day_to is not None and record['date'] > day_to):
+                        continue
+
+                    if (project is not None and record['project'] != project) or \
+                            (task is not None and record.get('task') != task):
+                        continue
+
+                    selected.append(record)
+
+                # back-dated entries are appended out of order
+                selected.sort(key=lambda record: (record['date'], record['id']))
+
+                for record in selected:
+                    entry = Entry.from_dict(record)
+                    entry.id = make_entry_id(month, record['id'])
+                    yield entry
+        finally:
+            for _, f in files:
+                f.close()
+
+            profiling.count("segments_read", len(files))
+            profiling.count("log_lines_decoded", decoded)
+
+    def get_projects(self):
+
+        with self.lock.shared():
+            return {project for summary in self._manifest().values() for project in summary['projects']}
+
+    def get_tasks(self, project=None):
+
+        with self.lock.shared():
+            return {task for summary in self._manifest().values()
+                    for name, tasks in summary['projects'].items() if project is None or name == project
+                    for task in tasks}
+
+    def migrate(self, records, batch_size=10000):
+        """Copy entries in, a batch at a time. They are given new IDs and keep
+        the old one as legacy_id. Returns the number copied."""
+
+        records = iter(records)
+        total = 0
+
+        while True:
+            batch = []
+
+            for record in islice(records, batch_size):
+                copy = {key: record[key] for key in ("date", "project", "time", "comment", "task") if key in record}
+
+                if record.get('id') is not None:
+                    copy['legacy_id'] = record['id']
+
+                batch.append(copy)
+
+            if not batch:
+                return total
+
+            self._add_records(batch)
+            total += len(batch)
@@ -0,0 +1,187 @@
+import os
+import sqlite3
+
+from datetime import date, datetime
+from configparser import ConfigParser
+from itertools import islice
+from typing import Optional
+
+from timetrack import TTBaseDriver, Entry, TimerException, parse_time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    project TEXT NOT NULL,
+    task TEXT,
+    time REAL NOT NULL,
+    comment TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS entries_date ON entries (date);
+CREATE INDEX IF NOT EXISTS entries_project_date ON entries (project, date);
+CREATE INDEX IF NOT EXISTS entries_task ON entries (task);
+"""
+
+
+class TTSQLiteDriverException(Exception):
+    """Exception raised by the SQLite driver"""
+
+
+class TTSQLiteDriver(TTBaseDriver):
+    """Keeps entries in a local SQLite database.
+
+    IDs are SQLite row ids (AUTOINCREMENT, so never reused) and updates and
+    deletes touch a single row. The database runs in WAL mode so readers are
+    not blocked by a writer.
+    """
+
+    ordered_entries = True
+
+    def __init__(self, config: ConfigParser, rootsection: Optional[str] = "driver"):
+
+        self.database = config.get(rootsection, "database",
+                                   fallback=os.path.expanduser("~/.timetrack.db"))
+
+        self.conn = sqlite3.connect(self.database)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def add_entry(self, project, time, comment, when=None, task=None):
+
+        time = parse_time(time)
+
+        if time < 1:
+            raise TimerException("You must spend at least a minute on a task to record it.")
+
+        if when is None:
+            day = date.today()
+        elif type(when) is datetime:
+            day = when.date()
+        else:
+            day = datetime.strptime(when, "%Y-%m-%d").date()
+
+        if type(comment) is list:
+            comment = ' '.join(comment)
+
+        with self.conn:
+            self.conn.execute("INSERT INTO entries (date, project, task, time, comment) VALUES (?, ?, ?, ?, ?)",
+                              (day.strftime("%Y-%m-%d"), project, task, time, comment))
+
+    def delete_entry(self, entry_id):
+
+        with self.conn:
+            cur = self.conn.execute("DELETE FROM entries WHERE id = ?", (int(entry_id),))
+
+        return cur.rowcount > 0
+
+    def update_entry(self, entry_id, time):
+        """Add time to a single row"""
+
+        row = self.conn.execute("SELECT project FROM entries WHERE id = ?", (int(entry_id),)).fetchone()
+
+        if row is None:
+            print("Could not find entry with ID {}. Giving up.".format(entry_id))
+            return
+
+        time_add = parse_time(time)
+
+        if time_add == 1:
+            print("You must spend at least another minute \
+                on this task to update it.")
+            return
+
+        print("Appending {} minutes to entry {} ({})".format(time_add, entry_id, row[0]))
+
+        with self.conn:
+            self.conn.execute("UPDATE entries SET time = time + ? WHERE id = ?", (time_add, int(entry_id)))
+
+    def get_filtered_entries(self, start=None, finish=None, project=None, task=None):
+
+        clauses, params = [], []
+
+        for clause, value in (("date >= ?", start), ("date <= ?", finish)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value.strftime("%Y-%m-%d"))
+
+        for clause, value in (("project = ?", project), ("task = ?", task)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+
+        cur = self.conn.execute("SELECT id, date, project, task, time, comment FROM entries"
+                                + where + " ORDER BY date, id", params)
+
+        for entry_id, day, project_name, task_name, time, comment in cur:
+            yield Entry(day, project_name, time, comment, task=task_name, id=entry_id)
+
+    def get_entry(self, entry_id):
+
+        try:
+            row = self.conn.execute("SELECT id, date, project, task, time, comment FROM entries WHERE id = ?",
+                                    (int(entry_id),)).fetchone()
+        except ValueError:
+            return None
+
+        if row is None:
+            return None
+
+        return Entry(row[1], row[2], row[4], row[5], task=row[3], id=row[0])
+
+    def get_projects(self):
+        return {row[0] for row in self.conn.execute("SELECT DISTINCT project FROM entries")}
+
+    def get_tasks(self, project=None):
+
+        if project is None:
+            cur = self.conn.execute("SELECT DISTINCT task FROM entries WHERE task IS NOT NULL")
+        else:
+            cur = self.conn.execute("SELECT DISTINCT task FROM entries WHERE task IS NOT NULL AND project = ?",
+                                    (project,))
+
+        return {row[0] for row in cur}
+
+    def migrate(self, records, batch_size=1000):
+        """Bulk load entries in batched transactions, keeping their IDs.
+
+        Entries whose ID is already in the database are skipped, so the
+        migration can be re-run. Returns (entries loaded, [(ID, exception)])
+        for the ones that were skipped.
+        """
+
+        records = iter(records)
+        total = 0
+        failures = []
+
+        while True:
+            batch = list(islice(records, batch_size))
+
+            if not batch:
+                return total, failures
+
+            ids = [int(record['id']) for record in batch]
+            taken = set()
+
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                taken.update(row[0] for row in self.conn.execute(
+                    "SELECT id FROM entries WHERE id IN ({})".format(", ".join("?" * len(chunk))), chunk))
+
+            rows = []
+
+            for entry_id, record in zip(ids, batch):
+                if entry_id in taken:
+                    failures.append((entry_id, TTSQLiteDriverException(f"Entry ID {entry_id} is already taken")))
+                    continue
+
+                taken.add(entry_id)
+                rows.append((entry_id, record['date'], record['project'], record.get('task'),
+                             record['time'], record.get('comment', "")))
+
+            with self.conn:
+                self.conn.executemany("INSERT INTO entries (id, date, project, task, time, comment) "
+                                      "VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+            total += len(rows)
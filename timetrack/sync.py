@@ -0,0 +1,312 @@
+import io
+import os
+import json
+import uuid
+import hashlib
+
+from collections import Counter, defaultdict
+from contextlib import redirect_stdout
+from configparser import ConfigParser
+from typing import Optional
+
+from timetrack import create_driver
+from timetrack.harvest import transient_error
+from timetrack.locking import TTFileLock, tmp_path
+
+
+class TTSyncException(Exception):
+    """Raised when sync is misconfigured or has to stop part way"""
+
+
+class TTSyncEngine:
+    """Two-way sync between a local log and Harvest that only looks at what changed.
+
+    The state file remembers, for every local entry that has been synced,
+    the Harvest time entry it is linked to, a hash of its content and the
+    updated_at Harvest last gave it, along with two high-water marks: the
+    newest updated_at pulled from Harvest and a cursor into the local log.
+    Each run asks Harvest for entries updated since the first and the log
+    for entries changed since the second, and only sends or applies
+    differences. Entries sent to Harvest carry an external reference of
+    <origin>:<local id>, so a run interrupted between sending and saving its
+    state links them up again instead of sending them twice.
+
+    When an entry changed on both sides since the last run the `conflicts`
+    setting picks the copy to keep. Harvest does not report deletions, so an
+    entry deleted there stays in the local log.
+    """
+
+    def __init__(self, config: ConfigParser, rootsection: Optional[str] = "sync"):
+        self.conflicts = config.get(rootsection, "conflicts", fallback="remote")
+
+        if self.conflicts not in ("remote", "local"):
+            raise TTSyncException(f"conflicts must be remote or local, not {self.conflicts}")
+
+        self.state_file = os.path.expanduser(config.get(rootsection, "state_file",
+                                                        fallback="~/.timetrack_sync_state.json"))
+        self.lock = TTFileLock(self.state_file + ".lock")
+
+        local = config.get(rootsection, "local", fallback="driver")
+        remote = config.get(rootsection, "remote", fallback="harvest")
+
+        if not config.has_section(local) or not config.has_section(remote):
+            raise TTSyncException(f"sync needs both a [{local}] and a [{remote}] section in the config")
+
+        dtype = config.get(local, "type", fallback=None) or config.get(local, "driver", fallback="file")
+
+        self.local = create_driver(config, dtype, rootsection=local)
+
+        if not hasattr(self.local, "get_changes_since"):
+            raise TTSyncException(f"sync needs a file driver on the local side, [{local}] is a {dtype} driver")
+
+        # outside journal mode deleting an entry renumbers every entry after it
+        if not self.local.journal:
+            raise TTSyncException(f"sync needs journal = yes in [{local}] so that entry IDs stay put")
+
+        self.remote = create_driver(config, "harvest", rootsection=remote)
+
+    def _key(self, entry):
+        """The parts of an entry that have to match for a local and a Harvest entry to be the same"""
+        return (entry['date'], self.remote._project_code(entry['project']), entry.get('task'),
+                int(round(entry['time'])), entry.get('comment') or "")
+
+    def _hash(self, entry):
+        return hashlib.sha1(json.dumps(self._key(entry)).encode("utf8")).hexdigest()[:16]
+
+    def _load_state(self):
+        try:
+            with open(self.state_file, "r") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+
+        state.setdefault("origin", uuid.uuid4().hex[:12])
+        state.setdefault("updated_since", None)
+        state.setdefault("cursor", None)
+        state.setdefault("entries", {})
+
+        return state
+
+    def _save_state(self, state):
+        tmpfile = tmp_path(self.state_file)
+
+        with open(tmpfile, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmpfile, self.state_file)
+
+    def _local_record(self, remote_entry):
+        return {"date": remote_entry['date'], "project": remote_entry['project'],
+                "time": int(round(remote_entry['time'])), "comment": remote_entry.get('comment') or "",
+                "task": remote_entry.get('task')}
+
+    def _pull(self, state, changed, local_entries, stats):
+        """Apply Harvest's changes to the local log, returning the local IDs that were touched"""
+
+        links = state['entries']
+        origin = state['origin']
+        first_run = state['updated_since'] is None
+
+        # fetch everything before changing anything, so a dropped connection leaves the log alone
+        remote_changes = list(self.remote.get_changed_entries(state['updated_since']))
+
+        by_remote = {str(link['remote']): local_id for local_id, link in links.items()
+                     if link.get('remote') is not None}
+
+        unmatched = defaultdict(list)
+
+        if first_run:
+            for local_id, entry in local_entries.items():
+                if local_id not in links:
+                    unmatched[self._key(entry)].append(local_id)
+
+        touched = set()
+        inserts = []
+
+        for remote_entry in remote_changes:
+            updated_at = remote_entry.get('updated_at')
+            state['updated_since'] = max(state['updated_since'] or "", updated_at or "") or None
+
+            # a running timer has no time yet, it will show up again when stopped
+            if remote_entry.get('is_running') or int(round(remote_entry['time'])) < 1:
+                continue
+
+            remote_id = str(remote_entry.id)
+            rkey = self._key(remote_entry)
+            local_id = by_remote.get(remote_id)
+
+            if local_id is None:
+                reference = (remote_entry.get('external_reference') or {}).get('id') or ""
+                ref_origin, _, ref_id = reference.partition(":")
+
+                if ref_origin == origin and ref_id not in links:
+                    local_id = ref_id
+                elif unmatched.get(rkey):
+                    local_id = unmatched[rkey].pop(0)
+
+                if local_id is not None:
+                    # sent by us, or already in both places before the first sync: just link them
+                    links[local_id] = {"remote": remote_entry.id, "hash": self._hash(remote_entry),
+                                       "remote_updated_at": updated_at}
+                    by_remote[remote_id] = local_id
+                else:
+                    inserts.append((remote_entry, None))
+
+                continue
+
+            link = links[local_id]
+
+            if updated_at == link.get('remote_updated_at'):
+                # our own write coming back, or seen on an earlier run
+                continue
+
+            local_entry = self.local.get_entry(local_id)
+
+            if local_entry is not None and self._key(local_entry) == rkey:
+                link['remote_updated_at'] = updated_at
+                link['hash'] = self._hash(local_entry)
+                continue
+
+            if local_id in changed and (local_entry is None or self._hash(local_entry) != link['hash']):
+                stats['conflicts'] += 1
+
+                if self.conflicts == "local":
+                    # the push below overwrites Harvest's copy
+                    continue
+
+            touched.add(local_id)
+            stats['pulled_updated'] += 1
+
+            lkey = self._key(local_entry) if local_entry is not None else None
+
+            # update_entry turns down +1, so that one is replaced like any other change
+            if lkey is not None and lkey[:3] == rkey[:3] and lkey[4] == rkey[4] and rkey[3] - lkey[3] != 1:
+                with redirect_stdout(io.StringIO()):
+                    self.local.update_entry(int(local_id), rkey[3] - lkey[3])
+
+                link['remote_updated_at'] = updated_at
+                link['hash'] = self._hash(remote_entry)
+                continue
+
+            # anything else is more than the log can express in place, so swap the entry for a new one
+            if local_entry is not None:
+                self.local.delete_entry(int(local_id))
+
+            del links[local_id]
+            inserts.append((remote_entry, local_id))
+
+        if inserts:
+            ids = self.local.insert_entries([self._local_record(remote_entry) for remote_entry, _ in inserts])
+
+            for (remote_entry, replaced), new_id in zip(inserts, ids):
+                links[str(new_id)] = {"remote": remote_entry.id, "hash": self._hash(remote_entry),
+                                      "remote_updated_at": remote_entry.get('updated_at')}
+                touched.add(str(new_id))
+
+                if replaced is None:
+                    stats['pulled_new'] += 1
+
+        return touched
+
+    def _push(self, state, changed, local_entries, touched, stats, failed):
+        """Send local changes to Harvest. Returns False if Harvest stopped answering part way"""
+
+        links = state['entries']
+
+        for local_id in sorted(changed - touched, key=int):
+            link = links.get(local_id)
+
+            if local_entries is not None:
+                local_entry = local_entries.get(local_id)
+            else:
+                local_entry = self.local.get_entry(local_id)
+
+            if local_entry is None:
+                link = links.pop(local_id, None)
+
+                if link is None or link.get('remote') is None:
+                    continue
+
+                try:
+                    self.remote.delete_time_entry(link['remote'])
+                    stats['pushed_deleted'] += 1
+                except Exception as e:
+                    if transient_error(e):
+                        links[local_id] = link
+                        return False
+
+                    failed.append((local_id, str(e)))
+
+                continue
+
+            digest = self._hash(local_entry)
+
+            if link is not None and link['hash'] == digest:
+                continue
+
+            try:
+                if link is not None and link.get('remote') is not None:
+                    remote_entry = self.remote.update_time_entry(link['remote'], local_entry)
+                    stats['pushed_updated'] += 1
+                else:
+                    remote_entry = self.remote.create_time_entry(local_entry,
+                                                                 reference=f"{state['origin']}:{local_id}")
+                    stats['pushed_new'] += 1
+            except Exception as e:
+                if transient_error(e):
+                    return False
+
+                # kept with its hash so it isn't retried until it changes again
+                links[local_id] = {"remote": link.get('remote') if link else None, "hash": digest, "error": str(e)}
+                failed.append((local_id, str(e)))
+                continue
+
+            links[local_id] = {"remote": remote_entry['id'], "hash": digest,
+                               "remote_updated_at": remote_entry.get('updated_at')}
+
+        return True
+
+    def sync(self):
+        """Run one sync, returning (stats, failed) where failed lists (local id, error) Harvest rejected.
+
+        Raises TTLockBusy if another sync is running and TTSyncException if
+        Harvest stopped answering, after saving what was done so far.
+        """
+
+        stats = Counter()
+        failed = []
+
+        with self.lock.exclusive(wait=False):
+            state = self._load_state()
+            links = state['entries']
+
+            changed, cursor = self.local.get_changes_since(state['cursor'])
+            local_entries = None
+
+            if changed is None:
+                # the log was rewritten (or this is the first run), compare everything against the links
+                local_entries = {str(entry.id): entry for entry in self.local.get_filtered_entries()}
+                changed = set(local_entries) | set(links)
+            else:
+                changed = {str(local_id) for local_id in changed}
+
+            try:
+                touched = self._pull(state, changed, local_entries or {}, stats)
+            except Exception as e:
+                if transient_error(e):
+                    raise TTSyncException(f"Could not fetch changes from Harvest ({e}), nothing was synced")
+                raise
+
+            finished = self._push(state, changed, local_entries, touched, stats, failed)
+
+            if finished:
+                state['cursor'] = cursor
+
+            self._save_state(state)
+
+        if not finished:
+            raise TTSyncException("Harvest stopped answering part way through, run sync again to send the rest")
+
+        return stats, failed
@@ -0,0 +1,68 @@
+import numpy
+
+
+class EntryTable:
+    """Column-oriented copy of a set of entries for fast aggregation.
+
+    Dates are held as datetime64[D], time as int32 minutes and project/task
+    names are dictionary encoded into integer codes (-1 for no task). Build it
+    once per query with from_entries() and aggregate with the by_* methods.
+    """
+
+    def __init__(self, dates, minutes, projects, project_names, tasks, task_names):
+        self.dates = dates
+        self.minutes = minutes
+        self.projects = projects
+        self.project_names = project_names
+        self.tasks = tasks
+        self.task_names = task_names
+
+    @classmethod
+    def from_entries(cls, entries):
+        """Encode an iterable of entry records into columns"""
+
+        dates, minutes, projects, tasks = [], [], [], []
+        project_codes, task_codes = {}, {}
+
+        for entry in entries:
+            dates.append(entry['date'])
+            minutes.append(entry['time'])
+            projects.append(project_codes.setdefault(entry['project'], len(project_codes)))
+
+            task = entry.get('task')
+            tasks.append(-1 if task is None else task_codes.setdefault(task, len(task_codes)))
+
+        return cls(numpy.array(dates, dtype='datetime64[D]'),
+                   numpy.rint(numpy.array(minutes, dtype=float)).astype(numpy.int32),
+                   numpy.array(projects, dtype=numpy.int32),
+                   list(project_codes),
+                   numpy.array(tasks, dtype=numpy.int32),
+                   list(task_codes))
+
+    def __len__(self):
+        return len(self.minutes)
+
+    def _select(self, mask):
+        return EntryTable(self.dates[mask], self.minutes[mask], self.projects[mask],
+                          self.project_names, self.tasks[mask], self.task_names)
+
+    def between(self, start=None, finish=None):
+        """Return the rows falling within [start, finish]"""
+
+        mask = numpy.ones(len(self), dtype=bool)
+
+        if start is not None:
+            mask &= self.dates >= numpy.datetime64(start, 'D')
+
+        if finish is not None:
+            mask &= self.dates <= numpy.datetime64(finish, 'D')
+
+        return self._select(mask)
+
+    def _sum_by(self, codes, names):
+        sums = numpy.bincount(codes, weights=self.minutes, minlength=len(names))
+        return {name: int(spent) for name, spent in zip(names, sums) if spent}
+
+    def by_project(self):
+        """Minutes per project, in order of first appearance"""
+        return self._sum_by(self.projects, self.project_names)
@@ -0,0 +1,103 @@
+import os
+import json
+import time
+
+from contextlib import contextmanager
+
+from timetrack.locking import TTFileLock, tmp_path
+
+
+class TTTimerException(Exception):
+    """Raised when a timer can't be started or stopped"""
+
+
+def elapsed_minutes(timer, now=None):
+    """Whole minutes a timer has been running, rounded down like the live timer"""
+    return int(((now or time.time()) - timer['started']) // 60)
+
+
+class TTTimerStore:
+    """Running timers kept in a small JSON file rather than in a running process.
+
+    A timer is just a record of what it is for and when it was started, so
+    nothing needs to stay awake while it runs and closing the terminal
+    doesn't lose it. Elapsed time is worked out from the start time when a
+    timer is shown or stopped. Timers are keyed by name, so several can run
+    at once.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = TTFileLock(path + ".lock")
+
+    def _read(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write(self, timers):
+        tmpfile = tmp_path(self.path)
+
+        with open(tmpfile, "w") as f:
+            json.dump(timers, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmpfile, self.path)
+
+    def timers(self):
+        """Return {name: timer} for every running timer"""
+
+        with self.lock.shared():
+            return self._read()
+
+    def start(self, name, **fields):
+        """Start a timer called name, keeping fields (project, comment, task, date or entry) with it"""
+
+        with self.lock.exclusive():
+            timers = self._read()
+
+            if name in timers:
+                raise TTTimerException(f"A timer called {name} is already running")
+
+            timer = dict(fields, started=time.time())
+            timers[name] = timer
+            self._write(timers)
+
+        return timer
+
+    def _resolve(self, timers, name):
+
+        if name is not None:
+            if name not in timers:
+                raise TTTimerException(f"There is no timer called {name} running")
+
+            return name
+
+        if not timers:
+            raise TTTimerException("There are no timers running")
+
+        if len(timers) > 1:
+            raise TTTimerException("Several timers are running, say which one to stop: {}".format(
+                ", ".join(sorted(timers))))
+
+        return next(iter(timers))
+
+    @contextmanager
+    def stopping(self, name=None):
+        """Hold (name, timer) for the timer being stopped, removing it only if the block succeeds.
+
+        With no name the only running timer is used. The store stays locked
+        throughout so the same timer can't be recorded twice.
+        """
+
+        with self.lock.exclusive():
+            timers = self._read()
+            name = self._resolve(timers, name)
+
+            yield name, timers[name]
+
+            del timers[name]
+            self._write(timers)